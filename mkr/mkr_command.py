@@ -28,6 +28,8 @@ def main():
 
         result['response'] = str(response)
         result['changed'] = bool(changes)
+        if module.timings is not None:
+            result['timings'] = module.timings
 
         module.exit_json(**result)
 
@@ -26,8 +26,10 @@ def main():
     result['history'] = list(module.history)
 
     result['response'] = str(response)
-    result['changed'] = bool(changes)
+    result['changed'] = bool(changes.all_commands)
     result['updates'] = list(updates)
+    if module.timings is not None:
+        result['timings'] = module.timings
 
     module.exit_json(**result)
 
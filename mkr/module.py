@@ -1,36 +1,43 @@
-import paramiko
+import string
 import sys
-import socket
 
 from re import compile as compile_regex
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.basic import env_fallback, get_exception
-from ansible.module_utils.shell import Shell, ShellError
 
-from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.config import MikrotikConfig, make_script_paths
+from ansible_mikrotik_utils.commands import BaseCommand, RawCommand
+from ansible_mikrotik_utils.commands import Import, RemoveFile
+from ansible_mikrotik_utils.commands import Export, ExportFile, PrintHistory, Batch
+from ansible_mikrotik_utils.commands import SaveBackup, LoadBackup, ClearBackup
+from ansible_mikrotik_utils.cache import ExportCache, make_fingerprint
+from ansible_mikrotik_utils.common import format_find_identifier
+from ansible_mikrotik_utils.common import make_bytes, make_native_text
+from ansible_mikrotik_utils.profiling import Profiler
+from ansible_mikrotik_utils.connection import SSHTransport, BrokerTransport
+from ansible_mikrotik_utils.connection import ShellTransport
+from ansible_mikrotik_utils.connection import CLI_PROMPTS_RE, match_error
+from ansible_mikrotik_utils.connection import match_export_error
+from ansible_mikrotik_utils.connection import HOST_KEY_POLICIES, import_paramiko
+from ansible_mikrotik_utils.exceptions import TransportError, CommandError
+from ansible_mikrotik_utils.exceptions import ResolveError, AuthenticationError
 
-from paramiko import AuthenticationException, SSHException, util
 from getpass import getuser
-
-if __debug__:
-    paramiko.util.log_to_file('/dev/stderr')
+from random import SystemRandom
 
 # Constants
 # =============================================================================
 
-CLI_PROMPTS_RE = [
-    compile_regex(r"\[([\w\-]+)@([\.\w\-]+)\]\s(\/(\w+\s?)*)?\>"),
-]
+IMPORT_LINE_RE = compile_regex(r"\(line (\d+) column \d+\)")
+
+EXECUTION_MODES = 'command', 'import'
 
-CLI_ERRORS_RE = [
-    compile_regex(r"failure: (.*)"),
-    compile_regex(r"bad command name ([\w\-]+) \(line \d+ column \d+\)"),
-    compile_regex(r"syntax error \(line \d+ column \d+\)"),
-    compile_regex(r"expected end of command \(line \d+ column \d+\)"),
-    compile_regex(r"expected command name \(line \d+ column \d+\)"),
+TRANSPORTS = 'exec', 'shell'
 
-]
+EXPORT_SCOPES = 'full', 'target'
+
+EXPORT_TRANSFERS = 'channel', 'file'
 
 NET_COMMON_ARGS = dict(
     host=dict(required=True),
@@ -55,6 +62,33 @@ RESTORE_ARGS = dict(
     restore_on_timeout=dict(default=0, fallback=(env_fallback, ['MIKROTIK_RESTORE_ON_TIMEOUT']), type='int'),
 )
 
+BROKER_ARGS = dict(
+    broker_socket=dict(fallback=(env_fallback, ['MIKROTIK_BROKER_SOCKET']), type='path'),
+    broker_idle_timeout=dict(default=300, fallback=(env_fallback, ['MIKROTIK_BROKER_IDLE_TIMEOUT']), type='int'),
+)
+
+EXPORT_ARGS = dict(
+    export_cache=dict(fallback=(env_fallback, ['MIKROTIK_EXPORT_CACHE']), type='path'),
+    export_scope=dict(default='full', choices=EXPORT_SCOPES, fallback=(env_fallback, ['MIKROTIK_EXPORT_SCOPE'])),
+    export_transfer=dict(default='channel', choices=EXPORT_TRANSFERS, fallback=(env_fallback, ['MIKROTIK_EXPORT_TRANSFER'])),
+)
+
+EXECUTION_ARGS = dict(
+    transport=dict(default='exec', choices=TRANSPORTS, fallback=(env_fallback, ['MIKROTIK_TRANSPORT'])),
+    execution_mode=dict(default='command', choices=EXECUTION_MODES, fallback=(env_fallback, ['MIKROTIK_EXECUTION_MODE'])),
+    channels=dict(default=1, fallback=(env_fallback, ['MIKROTIK_CHANNELS']), type='int'),
+    host_key_policy=dict(default='reject', choices=sorted(HOST_KEY_POLICIES), fallback=(env_fallback, ['MIKROTIK_HOST_KEY_POLICY'])),
+)
+
+OFFLINE_ARGS = dict(
+    offline=dict(default=False, fallback=(env_fallback, ['MIKROTIK_OFFLINE']), type='bool'),
+    offline_export=dict(fallback=(env_fallback, ['MIKROTIK_OFFLINE_EXPORT']), type='path'),
+)
+
+PROFILING_ARGS = dict(
+    profile=dict(default=False, fallback=(env_fallback, ['MIKROTIK_PROFILE']), type='bool'),
+)
+
 # Utilities
 # =============================================================================
 
@@ -71,6 +105,26 @@ def make_random_name():
 def make_random_password():
     return make_random_text(length=16)
 
+def match_command_error(command, response):
+    if isinstance(command, Export):
+        return match_export_error(response)
+    return match_error(response)
+
+def locate_import_error(commands, response):
+    match = IMPORT_LINE_RE.search(response)
+    if match:
+        index = int(match.group(1)) - 1
+        if 0 <= index < len(commands):
+            return commands[index]
+    # verbose imports echo each script line before running it
+    located, position = None, 0
+    for line in response.splitlines():
+        if position < len(commands) and line.strip() == str(commands[position]):
+            located, position = commands[position], position + 1
+        elif match_error(line):
+            break
+    return located
+
 
 # Ansible module implementation
 # =============================================================================
@@ -80,8 +134,14 @@ class MikrotikModule(AnsibleModule):
     # Class attributes and initializer
     # -------------------------------------------------------------------------
     config_class = MikrotikConfig
-    catched_exceptions = SSHException, ShellError, IOError
-    backup_extension = '.backup'
+    ssh_transport_class = SSHTransport
+    broker_transport_class = BrokerTransport
+    shell_transport_class = ShellTransport
+    export_cache_class = ExportCache
+    profiler_class = Profiler
+    script_extension = '.rsc'
+    restore_task_prefix = 'mkr-restore-on-'
+    restore_task_path = '/system scheduler'
     pruned_sections = '/system scheduler',
     ssh_username_suffix = '+ct'
 
@@ -89,14 +149,26 @@ class MikrotikModule(AnsibleModule):
         kwargs['argument_spec'].update(NET_COMMON_ARGS)
         kwargs['argument_spec'].update(BACKUP_ARGS)
         kwargs['argument_spec'].update(RESTORE_ARGS)
+        kwargs['argument_spec'].update(BROKER_ARGS)
+        kwargs['argument_spec'].update(EXECUTION_ARGS)
+        kwargs['argument_spec'].update(EXPORT_ARGS)
+        kwargs['argument_spec'].update(OFFLINE_ARGS)
+        kwargs['argument_spec'].update(PROFILING_ARGS)
 
         super(MikrotikModule, self).__init__(*args, **kwargs)
 
-        self.__ssh = None
+        self.__profiler = self.profiler_class(enabled=self.params['profile'])
+        self.__transport = None
         self.__config = None
+        self.__export_paths = None
         self.__connected = False
         self.__protected = False
+        self.__backedup = False
+        self.__rollback = None
+        self.__rollback_state = None
+        self.__rollback_file = None
         self.__failed = False
+        self.__changing = False
         self.__disconnecting = False
         self.__history = list()
         self.___backup_name = None
@@ -121,6 +193,14 @@ class MikrotikModule(AnsibleModule):
     def backedup(self):
         return self.__backedup
 
+    @property
+    def offline(self):
+        return bool(self.params['offline'] or self.params['offline_export'])
+
+    @property
+    def dry_run(self):
+        return self.check_mode or self.offline
+
     @property
     def config(self):
         if self.__config is None:
@@ -131,6 +211,11 @@ class MikrotikModule(AnsibleModule):
     def backup_name(self):
         return self.___backup_name
 
+    @property
+    def timings(self):
+        if self.__profiler.enabled:
+            return self.__profiler.report()
+
     # Internal properties
     # -------------------------------------------------------------------------
 
@@ -163,44 +248,99 @@ class MikrotikModule(AnsibleModule):
     def __ssh_keyfile(self):
         return self.params['ssh_keyfile']
 
+    # Connection broker
+
+    @property
+    def __broker_socket(self):
+        return self.params['broker_socket']
+
+    @property
+    def __broker_idle_timeout(self):
+        return self.params['broker_idle_timeout']
+
+    # Execution
+
+    @property
+    def __transport_type(self):
+        return self.params['transport']
+
+    @property
+    def __execution_mode(self):
+        return self.params['execution_mode']
+
+    # Export cache
+
+    @property
+    def __export_cache(self):
+        if self.params['export_cache']:
+            return self.export_cache_class(self.params['export_cache'])
+
+    @property
+    def __export_cache_key(self):
+        key = '{}:{}'.format(self.__ssh_host, self.__ssh_port)
+        if self.__export_paths is not None:
+            key = ' '.join([key] + self.__export_paths)
+        return key
+
+    @property
+    def __export_cache_keys(self):
+        yield self.__export_cache_key
+        if self.__export_paths is not None:
+            yield '{}:{}'.format(self.__ssh_host, self.__ssh_port)
+
+    # Export
+
+    @property
+    def __channels(self):
+        return max(self.params['channels'], 1)
+
+    @property
+    def __export_scope(self):
+        return self.params['export_scope']
+
+    @property
+    def __export_transfer(self):
+        return self.params['export_transfer']
+
+    @property
+    def __export_command(self):
+        if self.__export_paths is not None:
+            return Batch(Export(path=path) for path in self.__export_paths)
+        else:
+            return Export(path='/')
+
     # Backup
 
     @property
     def __protection_required(self):
-        return any in (
+        return any((
             self.params['restore_on_error'],
             self.params['restore_on_reboot'],
             self.params['restore_on_timeout'],
-        )
+        ))
 
     @property
     def __backup_required(self):
-        return self.__protection_required or self.params['backup_name']
+        # the full backup is only a fallback when there is no rollback script
+        return bool(self.params['backup_name']) or (
+            self.__protection_required and self.__rollback is None
+        )
 
     @property
     def __backup_name(self):
         if self.__backup_required and self.___backup_name is None:
-            try:
-                self.___backup_name = self.params['backup_name']
-            except KeyError:
-                self.___backup_name = make_random_name()
+            self.___backup_name = self.params.get('backup_name') or make_random_name()
         return self.___backup_name
 
     @property
     def __backup_key(self):
         if self.__backup_required and self.___backup_key is None:
-            try:
-                self.___backup_key = self.params['backup_key']
-            except KeyError:
-                self.___backup_key = make_random_password()
+            self.___backup_key = self.params.get('backup_key') or make_random_password()
         return self.___backup_key
 
     @property
     def __backup_path(self):
-        if not self.__backup_name.endswith(self.backup_extension):
-            return ''.join((self.__backup_name, self.backup_extension))
-        else:
-            return self.__backup_name
+        return self.__backup_save_command.filename
 
     @property
     def __backup_save_command(self):
@@ -212,28 +352,40 @@ class MikrotikModule(AnsibleModule):
 
     @property
     def __backup_cleanup_command(self):
-        return RemoveBackup(self.__backup_name)
+        return ClearBackup(self.__backup_path)
 
     # Restore
 
+    @property
+    def __restore_source(self):
+        # the restore tasks are removed first, so that a restore only runs once
+        commands = [self.__make_task_removal(name) for name, _ in self.__restore_tasks]
+        if self.__rollback_file is not None:
+            commands.append(Import(self.__rollback_file))
+        else:
+            commands.append(self.__backup_load_command)
+        return '; '.join(map(str, commands))
+
     @property
     def __restore_tasks(self):
-        if self.__restore_on_reboot:
+        if self.params['restore_on_reboot']:
+            yield ''.join((self.restore_task_prefix, 'reboot')), 'start-time=startup'
+        if self.params['restore_on_timeout']:
             yield (
-                'restore_on_reboot',
-                'startup-time=reboot source="{}"'
-                ''.format(self.__backup_load_command)
-            )
-        if self.__restore_on_timeout:
-            yield (
-                'restore_on_reboot',
-                'interval={} source="{}"'
-                ''.format(
-                    timedelta(self.restore_on_timeout),
-                    self.__backup_load_command
-                )
+                ''.join((self.restore_task_prefix, 'timeout')),
+                'interval={}s'.format(self.params['restore_on_timeout'])
             )
 
+    def __make_task_addition(self, name, timing):
+        return RawCommand('add', 'name={} {} on-event="{}"'.format(
+            name, timing, self.__restore_source
+        ), path=self.restore_task_path)
+
+    def __make_task_removal(self, name):
+        return RawCommand(
+            'remove', format_find_identifier(dict(name=name)), path=self.restore_task_path
+        )
+
 
     # Module parameters handling
     # -------------------------------------------------------------------------
@@ -249,30 +401,41 @@ class MikrotikModule(AnsibleModule):
     # Connection handling
     # -------------------------------------------------------------------------
 
+    def __make_transport(self):
+        kwargs = dict(
+            host=self.__ssh_host,
+            port=self.__ssh_port,
+            username=self.__ssh_username,
+            password=self.__ssh_password,
+            key_filename=self.__ssh_keyfile,
+            timeout=self.__ssh_timeout,
+            compress=self.__export_transfer == 'file',
+            host_key_policy=self.params['host_key_policy'],
+        )
+        if __debug__ and not self.__broker_socket:
+            # paramiko is only imported once this process connects by itself
+            import_paramiko().util.log_to_file('/dev/stderr')
+        if self.__transport_type == 'shell':
+            if self.__broker_socket:
+                self.__fail("The shell transport cannot be used with the connection broker.")
+            return self.shell_transport_class(prompts=CLI_PROMPTS_RE, **kwargs)
+        elif self.__broker_socket:
+            return self.broker_transport_class(
+                socket_path=self.__broker_socket,
+                idle_timeout=self.__broker_idle_timeout,
+                **kwargs
+            )
+        else:
+            return self.ssh_transport_class(**kwargs)
+
     def __connect(self):
         if not self.__connected:
-            self.__ssh = ssh = paramiko.SSHClient()
-            ssh.load_system_host_keys()
-            look_for_keys = self.__ssh_password is None
+            self.__transport = self.__make_transport()
             try:
-                ssh.connect(
-                        hostname=self.__ssh_host,
-                        port=self.__ssh_port,
-                        username=self.__ssh_username,
-                        password=self.__ssh_password,
-                        key_filename=self.__ssh_keyfile,
-                        timeout=self.__ssh_timeout,
-                        allow_agent=True, look_for_keys=False
-                    )
-                stdin, stdout, stderr = ssh.exec_command('test', timeout=self.__ssh_timeout)
-                if "bad command name test (line 1 column 1)\n" not in stdout.readlines():
-                    self.__fail("Connection test failed. (result:{})".format(stdout.readlines()))
-            except socket.gaierror:
-                self.__fail("Unable to resolve hostname. (host:{})".format(self.__ssh_host))
-            except AuthenticationException:
-                self.__fail("Unable to authenticate (user:{})".format(self.__ssh_user))
-            except (SSHException, IOError) as ex:
-                self.__fail("Unable to connect ({})".format(str(ex)))
+                with self.__profiler.timer('connect'):
+                    self.__transport.open()
+            except (ResolveError, AuthenticationError, TransportError) as ex:
+                self.__fail(str(ex))
             else:
                 self.__connected = True
                 self.__backedup = False
@@ -280,8 +443,9 @@ class MikrotikModule(AnsibleModule):
     def __disconnect(self):
         if self.__connected:
             self.__unprotect()
-            self.__ssh.close()
-            self.__ssh = None
+            self.__transport.close()
+            self.__transport = None
+            self.__connected = False
 
     def __log_command(self, command):
         text = command.make_command_history_text()
@@ -297,48 +461,164 @@ class MikrotikModule(AnsibleModule):
 
     def __fail_command(self, command, error):
         self.__log_response(command, error, error=True)
-        if command.log_error_message:
-            self.__fail(
-                "Error detected in standard error.",
-                command=command.history_text, error=error
-            )
-        else:
-            self.__fail(
-                "Error detected in standard error.",
-                command=command.history_text
+        self.__fail(
+            "Error detected in standard error.",
+            command=command.make_command_history_text(),
+            error=command.make_response_history_text(error, error=True)
+        )
+
+    def __make_command(self, command):
+        if not isinstance(command, BaseCommand):
+            # sent as written, the text giving its own path if any
+            command = RawCommand(command, None, path='')
+        return command
+
+    def __receive(self, *texts):
+        for text in texts:
+            self.__profiler.count('bytes_received', len(make_bytes(text)))
+
+    def __execute(self, command):
+        self.__connect()
+        self.__profiler.count('commands')
+        try:
+            response, error = self.__transport.execute(
+                str(command), timeout=self.__ssh_timeout
             )
+        except TransportError as ex:
+            self.__fail(str(ex), command=command.make_command_history_text())
+        self.__receive(response, error)
+        return response, error
 
     def __send(self, command):
-        if not isinstance(command, ScriptCommand):
-            command = RawCommand.parse(command)
-        self.__connect()
+        command = self.__make_command(command)
         self.__log_command(command)
-        stdin, stdout, stderr = self.__ssh.exec_command(command)
-        stderr_read = stderr.read()
+        with self.__profiler.timer('send'):
+            response, error = self.__execute(command)
         if error:
             self.__fail_command(command, error)
-        stdout_read = stdout.read()
-        for pattern in CLI_ERRORS_RE:
-            if pattern.match(stdout_read):
+        if match_command_error(command, response):
+            self.__fail_command(command, response)
+        self.__log_response(command, response)
+        return response
+
+    def __send_many(self, commands):
+        """Send independent read-only commands over concurrent channels,
+        the responses being checked and logged in the order of commands."""
+        commands = list(map(self.__make_command, commands))
+        for command in commands:
+            self.__log_command(command)
+        self.__connect()
+        self.__profiler.count('commands', len(commands))
+        try:
+            with self.__profiler.timer('send'):
+                results = self.__transport.execute_many(
+                    list(map(str, commands)),
+                    timeout=self.__ssh_timeout, channels=self.__channels
+                )
+        except TransportError as ex:
+            self.__fail(str(ex))
+        responses = list()
+        for command, (response, error) in zip(commands, results):
+            self.__receive(response, error)
+            if error:
+                self.__fail_command(command, error)
+            if match_command_error(command, response):
                 self.__fail_command(command, response)
-        self.__log_response(response)
+            self.__log_response(command, response)
+            responses.append(response)
+        return responses
+
+    def __stream(self, command, chunks):
+        command = self.__make_command(command)
+        self.__log_command(command)
+        self.__connect()
+        self.__profiler.count('commands')
+        # only the first line of an export can be an error, its body is
+        # configuration whose values are not matched
+        exported, checked, partial = isinstance(command, Export), False, ''
+        try:
+            stream = self.__transport.stream(str(command), timeout=self.__ssh_timeout)
+            while True:
+                with self.__profiler.timer('transfer'):
+                    chunk = next(stream, None)
+                if chunk is None:
+                    break
+                self.__receive(chunk)
+                chunks.append(chunk)
+                if not checked:
+                    lines = ''.join((partial, chunk)).split('\n')
+                    partial = lines.pop()
+                    for line in lines:
+                        if match_error(line):
+                            self.__fail_command(command, line)
+                        if exported:
+                            checked = True
+                            break
+                yield chunk
+        except CommandError as ex:
+            self.__fail_command(command, str(ex))
+        except TransportError as ex:
+            self.__fail(str(ex), command=command.make_command_history_text())
+        if not checked and match_error(partial):
+            self.__fail_command(command, partial)
+        self.__log_response(command, ''.join(chunks))
+
+    def __import(self, commands):
+        commands = list(map(self.__make_command, commands))
+        filename = ''.join((make_random_name(), self.script_extension))
+        script = ''.join('{}\n'.format(command) for command in commands)
+        self.__connect()
+        for command in commands:
+            self.__log_command(command)
+        try:
+            with self.__profiler.timer('transfer'):
+                self.__transport.upload(filename, make_bytes(script))
+        except TransportError as ex:
+            self.__fail(str(ex))
+        command = Import(filename)
+        self.__log_command(command)
+        with self.__profiler.timer('send'):
+            response, error = self.__execute(command)
+        self.__send(RemoveFile(filename))
+        if error or match_error(response):
+            failed = locate_import_error(commands, response) or command
+            self.__fail_command(failed, error or response)
+        self.__log_response(command, response)
         return response
 
     # Device protection handling
     # -------------------------------------------------------------------------
 
+    def __upload_rollback(self):
+        filename = ''.join(('mkr-rollback-', make_random_name(), self.script_extension))
+        script = ''.join('{}\n'.format(command) for command in self.__rollback)
+        self.__connect()
+        try:
+            with self.__profiler.timer('transfer'):
+                self.__transport.upload(filename, make_bytes(script))
+        except TransportError as ex:
+            self.__fail(str(ex))
+        self.__rollback_file = filename
+
     def __protect(self):
         if self.__protection_required and not self.__protected:
-            self.__backup()
-            for name, args in self.__restore_tasks:
-                self.__send('/system scheduler add name={} {}'.format(name, args))
+            tasks = list(self.__restore_tasks)
+            if self.__rollback is None:
+                self.__backup()
+            elif tasks:
+                self.__upload_rollback()
+            for name, timing in tasks:
+                self.__send(self.__make_task_addition(name, timing))
             self.__protected = True
 
     def __unprotect(self):
-        if self.__protection_required and not self.__protected:
-            for name, args in self.__restore_tasks:
-                self.__send('/system scheduler remove {}'.format(name, args))
+        if self.__protected:
             self.__protected = False
+            for name, _ in self.__restore_tasks:
+                self.__send(self.__make_task_removal(name))
+            if self.__rollback_file is not None:
+                self.__send(RemoveFile(self.__rollback_file))
+                self.__rollback_file = None
             self.__cleanup()
 
     # Backup handling
@@ -360,7 +640,14 @@ class MikrotikModule(AnsibleModule):
     # -------------------------------------------------------------------------
 
     def __restore(self):
-        self.__send((self.__backup_load_command,))
+        if self.__rollback_state is not None:
+            # the inverse of whatever part of the script was applied
+            original, script = self.__rollback_state
+            self.__rollback_state = None
+            for command in self.__verify(original, script).all_commands:
+                self.__send(command)
+        elif self.__backedup:
+            self.__send(self.__backup_load_command)
 
     # Foobar
     # -------------------------------------------------------------------------
@@ -369,6 +656,8 @@ class MikrotikModule(AnsibleModule):
         released, disconnected = False, False
         if not self.__failed:
             self.__failed = True
+            if self.params['restore_on_error'] and self.__changing:
+                self.__restore()
             self.__unprotect()
             self.__cleanup()
             released = True
@@ -387,26 +676,143 @@ class MikrotikModule(AnsibleModule):
     # Configuration export by device
     # -------------------------------------------------------------------------
 
+    def __fingerprint(self):
+        return make_fingerprint(self.__send(PrintHistory()))
+
+    def __export_file(self):
+        name = make_random_name()
+        if self.__export_paths is not None:
+            commands = [
+                ExportFile('{}-{}'.format(name, index), path=path)
+                for index, path in enumerate(self.__export_paths)
+            ]
+        else:
+            commands = [ExportFile(name)]
+        self.__send(Batch(commands))
+        try:
+            with self.__profiler.timer('transfer'):
+                texts = [
+                    make_native_text(
+                        self.__transport.download(command.filename).decode('utf-8')
+                    )
+                    for command in commands
+                ]
+        except TransportError as ex:
+            texts, failure = None, str(ex)
+        else:
+            self.__receive(*texts)
+        self.__send(Batch(RemoveFile(command.filename) for command in commands))
+        if texts is None:
+            self.__fail(failure)
+        return '\n'.join(texts)
+
     def __export(self):
-        self.__unprotect()
-        text = self.__send(Export())
-        return MikrotikConfig.parse(text, prune=self.pruned_sections)
+        with self.__profiler.timer('export'):
+            if self.offline:
+                return self.__load_offline()
+            return self.__export_config()
+
+    def __load_offline(self):
+        if self.params['offline_export']:
+            try:
+                with self.__profiler.timer('parse'):
+                    return self.config_class.load(
+                        self.params['offline_export'], prune=self.pruned_sections
+                    )
+            except (IOError, OSError) as ex:
+                self.__fail("Unable to read offline export ({})".format(str(ex)))
+        cache = self.__export_cache
+        if cache is None:
+            self.__fail("Offline mode requires offline_export or export_cache.")
+        for key in self.__export_cache_keys:
+            with self.__profiler.timer('parse'):
+                config = self.config_class.load_cached(
+                    cache, key, prune=self.pruned_sections
+                )
+            if config is not None:
+                return config
+        self.__fail("No cached export for {}.".format(self.__ssh_host))
+
+    def __parse(self, text):
+        with self.__profiler.timer('parse'):
+            return MikrotikConfig.parse(text, prune=self.pruned_sections)
+
+    def __export_config(self):
+        if self.__export_paths == []:
+            return MikrotikConfig()
+        cache = self.__export_cache
+        if cache is not None:
+            fingerprint = self.__fingerprint()
+            text = cache.load(self.__export_cache_key, fingerprint)
+            if text is not None:
+                return self.__parse(text)
+        if self.__export_transfer == 'file':
+            text = self.__export_file()
+            config = self.__parse(text)
+        elif self.__export_paths is not None and self.__channels > 1:
+            # scoped exports are independent, run them side by side
+            text = '\n'.join(
+                self.__send_many(Export(path=path) for path in self.__export_paths)
+            )
+            config = self.__parse(text)
+        else:
+            chunks = list()
+            with self.__profiler.timer('parse'):
+                config = MikrotikConfig.parse_stream(
+                    self.__stream(self.__export_command, chunks),
+                    prune=self.pruned_sections
+                )
+            text = ''.join(chunks)
+        if cache is not None:
+            cache.store(self.__export_cache_key, fingerprint, text)
+        return config
+
+    def __clear(self):
+        self.__config = None
+
+    # Configuration verification
+    # -------------------------------------------------------------------------
+
+    def __verify(self, expected, script):
+        """Re-export the sections touched by ``script`` only, and return the
+        script still needed to reach ``expected`` on these sections."""
+        paths, export_paths = make_script_paths(script), self.__export_paths
+        self.__clear()
+        self.__export_paths = paths
+        try:
+            actual = self.config
+        finally:
+            self.__clear()
+            self.__export_paths = export_paths
+        with self.__profiler.timer('diff'):
+            return actual.difference(expected.select(paths))
 
     # Public methods (used by implemented CM modules)
     # -------------------------------------------------------------------------
 
+    def __run(self, commands, before=None, after=None):
+        # protection is only installed once something is about to change
+        self.__protect()
+        self.__backup()
+        self.__changing = True
+        if before:
+            for command in before:
+                self.__send(command)
+        if self.__execution_mode == 'import':
+            response = self.__import(commands)
+        else:
+            response = '\n'.join(map(self.__send, commands))
+        if after:
+            for command in after:
+                self.__send(command)
+        return response
+
     def execute(self, commands, before=None, after=None, no_log=False):
         commands, result = list(commands), None
 
-        if commands and not self.check_mode:
+        if commands and not self.dry_run:
             pre = self.config.copy()
-            if before:
-                for command in before:
-                    self.__send(command)
-            response = '\n'.join(map(self.__send, commands))
-            if after:
-                for command in after:
-                    self.__send(command)
+            response = self.__run(commands, before=before, after=after)
             self.__clear()
             post = self.config.copy()
             changes = pre.difference(post)
@@ -415,25 +821,39 @@ class MikrotikModule(AnsibleModule):
 
         return response, changes
 
-    def configure(self, target, **kwargs):
+    def configure(self, target, before=None, after=None):
         if not isinstance(target, MikrotikConfig):
-            target = MikrotikConfig.parse(target)
+            with self.__profiler.timer('parse'):
+                target = MikrotikConfig.parse(target)
         response = None
 
+        if self.__export_scope == 'target' and self.__config is None:
+            self.__export_paths = target.export_paths
+
         original = self.config
         copy = original.copy()
-        script = copy.merge(target)
-
-        if script and not self.check_mode:
-            response, changes = self.execute(script.commands, **kwargs)
-            missing = original.apply(changes).difference(copy)
-            if missing:
+        with self.__profiler.timer('diff'):
+            script = copy.merge(target)
+
+        changes = script
+        if script.all_commands and not self.dry_run:
+            if self.__protection_required:
+                # inverse script, from the target state back to the original,
+                # finding items by their values as a partial run shifts positions
+                self.__rollback = copy.stable_difference(original)
+                self.__rollback_state = original, script
+            response = self.__run(script.all_commands, before=before, after=after)
+            # the merge already applied the script to the copy in memory
+            missing = self.__verify(copy, script)
+            if missing.all_commands:
                 self.__fail(
                     "Failed to reach target configuration",
                     history=self.history,
-                    changes=list(changes.commands),
-                    missing=list(missing.commands)
+                    changes=list(map(str, script.all_commands)),
+                    missing=list(map(str, missing.all_commands))
                 )
+            self.__rollback_state = None
+            self.__unprotect()
 
         return response, changes
 
@@ -444,8 +864,7 @@ class MikrotikModule(AnsibleModule):
     # -------------------------------------------------------------------------
 
     def __enter__(self):
-        self.__protect()
-        self.__backup()
+        return self
 
     def __exit__(self, exc_type, exc_value, exc_tb):
         if exc_value is not None and False:
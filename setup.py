@@ -10,7 +10,9 @@ _keywords = ['mikrotik', 'ansible', 'configuration']
 # Pwackages
 # --------
 
-_packages = find_packages('src', exclude=("tests", "tests.*"))
+_packages = find_packages(
+    'src', exclude=("tests", "tests.*", "benchmarks", "benchmarks.*")
+)
 _package_dir = {'ansible_mikrotik_utils': 'src/ansible_mikrotik_utils'}
 
 # Additional meta-data
@@ -39,6 +41,18 @@ _classifiers = [
     'Programming Language :: Python :: 2.7',
 ]
 
+# Entry points
+# ------------
+
+_entry_points = {
+    'console_scripts': [
+        'mkr-broker = ansible_mikrotik_utils.connection.broker:main',
+        'mkr-run = ansible_mikrotik_utils.runner:main',
+        'mkr-diff = ansible_mikrotik_utils.device.batch:main',
+        'mkr-simulator = ansible_mikrotik_utils.connection.simulator:main',
+    ],
+}
+
 # Tests
 # -----
 
@@ -66,6 +80,7 @@ setup(
     download_url=_download_url,
     license=_licence,
     classifiers=_classifiers,
+    entry_points=_entry_points,
     setup_requires=_setup_requires,
     tests_require=_tests_require,
 )
@@ -0,0 +1,63 @@
+import os
+import json
+import hashlib
+
+from tempfile import NamedTemporaryFile
+
+from ansible_mikrotik_utils.common import make_bytes, make_native_text
+
+__all__ = [
+    'ExportCache',
+    'make_fingerprint',
+]
+
+
+ENCODING = 'utf-8'
+
+
+def make_fingerprint(text):
+    return hashlib.sha256(make_bytes(text, ENCODING)).hexdigest()
+
+
+class ExportCache(object):
+    """Device exports stored on disk along with a device state fingerprint.
+
+    A cached export is only returned while the device still answers the
+    change detection probe with the fingerprint it was stored with.
+    """
+
+    extension = '.json'
+
+    def __init__(self, directory):
+        self.__directory = directory
+        super(ExportCache, self).__init__()
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    def make_path(self, key):
+        name = hashlib.sha256(make_bytes(key, ENCODING)).hexdigest()
+        return os.path.join(self.__directory, ''.join((name, self.extension)))
+
+    def load(self, key, fingerprint=None):
+        try:
+            with open(self.make_path(key)) as stream:
+                entry = json.load(stream)
+        except (IOError, OSError, ValueError):
+            return None
+        if fingerprint is None or entry.get('fingerprint') == fingerprint:
+            text = entry.get('export')
+            if text is not None:
+                # json strings are unicode on python 2
+                return make_native_text(text, ENCODING)
+
+    def store(self, key, fingerprint, text):
+        try:
+            os.makedirs(self.__directory)
+        except OSError:
+            if not os.path.isdir(self.__directory):
+                raise
+        with NamedTemporaryFile('w', dir=self.__directory, delete=False) as stream:
+            json.dump(dict(key=key, fingerprint=fingerprint, export=text), stream)
+        os.rename(stream.name, self.make_path(key))
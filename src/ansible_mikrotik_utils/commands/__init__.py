@@ -1,5 +1,7 @@
 from .base import BaseCommand, BaseScriptCommand, BaseConfigCommand
-from .script import RawCommand, Export, Enumerate
+from .script import RawCommand, Export, ExportFile, Enumerate
+from .script import Import, PrintHistory, Batch
+from .file import RemoveFile
 from .backup import SaveBackup, LoadBackup, ClearBackup
 from .config import AddCommand, RemoveCommand, MoveCommand, SetCommand
 from .scheduler import BaseSchedulerCommand, AddScheduledTask, RemoveScheduledTask
@@ -1,27 +1,35 @@
-from ansible_mikrotik_utils.common import VALUES_RE, FILE_ID_RE
+from collections import OrderedDict
+from shlex import split
+
+from ansible_mikrotik_utils.common import VALUES_RE, make_path_re
 from ansible_mikrotik_utils.common import parse_values, format_values
 
 from .base import BaseScriptCommand
 from .mixins import StaticPathMixin, StaticCommandMixin
+from .file import RemoveFile
 
 
-class BaseBackupCommand(StaticPathMixin, BaseScriptCommand):
+class BaseBackupCommand(StaticPathMixin, StaticCommandMixin, BaseScriptCommand):
     no_log_options = True
 
     path = '/system backup'
+    path_pattern = make_path_re(path)
     options_pattern = VALUES_RE
+    extension = '.backup'
 
     @classmethod
-    def parse_match(cls, match):
-        kwargs = super(BaseBackupCommand, cls).parse_match(match)
+    def parse_match(cls, matched):
+        kwargs = super(BaseBackupCommand, cls).parse_match(matched)
+        values = parse_values(split(matched['values']))
         kwargs['name'] = values['name']
-        kwargs['key'] = values.get('key')
+        kwargs['key'] = values.get('password')
         return kwargs
 
-    def __init__(self, name, key, *args, **kwargs):
+    def __init__(self, name, key=None, **kwargs):
         self.__name = name
         self.__key = key
-        super().__init__(BaseBackupCommand, self)
+        kwargs.setdefault('path', self.path)
+        super(BaseBackupCommand, self).__init__(**kwargs)
 
     @property
     def name(self):
@@ -31,11 +39,18 @@ class BaseBackupCommand(StaticPathMixin, BaseScriptCommand):
     def key(self):
         return self.__key
 
+    @property
+    def filename(self):
+        if self.name.endswith(self.extension):
+            return self.name
+        else:
+            return ''.join((self.name, self.extension))
+
     @property
     def options(self):
-        values = dict(name=self.name)
+        values = OrderedDict(name=self.name)
         if self.key is not None:
-            values[key] = self.key
+            values['password'] = self.key
         return ' '.join(format_values(values))
 
 
@@ -43,38 +58,17 @@ class SaveBackup(BaseBackupCommand):
     command = 'save'
 
     def apply(self, section):
-        return section.device.add_backup(ConfigBackup(name=self.name, key=self.key))
+        return section.device.add_backup(self.filename, key=self.key)
 
 
 class LoadBackup(BaseBackupCommand):
     command = 'load'
 
     def apply(self, section):
-        return section.device.remove_backup(self.name)
-
-
-class ClearBackup(StaticPathMixin, StaticCommandMixin, BaseScriptCommand):
-    path = '/file'
-    command = 'remove'
-    options_re = FILE_ID_RE
-
-    @classmethod
-    def parse_match(cls, matched):
-        for kwarg in super(ClearBackup, ).parse_match(matched):
-            yield kwarg
-        yield 'name', matched['filename']
-
-    def __init__(self, name, *args, **kwargs):
-        self.__name = name
-        super(BackupCommand, self).__init__(*args, **kwargs)
+        return section.device.check_backup(self.filename)
 
-    @property
-    def name(self):
-        return self.__name
 
-    @property
-    def options(self, section):
-        return self.name
+class ClearBackup(RemoveFile):
 
     def apply(self, section):
         return section.device.remove_backup(self.name)
@@ -1,9 +1,10 @@
 from itertools import chain
 from shlex import split
 
-from ansible_mikrotik_utils.common import VALUES_RE, INDEX_RE
-from ansible_mikrotik_utils.common import DESTINATION_RE, IDENTIFIER_RE
+from ansible_mikrotik_utils.common import VALUES_RE, ITEM_INDEX_RE
+from ansible_mikrotik_utils.common import ITEM_DESTINATION_RE, IDENTIFIER_RE
 from ansible_mikrotik_utils.common import parse_values, format_values, format_add_destination
+from ansible_mikrotik_utils.common import parse_item_reference
 
 from .base import BaseConfigCommand
 from .mixins import InsertionMixin, DeletionMixin, MoveMixin, SettingMixin
@@ -26,7 +27,7 @@ class AddCommand(InsertionMixin, BaseConfigCommand):
     def parse_match(cls, matched):
         values = parse_values(split(matched['values']))
         try:
-            destination = values.pop('place-before')
+            destination = parse_item_reference(values.pop('place-before'))
         except KeyError:
             destination = None
         kwargs = super(AddCommand, cls).parse_match(matched)
@@ -51,12 +52,12 @@ class AddCommand(InsertionMixin, BaseConfigCommand):
 
 class RemoveCommand(DeletionMixin, BaseConfigCommand):
     command = 'remove'
-    options_pattern = INDEX_RE
+    options_pattern = ITEM_INDEX_RE
 
     @classmethod
     def parse_match(cls, matched):
         kwargs = super(RemoveCommand, cls).parse_match(matched)
-        kwargs['index'] = int(matched['index'])
+        kwargs['index'] = parse_item_reference(matched['index'])
         return kwargs
 
     @property
@@ -65,29 +66,41 @@ class RemoveCommand(DeletionMixin, BaseConfigCommand):
 
     def apply(self, section):
         super(RemoveCommand, self).apply(section)
-        return section.delete_item(section.items[self.index])
+        for item in section.lookup_items(self.index):
+            section.delete_item(item)
 
 class MoveCommand(MoveMixin, BaseConfigCommand):
     command = 'move'
-    options_pattern = '{}(\s{})?'.format(INDEX_RE, DESTINATION_RE)
+    options_pattern = '{}(\s{})?'.format(ITEM_INDEX_RE, ITEM_DESTINATION_RE)
 
     @classmethod
     def parse_match(cls, matched):
         kwargs = super(MoveCommand, cls).parse_match(matched)
-        kwargs['index'] = int(matched['index'])
-        kwargs['destination'] = int(matched['destination']) - 1
+        kwargs['index'] = parse_item_reference(matched['index'])
+        if matched['destination'] is None:
+            kwargs['destination'] = None
+        elif matched['destination'].isdigit():
+            kwargs['destination'] = int(matched['destination']) - 1
+        else:
+            kwargs['destination'] = matched['destination']
         return kwargs
 
     @property
     def options(self):
-        if self.destination is not None:
+        if isinstance(self.destination, int):
             return ' '.join(map(str, (self.index, self.destination + 1)))
         else:
-            return str(self.index)
+            return ' '.join(filter(None, (str(self.index), self.destination)))
 
     def apply(self, section):
         super(MoveCommand, self).apply(section)
-        section.move_item(section.items[self.index], destination=self.destination)
+        for item in section.lookup_items(self.index):
+            destination = self.destination
+            if destination is not None and not isinstance(destination, int):
+                # placed before the item found by the destination criteria
+                following = section.lookup_items(destination)[0]
+                destination = section.items.index(following) - 1
+            section.move_item(item, destination=destination)
 
 class SetCommand(SettingMixin, BaseConfigCommand):
     command = 'set'
@@ -106,7 +119,7 @@ class SetCommand(SettingMixin, BaseConfigCommand):
     @property
     def options(self):
         return ' '.join(filter(None, chain(
-            [self.identifier],
+            [str(self.identifier)],
             format_values(self.values)
         )))
 
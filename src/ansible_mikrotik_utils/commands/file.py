@@ -0,0 +1,34 @@
+from ansible_mikrotik_utils.common import FILE_ID_RE, make_path_re
+
+from .base import BaseScriptCommand
+from .mixins import StaticPathMixin, StaticCommandMixin
+
+__all__ = [
+    'RemoveFile',
+]
+
+
+class RemoveFile(StaticPathMixin, StaticCommandMixin, BaseScriptCommand):
+    path = '/file'
+    path_pattern = make_path_re(path)
+    command = 'remove'
+    options_pattern = FILE_ID_RE
+
+    @classmethod
+    def parse_match(cls, matched):
+        kwargs = super(RemoveFile, cls).parse_match(matched)
+        kwargs['name'] = matched['filename']
+        return kwargs
+
+    def __init__(self, name, **kwargs):
+        self.__name = name
+        kwargs.setdefault('path', self.path)
+        super(RemoveFile, self).__init__(**kwargs)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def options(self):
+        return self.name
@@ -1,4 +1,4 @@
-from re import escape
+from re import escape, compile as compile_regex
 
 from ansible_mikrotik_utils.common import classproperty, abstractclassmethod, abstractclassproperty
 from ansible_mikrotik_utils.common import PATH_RE
@@ -15,7 +15,14 @@ class BaseCommandMixin(BasePathMixin):
     @classproperty
     def greedy(cls):
         return not cls.static_path and not cls.static_command
-    
+
+    @classproperty
+    def __path_pattern(cls):
+        return compile_regex('^{}$'.format(cls.path_pattern))
+
+    @classmethod
+    def match_path(cls, text):
+        return cls.__path_pattern.match(text)
 
 
 class StaticPathMixin(BaseStaticPathMixin, BaseCommandMixin):
@@ -69,8 +76,6 @@ class KeyValuePairsMixin(BaseCommandMixin):
 
 class ExistingItemMixin(BaseCommandMixin):
 
-    require_numeric_ids = True
-
     def __init__(self, index, *args, **kwargs):
         self.__index = index
         super(ExistingItemMixin, self).__init__(*args, **kwargs)
@@ -79,6 +84,10 @@ class ExistingItemMixin(BaseCommandMixin):
     def index(self):
         return self.__index
 
+    @property
+    def require_numeric_ids(self):
+        return isinstance(self.__index, int)
+
 
 class PositionedItemMixin(BaseCommandMixin):
 
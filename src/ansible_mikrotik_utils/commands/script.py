@@ -1,4 +1,6 @@
-from .mixins import StaticCommandMixin, StaticOptionsMixin
+from ansible_mikrotik_utils.common import FILE_ID_RE, make_path_re
+
+from .mixins import StaticPathMixin, StaticCommandMixin, StaticOptionsMixin
 from .mixins import NoCommandMixin, NoOptionsMixin
 from .base import BaseScriptCommand
 
@@ -6,6 +8,10 @@ __all__ = [
     'RawCommand',
     'Export',
     'Enumerate',
+    'ExportFile',
+    'Import',
+    'PrintHistory',
+    'Batch',
     'ChangeSection',
 ]
 
@@ -31,11 +37,112 @@ class RawCommand(BaseScriptCommand):
         return self.__options
 
 
-class Export(StaticCommandMixin, BaseScriptCommand):
+class Export(NoOptionsMixin, StaticCommandMixin, BaseScriptCommand):
     no_log_response = True
     command = 'export'
 
 
+class ExportFile(StaticCommandMixin, BaseScriptCommand):
+    command = 'export'
+    options_pattern = 'file=(?P<name>[\w\-0-9_\.]+)'
+    extension = '.rsc'
+
+    @classmethod
+    def parse_match(cls, matched):
+        kwargs = super(ExportFile, cls).parse_match(matched)
+        kwargs['name'] = matched['name']
+        return kwargs
+
+    def __init__(self, name, **kwargs):
+        self.__name = name
+        kwargs.setdefault('path', self.default_path)
+        super(ExportFile, self).__init__(**kwargs)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def filename(self):
+        return ''.join((self.name, self.extension))
+
+    @property
+    def options(self):
+        return 'file={}'.format(self.name)
+
+
 class Enumerate(NoOptionsMixin, StaticCommandMixin, BaseScriptCommand):
     hide = True
     command = 'print'
+
+
+class PrintHistory(StaticPathMixin, StaticCommandMixin, StaticOptionsMixin,
+                   BaseScriptCommand):
+    no_log_response = True
+    path = '/system history'
+    path_pattern = make_path_re(path)
+    command = 'print'
+    options = 'detail without-paging'
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('path', self.path)
+        super(PrintHistory, self).__init__(**kwargs)
+
+
+class Import(StaticCommandMixin, BaseScriptCommand):
+    command = 'import'
+    options_pattern = 'file-name={}( verbose=(?P<verbose>yes|no))?'.format(FILE_ID_RE)
+
+    @classmethod
+    def parse_match(cls, matched):
+        kwargs = super(Import, cls).parse_match(matched)
+        kwargs['filename'] = matched['filename']
+        kwargs['verbose'] = matched['verbose'] == 'yes'
+        return kwargs
+
+    def __init__(self, filename, verbose=True, **kwargs):
+        self.__filename = filename
+        self.__verbose = verbose
+        kwargs.setdefault('path', self.default_path)
+        super(Import, self).__init__(**kwargs)
+
+    @property
+    def filename(self):
+        return self.__filename
+
+    @property
+    def verbose(self):
+        return self.__verbose
+
+    @property
+    def options(self):
+        return 'file-name={} verbose={}'.format(
+            self.filename, 'yes' if self.verbose else 'no'
+        )
+
+
+class Batch(NoOptionsMixin, NoCommandMixin, BaseScriptCommand):
+    """Several commands sent to the device in a single round-trip."""
+
+    separator = '; '
+
+    def __init__(self, commands, **kwargs):
+        self.__commands = list(commands)
+        kwargs.setdefault('path', self.default_path)
+        super(Batch, self).__init__(**kwargs)
+
+    @property
+    def commands(self):
+        return self.__commands
+
+    @property
+    def no_log_response(self):
+        return any(command.no_log_response for command in self.commands)
+
+    @property
+    def full_command(self):
+        return self.text
+
+    @property
+    def text(self):
+        return self.separator.join(command.text for command in self.commands)
@@ -1,9 +1,12 @@
+import mmap
+
+from codecs import getincrementaldecoder
 from collections import OrderedDict
 from inspect import isabstract
-from string import printable
-from shlex import shlex
+from shlex import split
 from enum import Enum
 from abc import abstractproperty, abstractmethod
+from re import compile as compile_regex, escape, DOTALL
 
 
 # Utilities
@@ -87,14 +90,109 @@ ORDERED_APPEND = OrderMode.ORDERED_APPEND
 # Raw text parsing & formatting
 # -----------------------------------------------------------------------------
 
+LINE_TOKEN_RE = compile_regex(
+    r'"(?:[^"\\]|\\.)*"?|\\(?:\n[ \t]*|.)?|#[^\n]*|[\n;]|[^"\\#\n;]+', DOTALL
+)
+ESCAPE_RE = compile_regex(r'\\(?:\n[ \t]*|.)', DOTALL)
+
+def strip_continuation(match):
+    escape = match.group()
+    return '' if escape.startswith('\\\n') else escape
+
 def split_lines(text):
-    line_lexer = shlex(text, posix=True)
-    line_lexer.quotes = '"'
-    line_lexer.whitespace = '\n;'
-    line_lexer.wordchars = set(printable) - set(
-        line_lexer.quotes + line_lexer.whitespace + line_lexer.escape
-    )
-    return list(line_lexer)
+    """Split a script into its commands, at the newlines and semicolons
+    outside of quotes. Comments and line continuations are dropped, quotes
+    and escapes are kept for the parsing of each command."""
+    lines, parts = list(), list()
+    for match in LINE_TOKEN_RE.finditer(text):
+        token = match.group()
+        if token in ('\n', ';'):
+            lines.append(''.join(parts))
+            del parts[:]
+        elif token.startswith('"'):
+            parts.append(ESCAPE_RE.sub(strip_continuation, token))
+        elif not token.startswith(('#', '\\\n')):
+            parts.append(token)
+    lines.append(''.join(parts))
+    return [line for line in lines if line.strip()]
+
+LINE_SPECIAL_RE = compile_regex(r'[\n"\\#]')
+QUOTED_SPECIAL_RE = compile_regex(r'["\\]')
+
+def split_lines_stream(chunks):
+    # Cuts the text at newlines that end a line for the lexer (outside of
+    # quotes, escapes and comments), so that each complete part can go
+    # through split_lines as soon as it has arrived.
+    pending = ''
+    quoted = escaped = commented = False
+    for chunk in chunks:
+        text = ''.join((pending, chunk))
+        index, boundary = len(pending), 0
+        while index < len(text):
+            if escaped:
+                escaped = False
+                index += 1
+            elif commented:
+                end = text.find('\n', index)
+                if end < 0:
+                    break
+                commented = False
+                index = boundary = end + 1
+            else:
+                pattern = QUOTED_SPECIAL_RE if quoted else LINE_SPECIAL_RE
+                match = pattern.search(text, index)
+                if match is None:
+                    break
+                index, char = match.end(), match.group()
+                if char == '\\':
+                    escaped = True
+                elif char == '"':
+                    quoted = not quoted
+                elif char == '#':
+                    commented = True
+                else:
+                    boundary = index
+        if boundary:
+            for line in split_lines(text[:boundary]):
+                yield line
+        pending = text[boundary:]
+    if pending:
+        for line in split_lines(pending):
+            yield line
+
+FILE_CHUNK_SIZE = 1 << 20
+
+def make_native_text(text, encoding='utf-8'):
+    # The python 2 lexer and ``str`` methods only handle byte strings.
+    if str is bytes:
+        return text.encode(encoding)
+    return text
+
+def make_bytes(text, encoding='utf-8'):
+    if isinstance(text, bytes):
+        return text
+    return text.encode(encoding)
+
+def iter_file_chunks(path, encoding='utf-8', size=FILE_CHUNK_SIZE):
+    # Decodes the memory-mapped file one slice at a time, so that the whole
+    # file is never copied nor decoded at once.
+    with open(path, 'rb') as stream:
+        try:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # empty files cannot be mapped
+            return
+        try:
+            decoder = getincrementaldecoder(encoding)('replace')
+            for offset in range(0, len(mapped), size):
+                text = decoder.decode(mapped[offset:offset + size])
+                if text:
+                    yield make_native_text(text, encoding)
+            text = decoder.decode(b'', True)
+            if text:
+                yield make_native_text(text, encoding)
+        finally:
+            mapped.close()
 
 def parse_path(text):
     if text.startswith('/'):
@@ -113,12 +211,47 @@ def parse_value(word):
 def parse_values(words):
     return OrderedDict(map(parse_value, words))
 
+QUOTED_CHARACTERS = frozenset(' \t\n;"\\#$[]{}=')
+REQUOTED_CHARACTERS = frozenset(' \t\n;"\\')
+
+def format_string(value):
+    if value and not QUOTED_CHARACTERS.intersection(value):
+        return value
+    return '"{}"'.format(value.replace('\\', '\\\\').replace('"', '\\"'))
+
+def format_word(word):
+    # quotes back a word split out of a command, for the command parser
+    key, separator, value = word.partition('=')
+    if separator and REQUOTED_CHARACTERS.intersection(value):
+        return '='.join((key, format_string(value)))
+    elif not separator and REQUOTED_CHARACTERS.intersection(word):
+        return format_string(word)
+    return word
+
 def format_value(value):
-    return '='.join(value)
+    key, value = value
+    return '='.join((key, format_string(value)))
 
 def format_values(values):
     return list(map(format_value, values.items()))
 
+def parse_find_criteria(identifier):
+    try:
+        match = FIND_IDENTIFIER_RE.match(identifier)
+    except TypeError:
+        return None
+    if match:
+        return parse_values(split(match.group('criteria')))
+
+def parse_item_reference(text):
+    if text.isdigit():
+        return int(text)
+    else:
+        return text
+
+def format_find_identifier(criteria):
+    return '[ find {} ]'.format(' '.join(format_values(criteria)))
+
 def format_add_destination(destination):
     if destination is not None:
         return 'place-before={}'.format(destination)
@@ -129,8 +262,10 @@ def format_censored(text):
     lines = split_lines(text)
     if len(lines) > 1:
         return '<{} censored lines>'.format(len(lines))
+    elif lines:
+        return '<{} censored characters>'.format(len(lines[0]))
     else:
-        return '<{} censord characters>'.format(len(lines[0]))
+        return '<0 censored characters>'
 
 # Patterns
 # -----------------------------------------------------------------------------
@@ -142,6 +277,9 @@ INDEX_RE = "(?P<index>\d+)"
 COMMAND_RE = "(?P<command>{}+)".format(NAME_RE)
 OPTIONS_RE = "(?P<options>.+)"
 DESTINATION_RE = "(?P<destination>\d+)"
+ITEM_FIND_RE = r'\[\s?find\s+(?:"(?:[^"\\]|\\.)*"|[^\]"])*\]'
+ITEM_INDEX_RE = "(?P<index>\d+|{})".format(ITEM_FIND_RE)
+ITEM_DESTINATION_RE = "(?P<destination>\d+|{})".format(ITEM_FIND_RE)
 NUMERIC_ID_RE = "(?P<numeric_identifier>[0-9]+)"
 STRING_ID_RE = "(?P<string_identifier>[\w\-0-9_]+)"
 FILE_ID_RE = "(?P<filename>[\w\-0-9_\.\@\=\+]+)"
@@ -150,6 +288,11 @@ ABSOLUTE_PATH_RE = "(?P<absolute>\/)"
 PATH_RE = "(?P<path>{}?{})".format(ABSOLUTE_PATH_RE, NAMES_RE)
 DYNAMIC_ID_RE = "(?P<dynamic_identifier>\[\s?find\s+({}\s?)+\s?\])".format(DYNAMIC_CRITERIA_RE)
 IDENTIFIER_RE = "(?P<identifier>{}|{}|{})".format(NUMERIC_ID_RE, STRING_ID_RE, DYNAMIC_ID_RE)
+FIND_IDENTIFIER_RE = compile_regex(r"^\[\s?find\s+(?P<criteria>.*?)\s?\]$")
 
 
 optional_re = '({})?'.format
+
+
+def make_path_re(path):
+    return '(?P<path>{})'.format(escape(path))
@@ -0,0 +1,296 @@
+import hashlib
+
+from collections import Counter
+from re import compile as compile_regex, MULTILINE
+from shlex import split
+
+from ansible_mikrotik_utils.device import Device
+from ansible_mikrotik_utils.serialization import dumps, loads
+
+__all__ = [
+    'MikrotikConfig',
+    'LayeredConfig',
+    'make_script_paths',
+    'split_blocks',
+]
+
+
+BLOCK_START_RE = compile_regex(r'^/', MULTILINE)
+
+
+def split_blocks(text):
+    """Cut an export into ``(header, block)`` pairs, where every block but
+    a leading preamble starts with a ``/path`` header line."""
+    starts = [match.start() for match in BLOCK_START_RE.finditer(text)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    starts.append(len(text))
+    for start, end in zip(starts, starts[1:]):
+        block = text[start:end]
+        if block.startswith('/'):
+            yield block.split('\n', 1)[0].strip(), block
+        else:
+            yield None, block
+
+
+def make_block_digest(block):
+    return hashlib.sha1(block.encode('utf-8')).digest()
+
+
+def make_block_digests(blocks):
+    counts = Counter(header for header, _ in blocks)
+    return dict(
+        (header, make_block_digest(block))
+        for header, block in blocks
+        if header is not None and counts[header] == 1
+    )
+
+
+def make_script_paths(script):
+    """Paths of the topmost sections of ``script`` holding commands."""
+    paths = list()
+    for section in script.traverse():
+        if section.commands and not any(
+            section.path.startswith(''.join((path, ' '))) for path in paths
+        ):
+            paths.append(section.path)
+    return paths
+
+
+class MikrotikConfig(object):
+    """Configuration of a whole device, as handled by the Ansible modules.
+
+    This wraps the root :class:`ConfigSection` of a device, and keeps the
+    device alive as long as the configuration is used.
+    """
+
+    def __init__(self, root=None):
+        if root is None:
+            self.__device = Device()
+            self.__root = self.__device.root
+        else:
+            self.__device = root.device
+            self.__root = root
+        super(MikrotikConfig, self).__init__()
+
+    @classmethod
+    def parse(cls, text, prune=()):
+        new = cls()
+        new.root.load_text(text)
+        new.prune(prune)
+        return new
+
+    @classmethod
+    def parse_stream(cls, chunks, prune=()):
+        new = cls()
+        new.root.load_stream(chunks)
+        new.prune(prune)
+        return new
+
+    @classmethod
+    def load(cls, path, prune=()):
+        new = cls()
+        new.root.load_file(path)
+        new.prune(prune)
+        return new
+
+    @classmethod
+    def loads(cls, data):
+        device = Device()
+        return cls(loads(data, device))
+
+    @classmethod
+    def load_cached(cls, cache, key, prune=()):
+        """Parse the export stored in ``cache`` under ``key``, whatever the
+        device state fingerprint, or return None if there is none."""
+        text = cache.load(key)
+        if text is not None:
+            return cls.parse(text, prune=prune)
+
+    # Special methods
+    # -------------------------------------------------------------------------
+
+    def __str__(self):
+        return str(self.__root)
+
+    # Public properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def device(self):
+        return self.__device
+
+    @property
+    def root(self):
+        return self.__root
+
+    @property
+    def export_paths(self):
+        return self.__root.export_paths
+
+    # Public methods
+    # -------------------------------------------------------------------------
+
+    def prune(self, paths):
+        for path in paths:
+            names = split(path.lstrip('/'))
+            section = self.__root
+            for name in names[:-1]:
+                try:
+                    section = section.children[name]
+                except KeyError:
+                    break
+            else:
+                section.children.pop(names[-1], None)
+
+    def select(self, paths):
+        """Copy of the sections at ``paths`` (and their children) only."""
+        new = type(self)()
+        for path in paths:
+            names = split(path.lstrip('/'))
+            source, destination = self.__root, new.root
+            for name in names[:-1]:
+                source, destination = source[name], destination[name]
+            destination.children[names[-1]] = source[names[-1]].copy(
+                parent=destination
+            )
+        return new
+
+    def __find(self, header):
+        section = self.__root
+        for name in split(header.lstrip('/')):
+            try:
+                section = section.children[name]
+            except KeyError:
+                return None
+        return section
+
+    def reparse(self, previous_text, text, prune=()):
+        """Parse ``text``, the new export of the device whose previous
+        export ``previous_text`` was parsed into this configuration.
+
+        Only the ``/path`` blocks whose contents changed are parsed, the
+        others reuse the items and settings of this configuration.
+        """
+        previous = make_block_digests(list(split_blocks(previous_text)))
+        blocks = list(split_blocks(text))
+        counts = Counter(header for header, _ in blocks)
+        new = MikrotikConfig()
+        for header, block in blocks:
+            source = None
+            if (
+                header is not None and counts[header] == 1 and
+                previous.get(header) == make_block_digest(block)
+            ):
+                source = self.__find(header)
+            if source is None:
+                new.root.load_text(block)
+                continue
+            section = new.root
+            for name in split(header.lstrip('/')):
+                section = section[name]
+            section.extend(
+                items=source.items,
+                settings=[setting.copy() for setting in source.settings.values()]
+            )
+            section.commands.extend(source.commands)
+        new.prune(prune)
+        return new
+
+    def dumps(self):
+        return dumps(self.__root)
+
+    def overlay(self, text):
+        return LayeredConfig(self, text)
+
+    def copy(self):
+        return type(self)(self.__root.copy())
+
+    def merge(self, target):
+        return self.__root.merge(target.root)
+
+    def difference(self, target):
+        return self.__root.difference(target.root)
+
+    def stable_difference(self, target):
+        """Commands bringing this configuration to ``target``, referring to
+        items by their values instead of their positions."""
+        work, commands = self.copy(), list()
+        for source in self.difference(target).traverse():
+            if source.commands:
+                section, original = work.root, target.root
+                for name in source.ascendant_names + [source.name]:
+                    if name:
+                        section, original = section[name], original[name]
+                commands.extend(
+                    section.make_stable_commands(source.commands, original)
+                )
+        return commands
+
+    def apply(self, script):
+        self.__root.apply(script)
+        return self
+
+
+def make_view(section, parent=None, device=None):
+    view = type(section)(
+        parent=parent, device=device, name=section.name,
+        items=section.items, settings=section.settings,
+    )
+    view.children.update(section.children)
+    return view
+
+
+class LayeredConfig(MikrotikConfig):
+    """Base configuration with an overlay configuration loaded on top.
+
+    Sections untouched by the overlay are shared with the base, and only the
+    sections leading to the changed ones are copied, so that many targets
+    can be built over a single parsed base. Shared sections must not be
+    changed: a layered configuration is meant to be used as a target, and
+    :meth:`copy` gives an independent configuration.
+    """
+
+    def __init__(self, base, overlay=None):
+        self.__device = Device()
+        self.__base = base
+        super(LayeredConfig, self).__init__(
+            make_view(base.root, device=self.__device)
+        )
+        if overlay:
+            self.load_overlay(overlay)
+
+    @property
+    def base(self):
+        return self.__base
+
+    def __section(self, names):
+        section = self.root
+        for name in names:
+            child = section.children.get(name)
+            if child is None:
+                section = section[name]
+            elif child.parent is not section:
+                section.children[name] = make_view(child, parent=section)
+                section = section.children[name]
+            else:
+                section = child
+        return section
+
+    def prune(self, paths):
+        for path in paths:
+            names = split(path.lstrip('/'))
+            self.__section(names[:-1]).children.pop(names[-1], None)
+
+    def copy(self):
+        return MikrotikConfig(self.root.copy())
+
+    def load_overlay(self, text):
+        overlay = MikrotikConfig.parse(text)
+        for source in overlay.root.traverse():
+            if source.commands:
+                names = source.ascendant_names + [source.name]
+                section = self.__section(name for name in names if name)
+                for command in source.commands:
+                    section.load_command(command)
+        return self
@@ -0,0 +1,6 @@
+from .base import CLI_PROMPTS_RE, CLI_ERRORS_RE, HOST_KEY_POLICIES, match_error
+from .base import match_export_error, import_paramiko
+from .base import BaseTransport, SSHTransport
+from .shell import ShellTransport
+from .broker import ConnectionBroker, BrokerTransport, spawn_broker
+from .session import DeviceSession
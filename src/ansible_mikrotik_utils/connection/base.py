@@ -0,0 +1,362 @@
+import socket
+
+from abc import ABCMeta, abstractmethod
+from codecs import getincrementaldecoder
+from re import compile as compile_regex, MULTILINE
+
+from ansible_mikrotik_utils.common import make_native_text
+from ansible_mikrotik_utils.exceptions import TransportError, CommandError
+from ansible_mikrotik_utils.exceptions import ResolveError, AuthenticationError
+
+__all__ = [
+    'CLI_PROMPTS_RE',
+    'CLI_ERRORS_RE',
+    'HOST_KEY_POLICIES',
+    'match_error',
+    'match_export_error',
+    'import_paramiko',
+    'ssh_errors',
+    'BaseTransport',
+    'SSHTransport',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+TEST_COMMAND = 'test'
+TEST_RESPONSE = 'bad command name test (line 1 column 1)'
+ENCODING = 'utf-8'
+BUFFER_SIZE = 32768
+
+# paramiko policy classes for hosts missing from the known hosts
+HOST_KEY_POLICIES = {
+    'reject': 'RejectPolicy',
+    'warn': 'WarningPolicy',
+    'accept': 'AutoAddPolicy',
+}
+
+CLI_PROMPTS_RE = [
+    compile_regex(r"\[([\w\-]+)@([\.\w\-]+)\]\s(\/(\w+\s?)*)?\>"),
+]
+
+CLI_ERRORS_RE = [
+    compile_regex(r"^failure: (.*)", MULTILINE),
+    compile_regex(r"^bad command name ([\w\-]+) \(line \d+ column \d+\)", MULTILINE),
+    compile_regex(r"^syntax error \(line \d+ column \d+\)", MULTILINE),
+    compile_regex(r"^expected end of command \(line \d+ column \d+\)", MULTILINE),
+    compile_regex(r"^expected command name \(line \d+ column \d+\)", MULTILINE),
+
+]
+
+
+def match_error(response):
+    """Whether a line of ``response`` starts with a device error."""
+    for pattern in CLI_ERRORS_RE:
+        if pattern.search(response):
+            return True
+    return False
+
+
+def match_export_error(response):
+    """Whether an export failed: the device then answers an error instead
+    of the configuration, whose values are never matched."""
+    return match_error(response.split('\n', 1)[0])
+
+
+def import_paramiko():
+    """Import paramiko on first use only, loading it and its crypto
+    backend takes most of the startup time of a module run."""
+    import paramiko
+    return paramiko
+
+
+def ssh_errors(*errors):
+    """Exception classes for an ``except`` clause catching paramiko
+    errors, without importing paramiko before it is needed."""
+    return (import_paramiko().SSHException, ) + errors
+
+
+def decode(data):
+    if isinstance(data, bytes):
+        data = data.decode(ENCODING, 'replace')
+    return make_native_text(data, ENCODING)
+
+
+# Transports
+# -----------------------------------------------------------------------------
+
+class BaseTransport(object):
+    __metaclass__ = ABCMeta
+
+    def __init__(self, host, port=22, username=None, password=None,
+                 key_filename=None, timeout=10, compress=False,
+                 host_key_policy='reject'):
+        if host_key_policy not in HOST_KEY_POLICIES:
+            raise ValueError(
+                "Unknown host key policy: {}".format(host_key_policy)
+            )
+        self.__host = host
+        self.__port = port
+        self.__username = username
+        self.__password = password
+        self.__key_filename = key_filename
+        self.__timeout = timeout
+        self.__compress = compress
+        self.__host_key_policy = host_key_policy
+        super(BaseTransport, self).__init__()
+
+    # Context manager implementation
+    # -------------------------------------------------------------------------
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.close()
+
+    # Public properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def host(self):
+        return self.__host
+
+    @property
+    def port(self):
+        return self.__port
+
+    @property
+    def username(self):
+        return self.__username
+
+    @property
+    def password(self):
+        return self.__password
+
+    @property
+    def key_filename(self):
+        return self.__key_filename
+
+    @property
+    def timeout(self):
+        return self.__timeout
+
+    @property
+    def compress(self):
+        return self.__compress
+
+    @property
+    def host_key_policy(self):
+        return self.__host_key_policy
+
+    @property
+    def target(self):
+        return dict(
+            host=self.host,
+            port=self.port,
+            username=self.username,
+            password=self.password,
+            key_filename=self.key_filename,
+            timeout=self.timeout,
+            compress=self.compress,
+            host_key_policy=self.host_key_policy,
+        )
+
+    # Implementation-dependent methods & properties
+    # -------------------------------------------------------------------------
+
+    @abstractmethod
+    def open(self):
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    @abstractmethod
+    def execute(self, text, timeout=None):
+        pass
+
+    def stream(self, text, timeout=None):
+        response, error = self.execute(text, timeout=timeout)
+        if error:
+            raise CommandError(error)
+        yield response
+
+    def execute_many(self, texts, timeout=None, channels=1):
+        """Execute independent read-only commands, returning their
+        ``(response, error)`` pairs in the order of ``texts``."""
+        return [self.execute(text, timeout=timeout) for text in texts]
+
+    @abstractmethod
+    def upload(self, filename, data):
+        pass
+
+    @abstractmethod
+    def download(self, filename):
+        pass
+
+
+class SSHTransport(BaseTransport):
+    """Direct SSH connection, opened and authenticated by this process."""
+
+    def __init__(self, *args, **kwargs):
+        self.__client = None
+        super(SSHTransport, self).__init__(*args, **kwargs)
+
+    # Public properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def opened(self):
+        return self.__client is not None
+
+    @property
+    def client(self):
+        return self.__client
+
+    @property
+    def transport(self):
+        if self.__client is not None:
+            return self.__client.get_transport()
+
+    @property
+    def active(self):
+        transport = self.transport
+        return transport is not None and transport.is_active()
+
+    # Connection handling
+    # -------------------------------------------------------------------------
+
+    def __test(self):
+        stdout, _ = self.execute(TEST_COMMAND)
+        if TEST_RESPONSE not in stdout.splitlines():
+            raise TransportError(
+                "Connection test failed. (result:{})".format(stdout)
+            )
+
+    def open(self):
+        if self.__client is None:
+            paramiko = import_paramiko()
+            client = paramiko.SSHClient()
+            client.load_system_host_keys()
+            client.set_missing_host_key_policy(
+                getattr(paramiko, HOST_KEY_POLICIES[self.host_key_policy])()
+            )
+            try:
+                client.connect(
+                    hostname=self.host,
+                    port=self.port,
+                    username=self.username,
+                    password=self.password,
+                    key_filename=self.key_filename,
+                    timeout=self.timeout,
+                    compress=self.compress,
+                    allow_agent=True, look_for_keys=False
+                )
+            except socket.gaierror:
+                raise ResolveError(
+                    "Unable to resolve hostname. (host:{})".format(self.host)
+                )
+            except paramiko.AuthenticationException:
+                raise AuthenticationError(
+                    "Unable to authenticate (user:{})".format(self.username)
+                )
+            except ssh_errors(IOError) as ex:
+                raise TransportError("Unable to connect ({})".format(str(ex)))
+            self.__client = client
+            try:
+                self.__test()
+            except ssh_errors(IOError):
+                self.close()
+                raise
+
+    def close(self):
+        if self.__client is not None:
+            self.__client.close()
+            self.__client = None
+
+    # Command execution
+    # -------------------------------------------------------------------------
+
+    def execute(self, text, timeout=None):
+        try:
+            _, stdout, stderr = self.__client.exec_command(
+                text, timeout=timeout or self.timeout
+            )
+            error = decode(stderr.read())
+            response = decode(stdout.read())
+        except ssh_errors(socket.error) as ex:
+            raise TransportError("Command failed ({})".format(str(ex)))
+        return response, error
+
+    def execute_many(self, texts, timeout=None, channels=1):
+        """Same as :meth:`BaseTransport.execute_many`, running up to
+        ``channels`` commands at once on their own channel of the
+        connection."""
+        texts = list(texts)
+        channels = min(channels, len(texts))
+        if channels <= 1:
+            return super(SSHTransport, self).execute_many(texts, timeout=timeout)
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(channels)
+        try:
+            return pool.map(
+                lambda text: self.execute(text, timeout=timeout), texts
+            )
+        finally:
+            pool.close()
+            pool.join()
+
+    def stream(self, text, timeout=None):
+        decoder = getincrementaldecoder(ENCODING)('replace')
+        try:
+            _, stdout, stderr = self.__client.exec_command(
+                text, timeout=timeout or self.timeout
+            )
+            try:
+                while True:
+                    data = stdout.channel.recv(BUFFER_SIZE)
+                    if not data:
+                        break
+                    chunk = decoder.decode(data)
+                    if chunk:
+                        yield make_native_text(chunk, ENCODING)
+                chunk = decoder.decode(b'', True)
+                if chunk:
+                    yield make_native_text(chunk, ENCODING)
+                error = decode(stderr.read())
+            finally:
+                stdout.channel.close()
+        except ssh_errors(socket.error) as ex:
+            raise TransportError("Command failed ({})".format(str(ex)))
+        if error:
+            raise CommandError(error)
+
+    # File transfer
+    # -------------------------------------------------------------------------
+
+    def upload(self, filename, data):
+        try:
+            sftp = self.__client.open_sftp()
+            try:
+                with sftp.open(filename, 'wb') as remote:
+                    remote.write(data)
+            finally:
+                sftp.close()
+        except ssh_errors(IOError) as ex:
+            raise TransportError("Upload failed ({})".format(str(ex)))
+
+    def download(self, filename):
+        try:
+            sftp = self.__client.open_sftp()
+            try:
+                with sftp.open(filename, 'rb') as remote:
+                    remote.prefetch()
+                    return remote.read()
+            finally:
+                sftp.close()
+        except ssh_errors(IOError) as ex:
+            raise TransportError("Download failed ({})".format(str(ex)))
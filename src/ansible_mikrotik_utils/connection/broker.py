@@ -0,0 +1,460 @@
+import os
+import sys
+import json
+import socket
+import hashlib
+
+from base64 import b64encode, b64decode
+
+from fcntl import flock, LOCK_EX, LOCK_NB
+from threading import Lock, Thread, Event
+from time import time, sleep
+
+try:
+    from socketserver import ThreadingMixIn, UnixStreamServer
+    from socketserver import StreamRequestHandler
+except ImportError:
+    from SocketServer import ThreadingMixIn, UnixStreamServer
+    from SocketServer import StreamRequestHandler
+
+from ansible_mikrotik_utils.exceptions import TransportError
+from ansible_mikrotik_utils.exceptions import ResolveError, AuthenticationError
+
+from .base import BaseTransport, SSHTransport, ENCODING, decode
+
+__all__ = [
+    'ConnectionPool',
+    'ConnectionBroker',
+    'BrokerTransport',
+    'spawn_broker',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+DEFAULT_IDLE_TIMEOUT = 300
+SPAWN_TIMEOUT = 10
+SPAWN_POLL_INTERVAL = 0.05
+EXPIRE_INTERVAL = 1
+
+FAILURE_KINDS = (
+    ('resolve', ResolveError),
+    ('authentication', AuthenticationError),
+    ('transport', TransportError),
+)
+
+
+# Protocol
+# -----------------------------------------------------------------------------
+#
+# Clients talk to the broker with JSON messages, one per line. A session
+# starts with an ``open`` message carrying the target device parameters, and
+# continues with ``execute``, ``upload`` and ``download`` messages. Each message gets exactly one reply,
+# which holds a ``failure`` kind and ``message`` when the operation failed.
+
+def make_pool_key(target):
+    # every parameter of the target affects the connection made for it
+    text = json.dumps(target, sort_keys=True)
+    return hashlib.sha256(text.encode(ENCODING)).hexdigest()
+
+
+def make_failure(exception):
+    for kind, klass in FAILURE_KINDS:
+        if isinstance(exception, klass):
+            return dict(failure=kind, message=str(exception))
+
+
+def raise_failure(reply):
+    for kind, klass in FAILURE_KINDS:
+        if reply['failure'] == kind:
+            raise klass(reply['message'])
+    raise TransportError(reply['message'])
+
+
+def send_message(stream, message):
+    stream.write(json.dumps(message).encode(ENCODING) + b'\n')
+    stream.flush()
+
+
+def receive_message(stream):
+    line = stream.readline()
+    if line:
+        return json.loads(line.decode(ENCODING))
+
+
+# Connection pool
+# -----------------------------------------------------------------------------
+
+class PooledConnection(object):
+
+    def __init__(self, target):
+        self.__transport = SSHTransport(**target)
+        self.__lock = Lock()
+        self.__users = 0
+        self.__last_used = time()
+        super(PooledConnection, self).__init__()
+
+    @property
+    def transport(self):
+        return self.__transport
+
+    def acquire(self):
+        with self.__lock:
+            self.__users += 1
+            self.__last_used = time()
+
+    def connect(self):
+        with self.__lock:
+            if not self.__transport.active:
+                self.__transport.close()
+                self.__transport.open()
+
+    def release(self):
+        with self.__lock:
+            self.__users -= 1
+            self.__last_used = time()
+
+    def execute(self, text, timeout=None):
+        self.__last_used = time()
+        return self.__transport.execute(text, timeout=timeout)
+
+    def execute_many(self, texts, timeout=None, channels=1):
+        self.__last_used = time()
+        return self.__transport.execute_many(
+            texts, timeout=timeout, channels=channels
+        )
+
+    def upload(self, filename, data):
+        self.__last_used = time()
+        return self.__transport.upload(filename, data)
+
+    def download(self, filename):
+        self.__last_used = time()
+        return self.__transport.download(filename)
+
+    def expired(self, idle_timeout):
+        return (
+            self.__users <= 0 and
+            time() - self.__last_used > idle_timeout
+        )
+
+    def close(self):
+        with self.__lock:
+            self.__transport.close()
+
+
+class ConnectionPool(object):
+
+    def __init__(self, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.__idle_timeout = idle_timeout
+        self.__connections = dict()
+        self.__lock = Lock()
+        super(ConnectionPool, self).__init__()
+
+    def __len__(self):
+        return len(self.__connections)
+
+    def acquire(self, target):
+        key = make_pool_key(target)
+        # acquired under the pool lock, so that it cannot expire in between
+        with self.__lock:
+            try:
+                connection = self.__connections[key]
+            except KeyError:
+                connection = PooledConnection(target)
+                self.__connections[key] = connection
+            connection.acquire()
+        try:
+            connection.connect()
+        except TransportError:
+            self.__discard(key, connection)
+            raise
+        return connection
+
+    def __discard(self, key, connection):
+        # a failed open leaves the transport closed, other users of the
+        # connection retry on their own
+        with self.__lock:
+            if self.__connections.get(key) is connection:
+                del self.__connections[key]
+        connection.release()
+
+    def release(self, connection):
+        connection.release()
+
+    def expire(self):
+        with self.__lock:
+            expired = [
+                key for key, connection in self.__connections.items()
+                if connection.expired(self.__idle_timeout)
+            ]
+            connections = [self.__connections.pop(key) for key in expired]
+        for connection in connections:
+            connection.close()
+
+    def close(self):
+        with self.__lock:
+            connections = list(self.__connections.values())
+            self.__connections.clear()
+        for connection in connections:
+            connection.close()
+
+
+# Broker server
+# -----------------------------------------------------------------------------
+
+class BrokerRequestHandler(StreamRequestHandler):
+
+    def __dispatch(self, message):
+        operation = message.get('operation')
+        if operation == 'open':
+            if self.device_connection is None:
+                self.device_connection = self.server.pool.acquire(message['target'])
+            return dict()
+        elif operation == 'execute':
+            if self.device_connection is None:
+                raise TransportError("No device connection opened.")
+            response, error = self.device_connection.execute(
+                message['text'], timeout=message.get('timeout')
+            )
+            return dict(response=response, error=error)
+        elif operation == 'execute_many':
+            if self.device_connection is None:
+                raise TransportError("No device connection opened.")
+            results = self.device_connection.execute_many(
+                message['texts'], timeout=message.get('timeout'),
+                channels=message.get('channels', 1)
+            )
+            return dict(results=[list(result) for result in results])
+        elif operation == 'upload':
+            if self.device_connection is None:
+                raise TransportError("No device connection opened.")
+            self.device_connection.upload(
+                message['filename'], b64decode(message['data'])
+            )
+            return dict()
+        elif operation == 'download':
+            if self.device_connection is None:
+                raise TransportError("No device connection opened.")
+            data = self.device_connection.download(message['filename'])
+            return dict(data=b64encode(data).decode('ascii'))
+        else:
+            raise TransportError("Unknown operation: {}".format(operation))
+
+    def handle(self):
+        self.device_connection = None
+        try:
+            while True:
+                message = receive_message(self.rfile)
+                if message is None:
+                    break
+                self.server.touch()
+                try:
+                    reply = self.__dispatch(message)
+                except TransportError as ex:
+                    reply = make_failure(ex)
+                send_message(self.wfile, reply)
+        finally:
+            if self.device_connection is not None:
+                self.server.pool.release(self.device_connection)
+            self.server.touch()
+
+
+class ConnectionBroker(ThreadingMixIn, UnixStreamServer):
+    """Local server keeping authenticated device connections alive.
+
+    Pooled connections are closed once unused for ``idle_timeout`` seconds,
+    and the broker stops itself when its pool stays empty for that long.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, path, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+        self.pool = ConnectionPool(idle_timeout=idle_timeout)
+        self.__path = path
+        self.__idle_timeout = idle_timeout
+        self.__last_activity = time()
+        self.__stopped = Event()
+        if os.path.exists(path):
+            os.unlink(path)
+        umask = os.umask(0o077)
+        try:
+            UnixStreamServer.__init__(self, path, BrokerRequestHandler)
+        finally:
+            os.umask(umask)
+
+    @property
+    def path(self):
+        return self.__path
+
+    def touch(self):
+        self.__last_activity = time()
+
+    def __expire(self):
+        while not self.__stopped.wait(EXPIRE_INTERVAL):
+            self.pool.expire()
+            idle = time() - self.__last_activity
+            if not len(self.pool) and idle > self.__idle_timeout:
+                self.shutdown()
+                break
+
+    def serve(self):
+        expiry = Thread(target=self.__expire)
+        expiry.daemon = True
+        expiry.start()
+        try:
+            self.serve_forever()
+        finally:
+            self.__stopped.set()
+            self.pool.close()
+            self.server_close()
+            if os.path.exists(self.__path):
+                os.unlink(self.__path)
+
+
+# Broker client
+# -----------------------------------------------------------------------------
+
+def connect_broker(path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        raise
+    return sock
+
+
+def spawn_broker(path, idle_timeout=DEFAULT_IDLE_TIMEOUT):
+    import subprocess
+    with open(os.devnull, 'r+b') as devnull:
+        subprocess.Popen(
+            [
+                sys.executable, '-m', __name__,
+                '--socket', path,
+                '--idle-timeout', str(idle_timeout),
+            ],
+            stdin=devnull, stdout=devnull, stderr=devnull,
+            close_fds=True, preexec_fn=os.setsid,
+        )
+    deadline = time() + SPAWN_TIMEOUT
+    while time() < deadline:
+        try:
+            return connect_broker(path)
+        except socket.error:
+            sleep(SPAWN_POLL_INTERVAL)
+    raise TransportError(
+        "Unable to start connection broker. (socket:{})".format(path)
+    )
+
+
+class BrokerTransport(BaseTransport):
+    """Connection borrowed from a local :class:`ConnectionBroker`.
+
+    The broker is spawned on first use if nothing listens on the socket.
+    Closing this transport only ends the session with the broker, the
+    device connection stays in its pool for the next module run.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.__socket_path = kwargs.pop('socket_path')
+        try:
+            self.__idle_timeout = kwargs.pop('idle_timeout')
+        except KeyError:
+            self.__idle_timeout = DEFAULT_IDLE_TIMEOUT
+        self.__socket = None
+        self.__stream = None
+        super(BrokerTransport, self).__init__(*args, **kwargs)
+
+    @property
+    def socket_path(self):
+        return self.__socket_path
+
+    @property
+    def opened(self):
+        return self.__socket is not None
+
+    def __request(self, **message):
+        try:
+            send_message(self.__stream, message)
+            reply = receive_message(self.__stream)
+        except (socket.error, ValueError) as ex:
+            self.close()
+            raise TransportError("Connection broker failure ({})".format(str(ex)))
+        if reply is None:
+            self.close()
+            raise TransportError("Connection broker closed the session.")
+        if 'failure' in reply:
+            raise_failure(reply)
+        return reply
+
+    def open(self):
+        if self.__socket is None:
+            try:
+                sock = connect_broker(self.__socket_path)
+            except socket.error:
+                sock = spawn_broker(self.__socket_path, self.__idle_timeout)
+            self.__socket = sock
+            self.__stream = sock.makefile('rwb')
+            try:
+                self.__request(operation='open', target=self.target)
+            except TransportError:
+                self.close()
+                raise
+
+    def close(self):
+        if self.__socket is not None:
+            try:
+                self.__stream.close()
+            finally:
+                self.__socket.close()
+                self.__socket = None
+                self.__stream = None
+
+    def execute(self, text, timeout=None):
+        reply = self.__request(operation='execute', text=text, timeout=timeout)
+        return decode(reply['response']), decode(reply['error'])
+
+    def execute_many(self, texts, timeout=None, channels=1):
+        reply = self.__request(
+            operation='execute_many', texts=list(texts), timeout=timeout,
+            channels=channels
+        )
+        return [tuple(map(decode, result)) for result in reply['results']]
+
+    def upload(self, filename, data):
+        self.__request(
+            operation='upload', filename=filename,
+            data=b64encode(data).decode('ascii')
+        )
+
+    def download(self, filename):
+        reply = self.__request(operation='download', filename=filename)
+        return b64decode(reply['data'])
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def main(args=None):
+    from argparse import ArgumentParser
+    parser = ArgumentParser(
+        description="Keep authenticated connections to Mikrotik devices alive."
+    )
+    parser.add_argument('--socket', required=True)
+    parser.add_argument('--idle-timeout', type=int, default=DEFAULT_IDLE_TIMEOUT)
+    options = parser.parse_args(args)
+
+    with open('{}.lock'.format(options.socket), 'w') as lock:
+        try:
+            flock(lock, LOCK_EX | LOCK_NB)
+        except IOError:
+            return 0
+        broker = ConnectionBroker(options.socket, idle_timeout=options.idle_timeout)
+        broker.serve()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+from ansible_mikrotik_utils.commands import BaseCommand, Export
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.exceptions import CommandError
+
+from .base import match_error, match_export_error
+
+__all__ = [
+    'DeviceSession',
+]
+
+
+class DeviceSession(object):
+    """Command-level exchange with a device over an opened transport.
+
+    This is the library counterpart of the Ansible module command handling,
+    for callers driving devices without Ansible.
+    """
+
+    def __init__(self, transport):
+        self.__transport = transport
+        self.__history = list()
+        super(DeviceSession, self).__init__()
+
+    # Public properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def transport(self):
+        return self.__transport
+
+    @property
+    def history(self):
+        return self.__history
+
+    # History handling
+    # -------------------------------------------------------------------------
+
+    def __log_command(self, command):
+        if isinstance(command, BaseCommand):
+            text = command.make_command_history_text()
+        else:
+            text = command
+        if text:
+            self.__history.append("command: {}".format(text))
+
+    def __log_response(self, command, response, error=False):
+        if isinstance(command, BaseCommand):
+            text = command.make_response_history_text(response, error=error)
+        else:
+            text = response
+        if text:
+            self.__history.append("{}: {}".format(
+                'response' if not error else 'error', text
+            ))
+
+    # Command execution
+    # -------------------------------------------------------------------------
+
+    def __check(self, command, response, error):
+        if isinstance(command, Export):
+            failed = match_export_error(response)
+        else:
+            failed = match_error(response)
+        if error or failed:
+            self.__log_response(command, error or response, error=True)
+            raise CommandError(
+                "Error detected in response. (command:{})".format(command)
+            )
+        self.__log_response(command, response)
+        return response
+
+    def send(self, command):
+        self.__log_command(command)
+        response, error = self.__transport.execute(str(command))
+        return self.__check(command, response, error)
+
+    def send_many(self, commands, channels=1):
+        """Send independent read-only commands over up to ``channels``
+        concurrent channels, returning the responses in order."""
+        commands = list(commands)
+        for command in commands:
+            self.__log_command(command)
+        results = self.__transport.execute_many(
+            list(map(str, commands)), channels=channels
+        )
+        return [
+            self.__check(command, response, error)
+            for command, (response, error) in zip(commands, results)
+        ]
+
+    # Configuration handling
+    # -------------------------------------------------------------------------
+
+    def export(self, paths=None, channels=1):
+        """Current :class:`MikrotikConfig` of the device, of the whole
+        device or of the given ``paths`` only, as targets are given to
+        :meth:`verify` and :meth:`configure`."""
+        config = MikrotikConfig()
+        if paths is None:
+            config.root.load_text(self.send(Export(path='/')))
+        else:
+            for text in self.send_many(
+                (Export(path=path) for path in paths), channels=channels
+            ):
+                config.root.load_text(text)
+        return config
+
+    def apply(self, script):
+        return '\n'.join(map(self.send, script.all_commands))
+
+    def verify(self, target):
+        current = self.export()
+        return current.root.difference(target.root)
+
+    def configure(self, target, check_mode=False):
+        current = self.export()
+        script = current.root.difference(target.root)
+        if script.all_commands and not check_mode:
+            response = self.apply(script)
+            missing = self.verify(target)
+        else:
+            response, missing = None, None
+        return response, script, missing
@@ -0,0 +1,118 @@
+import socket
+
+from codecs import getincrementaldecoder
+from re import compile as compile_regex
+from threading import Lock
+
+from ansible_mikrotik_utils.common import make_bytes, make_native_text
+from ansible_mikrotik_utils.exceptions import TransportError
+
+from .base import BaseTransport, SSHTransport, ENCODING, BUFFER_SIZE, CLI_PROMPTS_RE
+from .base import ssh_errors
+
+__all__ = [
+    'ShellTransport',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+TERMINAL_WIDTH = 4095
+TERMINAL_HEIGHT = 200
+ESCAPE_SEQUENCE_RE = compile_regex(r"\x1b\[[0-9;?]*[A-Za-z]|\x1b[=>]")
+
+
+def clean_output(text):
+    return ESCAPE_SEQUENCE_RE.sub('', text).replace('\r\n', '\n').replace('\r', '')
+
+
+# Transport
+# -----------------------------------------------------------------------------
+
+class ShellTransport(SSHTransport):
+    """SSH connection running every command on one interactive shell.
+
+    The end of a command's output is found by waiting for the next prompt,
+    matched by one of the ``prompts`` patterns (``CLI_PROMPTS_RE`` unless
+    given).
+    """
+
+    def __init__(self, *args, **kwargs):
+        try:
+            self.__prompts = list(kwargs.pop('prompts'))
+        except KeyError:
+            self.__prompts = list(CLI_PROMPTS_RE)
+        self.__channel = None
+        self.__lock = Lock()
+        super(ShellTransport, self).__init__(*args, **kwargs)
+
+    @property
+    def prompts(self):
+        return self.__prompts
+
+    # Shell channel handling
+    # -------------------------------------------------------------------------
+
+    def __match_prompt(self, line):
+        for pattern in self.__prompts:
+            if pattern.search(line):
+                return True
+        return False
+
+    def __read_until_prompt(self, timeout):
+        decoder = getincrementaldecoder(ENCODING)('replace')
+        self.__channel.settimeout(timeout)
+        chunks, last_line = [], ''
+        while not self.__match_prompt(clean_output(last_line)):
+            try:
+                data = self.__channel.recv(BUFFER_SIZE)
+            except socket.timeout:
+                raise TransportError("Timed out waiting for the prompt.")
+            if not data:
+                raise TransportError("Shell channel closed by the device.")
+            text = decoder.decode(data)
+            chunks.append(text)
+            last_line = ''.join((last_line, text))
+            last_line = last_line[last_line.rfind('\n') + 1:]
+        output = make_native_text(clean_output(''.join(chunks)), ENCODING)
+        return output[:output.rfind('\n') + 1]
+
+    def __open_shell(self):
+        if self.__channel is None:
+            try:
+                self.__channel = self.client.invoke_shell(
+                    width=TERMINAL_WIDTH, height=TERMINAL_HEIGHT
+                )
+                self.__read_until_prompt(self.timeout)
+            except ssh_errors(socket.error) as ex:
+                self.__channel = None
+                raise TransportError("Unable to open shell ({})".format(str(ex)))
+
+    def close(self):
+        if self.__channel is not None:
+            self.__channel.close()
+            self.__channel = None
+        super(ShellTransport, self).close()
+
+    # Command execution
+    # -------------------------------------------------------------------------
+
+    def execute(self, text, timeout=None):
+        with self.__lock:
+            self.__open_shell()
+            try:
+                self.__channel.sendall(make_bytes('{}\r'.format(text), ENCODING))
+                output = self.__read_until_prompt(timeout or self.timeout)
+            except ssh_errors(socket.error) as ex:
+                raise TransportError("Command failed ({})".format(str(ex)))
+        # the first line is the echo of the command itself
+        return output[output.find('\n') + 1:], ''
+
+    def execute_many(self, texts, timeout=None, channels=1):
+        # a single shell runs one command at a time
+        return BaseTransport.execute_many(self, texts, timeout=timeout)
+
+    def stream(self, text, timeout=None):
+        response, _ = self.execute(text, timeout=timeout)
+        yield response
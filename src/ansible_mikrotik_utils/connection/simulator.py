@@ -0,0 +1,605 @@
+import os
+import sys
+import stat
+import socket
+
+from argparse import ArgumentParser
+from io import BytesIO
+from shlex import split
+from threading import Lock, Thread, Event
+from time import sleep, strftime
+
+import paramiko
+
+from paramiko import ServerInterface, SFTPServerInterface, SFTPServer
+from paramiko import SFTPHandle, SFTPAttributes, RSAKey
+from paramiko import AUTH_SUCCESSFUL, AUTH_FAILED, OPEN_SUCCEEDED
+from paramiko import OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+from paramiko import SFTP_OK, SFTP_NO_SUCH_FILE
+
+from ansible_mikrotik_utils.common import format_path, format_values, format_word
+from ansible_mikrotik_utils.common import join, split_lines
+from ansible_mikrotik_utils.common import make_bytes, make_native_text
+from ansible_mikrotik_utils.device import Device
+from ansible_mikrotik_utils.exceptions import ParseError
+
+from .base import ENCODING, BUFFER_SIZE, match_error
+
+__all__ = [
+    'SimulatedDevice',
+    'SimulatorServer',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+VERBS = 'add', 'remove', 'move', 'set', 'export', 'print', 'save', 'load', 'import'
+CONFIG_VERBS = 'add', 'remove', 'move', 'set'
+IDENTITY = 'Simulator'
+VERSION = '6.40'
+ACCEPT_TIMEOUT = 1
+
+
+# Formatting
+# -----------------------------------------------------------------------------
+
+def iter_export_lines(section):
+    yield '# {} by RouterOS {} (simulated)'.format(
+        strftime('%b/%d/%Y %H:%M:%S').lower(), VERSION
+    )
+    for child in section.traverse():
+        if child.items or child.settings:
+            yield child.path
+            for item in child.items:
+                yield join('add', *format_values(item.values))
+            for identifier, setting in child.settings.items():
+                yield join('set', identifier, *format_values(setting.values))
+
+
+def iter_print_lines(section):
+    yield 'Flags: X - disabled'
+    for index, item in enumerate(section.items):
+        yield ' {:>2}   {}'.format(index, ' '.join(format_values(item.values)))
+
+
+def format_lines(lines):
+    return ''.join('{}\n'.format(line) for line in lines)
+
+
+def bad_command(name):
+    return 'bad command name {} (line 1 column 1)\n'.format(name)
+
+
+def failure(message):
+    return 'failure: {}\n'.format(message)
+
+
+def decode_file(data):
+    # file contents are parsed as native strings, on Python 2 as well
+    if isinstance(data, str):
+        return data
+    return data.decode(ENCODING)
+
+
+# Simulated device
+# -----------------------------------------------------------------------------
+
+class SimulatedDevice(object):
+    """Command interpreter answering like a RouterOS device.
+
+    The configuration is held by the library's own :class:`Device` model,
+    so configuration commands behave the way they are parsed and applied
+    by the library. ``latency`` maps command verbs to the delay in seconds
+    added before answering them, ``default_latency`` applies to the others.
+    """
+
+    identity = IDENTITY
+    backup_extension = '.backup'
+    script_extension = '.rsc'
+
+    def __init__(self, config=None, latency=None, default_latency=0.0):
+        self.__device = Device()
+        if config:
+            self.__device.load_text(config)
+        self.__files = dict()
+        self.__history = list()
+        self.__latency = dict(latency or ())
+        self.__default_latency = default_latency
+        self.__lock = Lock()
+        super(SimulatedDevice, self).__init__()
+
+    # Public properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def root(self):
+        return self.__device.root
+
+    @property
+    def files(self):
+        return self.__files
+
+    @property
+    def history(self):
+        return self.__history
+
+    # File handling
+    # -------------------------------------------------------------------------
+
+    def read_file(self, name):
+        with self.__lock:
+            return self.__files[name]
+
+    def write_file(self, name, data):
+        with self.__lock:
+            self.__files[name] = data
+
+    def remove_file(self, name):
+        with self.__lock:
+            del self.__files[name]
+
+    # Command handling
+    # -------------------------------------------------------------------------
+
+    def __section(self, names):
+        section = self.root
+        for name in names:
+            section = section[name]
+        return section
+
+    def __export(self, section, arguments):
+        values = dict(argument.split('=', 1) for argument in arguments if '=' in argument)
+        text = format_lines(iter_export_lines(section))
+        if 'file' in values:
+            name = ''.join((values['file'], self.script_extension))
+            self.__files[name] = make_bytes(text, ENCODING)
+            return ''
+        return text
+
+    def __configure(self, section, verb, arguments, line):
+        try:
+            command = section.parse_command(
+                join(verb, *map(format_word, arguments)), path=section.path
+            )
+        except ParseError:
+            return 'syntax error (line 1 column 1)\n'
+        try:
+            section.load_command(command)
+        except (AssertionError, IndexError, KeyError, ValueError) as ex:
+            return failure(str(ex) or 'no such item')
+        self.__history.append(line)
+        return ''
+
+    def __backup(self, verb, arguments):
+        values = dict(argument.split('=', 1) for argument in arguments if '=' in argument)
+        name = values.get('name', '')
+        if not name.endswith(self.backup_extension):
+            name = ''.join((name, self.backup_extension))
+        if verb == 'save':
+            self.__files[name] = make_bytes(
+                format_lines(iter_export_lines(self.root)), ENCODING
+            )
+        elif verb == 'load':
+            try:
+                text = decode_file(self.__files[name])
+            except KeyError:
+                return failure('no such file')
+            self.__device = Device()
+            self.__device.load_text(text)
+            del self.__history[:]
+        else:
+            return bad_command(verb)
+        return ''
+
+    def __import(self, arguments):
+        values = dict(argument.split('=', 1) for argument in arguments if '=' in argument)
+        try:
+            script = decode_file(self.__files[values.get('file-name', '')])
+        except KeyError:
+            return failure('no such file')
+        verbose = values.get('verbose') == 'yes'
+        output = list()
+        for line in filter(None, map(str.strip, script.splitlines())):
+            if verbose:
+                output.append('{}\n'.format(line))
+            response = ''.join(map(self.__run, split_lines(line)))
+            output.append(response)
+            if match_error(response):
+                break
+        else:
+            output.append('Script file loaded and executed successfully\n')
+        return ''.join(output)
+
+    def __run(self, line):
+        line = line.strip()
+        if not line:
+            return ''
+        words = split(line.lstrip('/'))
+        for index, word in enumerate(words):
+            if word in VERBS:
+                break
+        else:
+            return bad_command(words[-1])
+        names, verb, arguments = words[:index], words[index], words[index + 1:]
+        path = format_path(names)
+
+        if path == '/system backup':
+            return self.__backup(verb, arguments)
+        elif path == '/system history' and verb == 'print':
+            return format_lines(
+                ' {:>2} action="{}"'.format(index, action)
+                for index, action in enumerate(self.__history)
+            )
+        elif path == '/file' and verb == 'remove':
+            try:
+                del self.__files[arguments[0]]
+            except (IndexError, KeyError):
+                return failure('no such item')
+            return ''
+        elif verb == 'import':
+            return self.__import(arguments)
+
+        section = self.__section(names)
+        if verb == 'export':
+            return self.__export(section, arguments)
+        elif verb == 'print':
+            return format_lines(iter_print_lines(section))
+        elif verb in CONFIG_VERBS:
+            return self.__configure(section, verb, arguments, line)
+        else:
+            return bad_command(verb)
+
+    def __delay(self, line):
+        for word in split(line.lstrip('/')):
+            if word in VERBS:
+                return self.__latency.get(word, self.__default_latency)
+        return self.__default_latency
+
+    def execute(self, text):
+        output = list()
+        for line in split_lines(text):
+            delay = self.__delay(line)
+            if delay:
+                sleep(delay)
+            with self.__lock:
+                response = self.__run(line)
+            output.append(response)
+            if match_error(response):
+                break
+        return ''.join(output)
+
+
+# SFTP subsystem
+# -----------------------------------------------------------------------------
+
+def make_attributes(name, size):
+    attributes = SFTPAttributes()
+    attributes.filename = name
+    attributes.st_size = size
+    attributes.st_mode = stat.S_IFREG | 0o644
+    return attributes
+
+
+def make_file_name(path):
+    return path.lstrip('/')
+
+
+class SimulatedFileHandle(SFTPHandle):
+
+    def __init__(self, device, name, data, flags=0):
+        self.__device = device
+        self.__name = name
+        self.__buffer = BytesIO(data)
+        self.__modified = False
+        super(SimulatedFileHandle, self).__init__(flags)
+
+    def read(self, offset, length):
+        self.__buffer.seek(offset)
+        return self.__buffer.read(length)
+
+    def write(self, offset, data):
+        self.__buffer.seek(offset)
+        self.__buffer.write(data)
+        self.__modified = True
+        return SFTP_OK
+
+    def stat(self):
+        return make_attributes(self.__name, len(self.__buffer.getvalue()))
+
+    def close(self):
+        if self.__modified:
+            self.__device.write_file(self.__name, self.__buffer.getvalue())
+            self.__modified = False
+        super(SimulatedFileHandle, self).close()
+
+
+class SimulatedFileSystem(SFTPServerInterface):
+
+    def __init__(self, server, device, *args, **kwargs):
+        self.__device = device
+        super(SimulatedFileSystem, self).__init__(server, *args, **kwargs)
+
+    def open(self, path, flags, attr):
+        name = make_file_name(path)
+        if flags & os.O_TRUNC:
+            data = b''
+        else:
+            try:
+                data = self.__device.read_file(name)
+            except KeyError:
+                if not flags & os.O_CREAT:
+                    return SFTP_NO_SUCH_FILE
+                data = b''
+        return SimulatedFileHandle(self.__device, name, data, flags)
+
+    def stat(self, path):
+        name = make_file_name(path)
+        try:
+            return make_attributes(name, len(self.__device.read_file(name)))
+        except KeyError:
+            return SFTP_NO_SUCH_FILE
+
+    lstat = stat
+
+    def remove(self, path):
+        try:
+            self.__device.remove_file(make_file_name(path))
+        except KeyError:
+            return SFTP_NO_SUCH_FILE
+        return SFTP_OK
+
+    def list_folder(self, path):
+        return [
+            make_attributes(name, len(data))
+            for name, data in list(self.__device.files.items())
+        ]
+
+
+# SSH server
+# -----------------------------------------------------------------------------
+
+def run_exec(device, channel, command):
+    try:
+        channel.sendall(make_bytes(device.execute(command), ENCODING))
+        channel.send_exit_status(0)
+    finally:
+        # only the end of output is sent: paramiko replies to the exec
+        # request after it is accepted, and a close overtaking that reply
+        # fails the request on the client ("Channel closed"), which closes
+        # the channel itself once it has read the output
+        channel.shutdown_write()
+
+
+def run_shell(device, channel, username):
+    prompt = '[{}@{}] > '.format(username, device.identity)
+    channel.sendall('\r\n  MikroTik RouterOS {} (simulated)\r\n\r\n{}'.format(
+        VERSION, prompt
+    ).encode(ENCODING))
+    pending = b''
+    try:
+        while True:
+            data = channel.recv(BUFFER_SIZE)
+            if not data:
+                break
+            pending += data
+            while b'\r' in pending:
+                line, _, pending = pending.partition(b'\r')
+                text = make_native_text(line.decode(ENCODING), ENCODING).strip('\n')
+                if text.strip() in ('quit', '/quit'):
+                    return
+                output = device.execute(text).replace('\n', '\r\n')
+                channel.sendall(make_bytes(
+                    '{}\r\n{}{}'.format(text, output, prompt), ENCODING
+                ))
+    finally:
+        channel.close()
+
+
+class SimulatorInterface(ServerInterface):
+
+    def __init__(self, server):
+        self.__server = server
+        self.__username = None
+        super(SimulatorInterface, self).__init__()
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        if self.__server.authenticate(username, password):
+            self.__username = username.split('+')[0]
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def check_auth_publickey(self, username, key):
+        if self.__server.authenticate(username, None):
+            self.__username = username.split('+')[0]
+            return AUTH_SUCCESSFUL
+        return AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return OPEN_SUCCEEDED
+        return OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, *args):
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        if isinstance(command, bytes):
+            command = make_native_text(command.decode(ENCODING), ENCODING)
+        self.__server.spawn(run_exec, self.__server.device, channel, command)
+        return True
+
+    def check_channel_shell_request(self, channel):
+        self.__server.spawn(run_shell, self.__server.device, channel, self.__username)
+        return True
+
+
+class SimulatorServer(object):
+    """Local SSH server answering like a RouterOS device, for benchmarks.
+
+    Authentication accepts ``username`` (with any RouterOS login options
+    suffix) and ``password``, or any credentials when ``password`` is None.
+    """
+
+    def __init__(self, device=None, address='127.0.0.1', port=0,
+                 username='admin', password=None, host_key=None):
+        self.__device = device if device is not None else SimulatedDevice()
+        self.__username = username
+        self.__password = password
+        self.__host_key = host_key or RSAKey.generate(2048)
+        self.__socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.__socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.__socket.bind((address, port))
+        self.__transports = list()
+        self.__stopped = Event()
+        super(SimulatorServer, self).__init__()
+
+    # Context manager implementation
+    # -------------------------------------------------------------------------
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        self.stop()
+
+    # Public properties
+    # -------------------------------------------------------------------------
+
+    @property
+    def device(self):
+        return self.__device
+
+    @property
+    def address(self):
+        return self.__socket.getsockname()[0]
+
+    @property
+    def port(self):
+        return self.__socket.getsockname()[1]
+
+    @property
+    def host_key(self):
+        return self.__host_key
+
+    # Server handling
+    # -------------------------------------------------------------------------
+
+    def authenticate(self, username, password):
+        if self.__password is None:
+            return True
+        return (
+            username.split('+')[0] == self.__username and
+            password == self.__password
+        )
+
+    def spawn(self, target, *args):
+        thread = Thread(target=target, args=args)
+        thread.daemon = True
+        thread.start()
+        return thread
+
+    def __handle(self, client):
+        transport = paramiko.Transport(client)
+        transport.add_server_key(self.__host_key)
+        transport.set_subsystem_handler(
+            'sftp', SFTPServer, SimulatedFileSystem, self.__device
+        )
+        self.__transports.append(transport)
+        try:
+            transport.start_server(server=SimulatorInterface(self))
+        except (paramiko.SSHException, EOFError, socket.error):
+            return
+        # paramiko only keeps weak references to channels, open ones must be
+        # held here or they get closed while the client still uses them
+        channels = list()
+        while transport.is_active() and not self.__stopped.is_set():
+            channel = transport.accept(ACCEPT_TIMEOUT)
+            channels = [opened for opened in channels if not opened.closed]
+            if channel is not None:
+                channels.append(channel)
+
+    def __serve(self):
+        while not self.__stopped.is_set():
+            try:
+                client, _ = self.__socket.accept()
+            except socket.error:
+                break
+            self.spawn(self.__handle, client)
+
+    def start(self):
+        self.__socket.listen(100)
+        self.spawn(self.__serve)
+
+    def serve_forever(self):
+        self.__socket.listen(100)
+        self.__serve()
+
+    def stop(self):
+        self.__stopped.set()
+        try:
+            self.__socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+        self.__socket.close()
+        for transport in self.__transports:
+            transport.close()
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def parse_latency(values):
+    latency, default = dict(), 0.0
+    for value in values:
+        if '=' in value:
+            verb, delay = value.split('=', 1)
+            latency[verb] = float(delay)
+        else:
+            default = float(value)
+    return latency, default
+
+
+def main(args=None):
+    parser = ArgumentParser(
+        description="Run a simulated Mikrotik device SSH server."
+    )
+    parser.add_argument('--address', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2222)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password')
+    parser.add_argument('--config', help="initial configuration export")
+    parser.add_argument(
+        '--latency', action='append', default=[],
+        help="delay in seconds for all commands, or VERB=DELAY for one verb"
+    )
+    options = parser.parse_args(args)
+
+    config = None
+    if options.config:
+        with open(options.config) as stream:
+            config = stream.read()
+    latency, default_latency = parse_latency(options.latency)
+    device = SimulatedDevice(
+        config=config, latency=latency, default_latency=default_latency
+    )
+    server = SimulatorServer(
+        device=device, address=options.address, port=options.port,
+        username=options.username, password=options.password,
+    )
+    sys.stderr.write('Listening on {}:{}\n'.format(server.address, server.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
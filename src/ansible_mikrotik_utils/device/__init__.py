@@ -1,4 +1,4 @@
-from ansible_mikrotik_utils.commands import SaveBackup, ClearBackup
+from ansible_mikrotik_utils.commands import SaveBackup, LoadBackup, ClearBackup
 
 from ansible_mikrotik_utils.sections import ConfigSection
 
@@ -7,21 +7,27 @@ class Device(object):
     def __init__(self):
         self.__section = ConfigSection(device=self)
         self.__backups = dict()
-        self.__tasks = list()
+        self.__tasks = dict()
         super(Device, self).__init__()
 
     # Backup handling
     # -------------------------------------------------------------------------
 
-    def add_backup(self, backup):
-        assert backup.name not in self.__backups, (
+    def add_backup(self, name, key=None):
+        assert name not in self.__backups, (
             "Cannot insert backup with existing name."
         )
-        self.__backups[name] = backup.name
-        return SaveBackup(name=backup.name, key=backup.key)
+        self.__backups[name] = key
+        return SaveBackup(name=name, key=key)
+
+    def check_backup(self, name):
+        assert name in self.__backups, (
+            "Cannot load non-existing backup."
+        )
+        return LoadBackup(name=name, key=self.__backups[name])
 
     def remove_backup(self, name):
-        assert name in self.__backups.keys(), (
+        assert name in self.__backups, (
             "Cannot remove non-existing backup."
         )
         del self.__backups[name]
@@ -31,16 +37,16 @@ class Device(object):
     # -------------------------------------------------------------------------
 
     def add_scheduled_task(self, task):
-        assert task.name in self.__backups.keys(), (
+        assert task.name not in self.__tasks, (
             "Cannot insert scheduled task with existing name."
         )
         self.__tasks[task.name] = task
 
     def remove_scheduled_task(self, name):
-        assert name in self.__backups.keys(), (
+        assert name in self.__tasks, (
             "Cannot remove non-existing scheduled task."
         )
-        del self.__tasks[task.name]
+        del self.__tasks[name]
 
     # Configuration input methods
     # -------------------------------------------------------------------------
@@ -48,6 +54,12 @@ class Device(object):
     def load_text(self, text):
         return self.__section.load_text(text)
 
+    def load_stream(self, chunks):
+        return self.__section.load_stream(chunks)
+
+    def load_file(self, path):
+        return self.__section.load_file(path)
+
     def merge_text(self, text):
         return self.__section.load_text(text)
 
@@ -55,9 +67,23 @@ class Device(object):
         other = ConfigSection.from_text(text, device=self)
         return self.__section.difference(other)
 
+    def compare_file(self, path):
+        other = ConfigSection.from_file(path, device=self)
+        return self.__section.difference(other)
+
     def apply_script(self, script):
         self.__section.apply(script)
 
+    # Batch processing
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def compare_batch(cls, jobs, processes=None):
+        """Diff many ``(name, export, target)`` jobs across a process pool,
+        see :func:`ansible_mikrotik_utils.device.batch.compare_batch`."""
+        from .batch import compare_batch
+        return compare_batch(jobs, processes=processes)
+
     # Public properties
     # -------------------------------------------------------------------------
 
@@ -0,0 +1,147 @@
+"""Diff many device exports against their targets across a process pool.
+
+Worker processes live for the whole batch, so that the parsers and the
+section and command registries are only set up once per worker rather than
+once per device.
+"""
+import json
+import os
+import sys
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from multiprocessing import Pool
+
+from ansible_mikrotik_utils.device import Device
+from ansible_mikrotik_utils.exceptions import ParseError
+
+__all__ = [
+    'compare_job',
+    'compare_file_job',
+    'compare_batch',
+    'load_jobs',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+DEFAULT_CHUNKSIZE = 4
+SCRIPT_EXTENSION = '.rsc'
+SUMMARY_NAME = 'summary.json'
+
+
+# Batch API
+# -----------------------------------------------------------------------------
+
+def compare_job(job, files=False):
+    """Diff one ``(name, export, target)`` job, returning ``(name, result)``
+    where the result holds the script text and its number of commands, or
+    the error message. With ``files``, the export and target are paths."""
+    name, export, target = job
+    try:
+        device = Device()
+        if files:
+            device.load_file(export)
+            script = device.compare_file(target)
+        else:
+            device.load_text(export)
+            script = device.compare_text(target)
+    except (ParseError, AssertionError, KeyError, IndexError) as ex:
+        return name, dict(failed=True, msg='{}: {}'.format(type(ex).__name__, ex))
+    except (IOError, OSError) as ex:
+        return name, dict(failed=True, msg=str(ex))
+    return name, dict(
+        changes=len(script.all_commands),
+        script=''.join(
+            '{}\n'.format(line) for line in script.export(header=False)
+        ),
+    )
+
+
+def compare_file_job(job):
+    return compare_job(job, files=True)
+
+
+def compare_batch(jobs, processes=None, chunksize=DEFAULT_CHUNKSIZE, files=False):
+    """Diff all ``(name, export, target)`` jobs, yielding ``(name, result)``
+    in job order. Runs in the current process if ``processes`` is 1."""
+    function = compare_file_job if files else compare_job
+    if processes == 1:
+        for job in jobs:
+            yield function(job)
+        return
+    pool = Pool(processes=processes)
+    try:
+        for outcome in pool.imap(function, jobs, chunksize):
+            yield outcome
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
+# File handling
+# -----------------------------------------------------------------------------
+
+def load_jobs(exports, targets):
+    """Yield ``(name, export, target)`` file jobs for every ``NAME.rsc``
+    target in the ``targets`` directory that has an export in the
+    ``exports`` directory."""
+    for filename in sorted(os.listdir(targets)):
+        name, extension = os.path.splitext(filename)
+        export = os.path.join(exports, filename)
+        if extension == SCRIPT_EXTENSION and os.path.isfile(export):
+            yield name, export, os.path.join(targets, filename)
+
+
+def write_results(outcomes, directory):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    summary = OrderedDict()
+    for name, result in outcomes:
+        script = result.pop('script', None)
+        if script is not None:
+            path = os.path.join(directory, ''.join((name, SCRIPT_EXTENSION)))
+            with open(path, 'w') as stream:
+                stream.write(script)
+        summary[name] = result
+    with open(os.path.join(directory, SUMMARY_NAME), 'w') as stream:
+        json.dump(summary, stream, indent=2)
+    return summary
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def main(args=None):
+    parser = ArgumentParser(
+        description="Compute the scripts reaching many target configurations."
+    )
+    parser.add_argument('exports', help="directory of NAME.rsc device exports")
+    parser.add_argument('targets', help="directory of NAME.rsc targets")
+    parser.add_argument('output', help="directory for scripts and summary")
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    options = parser.parse_args(args)
+
+    summary = write_results(
+        compare_batch(
+            load_jobs(options.exports, options.targets),
+            processes=options.processes, chunksize=options.chunksize,
+            files=True,
+        ),
+        options.output,
+    )
+    failed = sum(1 for result in summary.values() if result.get('failed'))
+    changed = sum(1 for result in summary.values() if result.get('changes'))
+    sys.stderr.write('{} devices, {} to change, {} failed\n'.format(
+        len(summary), changed, failed
+    ))
+    return 2 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
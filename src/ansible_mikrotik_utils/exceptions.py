@@ -1,3 +1,18 @@
 class ParseError(ValueError):
     pass
 
+
+class TransportError(IOError):
+    pass
+
+
+class ResolveError(TransportError):
+    pass
+
+
+class AuthenticationError(TransportError):
+    pass
+
+
+class CommandError(RuntimeError):
+    pass
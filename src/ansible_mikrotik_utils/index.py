@@ -0,0 +1,65 @@
+from collections import defaultdict
+
+__all__ = [
+    'ItemIndex',
+]
+
+
+class ItemIndex(object):
+    """Items of a section by the ``(key, value)`` pairs of their values.
+
+    Used to resolve ``[find key=value ...]`` criteria and membership tests
+    without scanning the items of the section.
+    """
+
+    def __init__(self, items=()):
+        self.__items = set()
+        self.__pairs = defaultdict(set)
+        for item in items:
+            self.add(item)
+        super(ItemIndex, self).__init__()
+
+    def __contains__(self, item):
+        return item in self.__items
+
+    def __len__(self):
+        return len(self.__items)
+
+    def add(self, item):
+        self.__items.add(item)
+        for pair in item.values.items():
+            self.__pairs[pair].add(item)
+
+    def discard(self, item):
+        self.__items.discard(item)
+        for pair in item.values.items():
+            items = self.__pairs.get(pair)
+            if items is not None:
+                items.discard(item)
+                if not items:
+                    del self.__pairs[pair]
+
+    def count(self, key, value):
+        return len(self.__pairs.get((key, value), ()))
+
+    def find(self, criteria):
+        # as on the device, an empty value matches the items without a value
+        absent = [key for key, value in criteria.items() if not value]
+        candidates = sorted(
+            (self.__pairs.get(pair, set()) for pair in criteria.items() if pair[1]),
+            key=len
+        )
+        if candidates:
+            found = set(candidates[0])
+        elif absent:
+            found = set(self.__items)
+        else:
+            return set()
+        for items in candidates[1:]:
+            found &= items
+        if absent:
+            found = set(
+                item for item in found
+                if not any(item.values.get(key) for key in absent)
+            )
+        return found
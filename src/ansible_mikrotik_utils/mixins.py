@@ -5,7 +5,7 @@ from inspect import isabstract
 from abc import ABCMeta
 
 from ansible_mikrotik_utils.common import NAME_RE, PATH_RE, UNORDERED
-from ansible_mikrotik_utils.common import abstractclassproperty
+from ansible_mikrotik_utils.common import abstractclassproperty, make_path_re
 
 
 class SubclassStoreMixin(type):
@@ -28,6 +28,9 @@ class ConfigItem(CopiableMixin):
     def __ne__(self, other):
         return not self == other
 
+    def __hash__(self):
+        return hash(self.key)
+
     @property
     def copy_kwargs(self):
         kwargs = super(ConfigItem, self).copy_kwargs
@@ -38,6 +41,10 @@ class ConfigItem(CopiableMixin):
     def values(self):
         return self.__values
 
+    @property
+    def key(self):
+        return frozenset(self.__values.items())
+
 
 class ConfigSetting(ConfigItem):
 
@@ -0,0 +1,63 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+__all__ = [
+    'Profiler',
+]
+
+
+class Profiler(object):
+    """Wall clock time spent per phase, and event counters.
+
+    Timers can be nested, in which case the time spent in the inner phase
+    is only counted for that phase, so that all phase timings add up to the
+    total time spent within timers. A disabled profiler records nothing.
+    """
+
+    def __init__(self, enabled=True):
+        self.__enabled = enabled
+        self.__timings = OrderedDict()
+        self.__counters = OrderedDict()
+        self.__nested = list()
+        super(Profiler, self).__init__()
+
+    @property
+    def enabled(self):
+        return self.__enabled
+
+    @property
+    def timings(self):
+        return self.__timings
+
+    @property
+    def counters(self):
+        return self.__counters
+
+    @contextmanager
+    def timer(self, name):
+        if not self.__enabled:
+            yield
+            return
+        start = default_timer()
+        self.__nested.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = default_timer() - start
+            nested = self.__nested.pop()
+            self.__timings[name] = self.__timings.get(name, 0.0) + elapsed - nested
+            if self.__nested:
+                self.__nested[-1] += elapsed
+
+    def count(self, name, amount=1):
+        if self.__enabled:
+            self.__counters[name] = self.__counters.get(name, 0) + amount
+
+    def report(self):
+        report = OrderedDict(self.__counters)
+        report['phases'] = OrderedDict(
+            (name, round(elapsed, 6)) for name, elapsed in self.__timings.items()
+        )
+        report['total'] = round(sum(self.__timings.values()), 6)
+        return report
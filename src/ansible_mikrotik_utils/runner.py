@@ -0,0 +1,218 @@
+"""Concurrent configuration of many devices from a single process.
+
+Each device goes through the same export, diff, apply and verification
+steps as the ``mkr_config`` module, and gets a result with the same keys.
+Blocking SSH operations run on a pool of threads.
+"""
+import json
+import os
+import sys
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from threading import BoundedSemaphore, Lock
+
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.connection import SSHTransport, DeviceSession
+from ansible_mikrotik_utils.exceptions import TransportError, CommandError
+
+__all__ = [
+    'FleetRunner',
+    'load_inventory',
+    'run',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+DEFAULT_CONCURRENCY = 64
+DEFAULT_HOST_CONCURRENCY = 1
+# jobs waiting for a busy host hold a thread, so the pool is larger than
+# the concurrency limit
+MAX_THREADS = 256
+TRANSPORT_KEYS = (
+    'host', 'port', 'username', 'password', 'key_filename', 'timeout',
+    'compress', 'host_key_policy',
+)
+
+
+# Inventory handling
+# -----------------------------------------------------------------------------
+
+def load_inventory(path):
+    """Read jobs from a JSON inventory file.
+
+    The inventory holds a ``hosts`` mapping of device names to connection
+    parameters, plus either a ``config`` file path (relative to the
+    inventory) or an inline ``config_text`` target. Parameters shared by all
+    hosts can be given in ``defaults``. When the inventory names a ``base``
+    configuration file, it is parsed once and host configurations are
+    overlays loaded on top of it. Yields ``(name, params, target)``.
+    """
+    with open(path) as stream:
+        inventory = json.load(stream, object_pairs_hook=OrderedDict)
+    directory = os.path.dirname(os.path.abspath(path))
+    defaults = inventory.get('defaults', dict())
+    base = None
+    if 'base' in inventory:
+        with open(os.path.join(directory, inventory['base'])) as stream:
+            base = MikrotikConfig.parse(stream.read())
+    for name, host in inventory['hosts'].items():
+        params = dict(defaults)
+        params.update(host)
+        params.setdefault('host', name)
+        try:
+            target = params['config_text']
+        except KeyError:
+            with open(os.path.join(directory, params['config'])) as stream:
+                target = stream.read()
+        if base is not None:
+            target = base.overlay(target)
+        yield name, {
+            key: params[key] for key in TRANSPORT_KEYS if key in params
+        }, target
+
+
+# Runner
+# -----------------------------------------------------------------------------
+
+def parse_target(text):
+    if isinstance(text, MikrotikConfig):
+        return text
+    return MikrotikConfig.parse(text)
+
+
+class FleetRunner(object):
+    """Configure devices concurrently, within global and per-host limits."""
+
+    transport_class = SSHTransport
+    session_class = DeviceSession
+
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY,
+                 host_concurrency=DEFAULT_HOST_CONCURRENCY,
+                 check_mode=False):
+        self.__concurrency = concurrency
+        self.__host_concurrency = host_concurrency
+        self.__check_mode = check_mode
+        self.__semaphore = BoundedSemaphore(concurrency)
+        self.__host_semaphores = dict()
+        self.__lock = Lock()
+        super(FleetRunner, self).__init__()
+
+    @property
+    def check_mode(self):
+        return self.__check_mode
+
+    # Scheduling
+    # -------------------------------------------------------------------------
+
+    def __host_semaphore(self, params):
+        key = params['host'], params.get('port', 22)
+        with self.__lock:
+            try:
+                return self.__host_semaphores[key]
+            except KeyError:
+                semaphore = BoundedSemaphore(self.__host_concurrency)
+                self.__host_semaphores[key] = semaphore
+                return semaphore
+
+    # Device handling
+    # -------------------------------------------------------------------------
+
+    def __configure(self, params, target):
+        transport = self.transport_class(**params)
+        session = self.session_class(transport)
+        result = dict(changed=False)
+        try:
+            transport.open()
+            try:
+                target = parse_target(target)
+                current = session.export()
+                script = current.root.difference(target.root)
+                commands = script.all_commands
+                if commands and not self.__check_mode:
+                    result['response'] = session.apply(script)
+                    missing = session.verify(target)
+                    if missing.all_commands:
+                        result['failed'] = True
+                        result['msg'] = "Failed to reach target configuration"
+                        result['missing'] = list(map(str, missing.all_commands))
+            finally:
+                transport.close()
+        except (TransportError, CommandError) as ex:
+            result['failed'] = True
+            result['msg'] = str(ex)
+        except Exception as ex:
+            # a device must not abort the configuration of the others
+            result['failed'] = True
+            result['msg'] = "{}: {}".format(type(ex).__name__, ex)
+        else:
+            result['changed'] = bool(commands)
+            result['updates'] = list(map(str, commands))
+        result['history'] = list(session.history)
+        return result
+
+    def configure(self, params, target):
+        # waiting for the host first leaves the global slots to other hosts
+        with self.__host_semaphore(params):
+            with self.__semaphore:
+                return self.__configure(params, target)
+
+    def run(self, jobs):
+        """Configure all ``(name, params, target)`` jobs, returning results
+        by device name, in job order."""
+        jobs = list(jobs)
+        if not jobs:
+            return OrderedDict()
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(processes=min(len(jobs), MAX_THREADS))
+        try:
+            results = pool.map(
+                lambda job: self.configure(job[1], job[2]), jobs
+            )
+        finally:
+            pool.close()
+            pool.join()
+        return OrderedDict(
+            (name, result) for (name, _, _), result in zip(jobs, results)
+        )
+
+
+def run(jobs, **kwargs):
+    return FleetRunner(**kwargs).run(jobs)
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def main(args=None):
+    parser = ArgumentParser(
+        description="Configure many Mikrotik devices concurrently."
+    )
+    parser.add_argument('inventory')
+    parser.add_argument('--check', action='store_true')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--host-concurrency', type=int, default=DEFAULT_HOST_CONCURRENCY)
+    parser.add_argument('--output')
+    options = parser.parse_args(args)
+
+    results = run(
+        load_inventory(options.inventory),
+        concurrency=options.concurrency,
+        host_concurrency=options.host_concurrency,
+        check_mode=options.check,
+    )
+
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    return 2 if any(result.get('failed') for result in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,3 +2,4 @@ from .base import BaseSection
 from .script import ScriptSection
 from .config import ConfigSection
 from .scheduler import SchedulerSection
+from .paths import register_path, lookup_ordering_mode
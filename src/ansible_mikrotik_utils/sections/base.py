@@ -9,12 +9,17 @@ from ansible_mikrotik_utils.exceptions import ParseError
 from ansible_mikrotik_utils.mixins import SubclassStoreMixin
 from ansible_mikrotik_utils.common import PATH_RE, classproperty, lookup_implementation
 from ansible_mikrotik_utils.common import abstractclassproperty
-from ansible_mikrotik_utils.common import format_path, split_lines, join
+from ansible_mikrotik_utils.common import format_path, format_word, split_lines, join
+from ansible_mikrotik_utils.common import split_lines_stream, iter_file_chunks
 from ansible_mikrotik_utils.commands import BaseCommand
 
 from .mixins import BaseSectionMixin
 
 
+EXPORT_HEADER = '# generated by ansible-mikrotik-utils'
+WRITE_CHUNK_LINES = 1024
+
+
 class SectionMeta(SubclassStoreMixin, ABCMeta):
     def get_type_sort_keys(cls, **kwargs):
         for key in super(SectionMeta, cls).get_type_sort_keys(**kwargs):
@@ -47,13 +52,17 @@ class BaseSection(BaseSectionMixin):
 
     @classmethod
     def parse_command(cls, text, *args, **kwargs):
+        path = kwargs.get('path')
         for cmd_cls in cls.command_classes:
-            if not cmd_cls.greedy:
-                match = cmd_cls.match(text)
-                if match:
-                    return cmd_cls.parse(match, *args, **kwargs)
-        else:
-            raise ParseError("Unknown command")
+            if cmd_cls.greedy:
+                continue
+            # commands of a static path only apply in sections of that path
+            if cmd_cls.static_path and path is not None and not cmd_cls.match_path(path):
+                continue
+            match = cmd_cls.match(text)
+            if match:
+                return cmd_cls.parse(match, *args, **kwargs)
+        raise ParseError("Unknown command")
 
     @classmethod
     def from_text(cls, text, *args, **kwargs):
@@ -61,6 +70,18 @@ class BaseSection(BaseSectionMixin):
         new.load_text(text)
         return new
 
+    @classmethod
+    def from_stream(cls, chunks, *args, **kwargs):
+        new = cls(*args, **kwargs)
+        new.load_stream(chunks)
+        return new
+
+    @classmethod
+    def from_file(cls, path, *args, **kwargs):
+        new = cls(*args, **kwargs)
+        new.load_file(path)
+        return new
+
     # Specialization handling
     # -------------------------------------------------------------------------
 
@@ -169,7 +190,8 @@ class BaseSection(BaseSectionMixin):
             child = self.__children[name]
         except KeyError as ex:
             if self.match_name(name):
-                path = format_path(self.ascendant_names + [name])
+                names = self.ascendant_names + [self.name, name]
+                path = format_path(filter(None, names))
                 child = self.__children[name] = self.lookup_section_class(path)(self, name)
             else:
                 raise
@@ -214,7 +236,9 @@ class BaseSection(BaseSectionMixin):
                 else:
                     continue
                 try:
-                    command = current.parse_command(join(word, *words), path=current.path)
+                    command = current.parse_command(
+                        join(*map(format_word, [word] + words)), path=current.path
+                    )
                 except ParseError:
                     pass
                 else:
@@ -231,9 +255,51 @@ class BaseSection(BaseSectionMixin):
     def load_text(self, text):
         return self.load_lines(map(str.strip, filter(None, split_lines(text))))
 
+    def load_stream(self, chunks):
+        return self.load_lines(map(str.strip, filter(None, split_lines_stream(chunks))))
+
+    def load_file(self, path):
+        return self.load_stream(iter_file_chunks(path))
+
     def load_command(self, command):
         self.commands.append(command)
 
+    # Output text
+    # -------------------------------------------------------------------------
+
+    def export(self, pretty=True, header=True, blank=True):
+        """Yield the lines of the script running all commands.
+
+        In pretty mode, the ``/path`` of commands is written once on its own
+        line before the bare commands of that path, preceded by a blank line
+        if ``blank``. Otherwise every line is a full command with its path.
+        """
+        if header:
+            yield EXPORT_HEADER
+        current = None
+        for section in self.traverse():
+            for command in section.commands:
+                if not pretty:
+                    yield command.text
+                    continue
+                if command.path != current:
+                    if blank and current is not None:
+                        yield ''
+                    current = command.path
+                    yield current
+                yield command.full_command
+
+    def write(self, stream, pretty=True, header=True, blank=True):
+        """Write the script to the ``stream`` text sink, in chunks."""
+        chunk = list()
+        for line in self.export(pretty=pretty, header=header, blank=blank):
+            chunk.append(line)
+            if len(chunk) >= WRITE_CHUNK_LINES:
+                stream.write(''.join('{}\n'.format(line) for line in chunk))
+                del chunk[:]
+        if chunk:
+            stream.write(''.join('{}\n'.format(line) for line in chunk))
+
     # Tree traversal
     # -------------------------------------------------------------------------
 
@@ -1,8 +1,11 @@
+from bisect import bisect_left
 from collections import OrderedDict
 from itertools import chain
 from weakref import ref
 
 from ansible_mikrotik_utils.common import classproperty, ORDERED
+from ansible_mikrotik_utils.common import parse_find_criteria, format_find_identifier
+from ansible_mikrotik_utils.index import ItemIndex
 
 from ansible_mikrotik_utils.commands import BaseConfigCommand
 from ansible_mikrotik_utils.commands import AddCommand, RemoveCommand
@@ -13,10 +16,31 @@ from .mixins import StaticPathMixin
 from .script import ScriptSection
 
 
+def make_increasing_run(items, positions):
+    """Longest subsequence of ``items`` whose ``positions`` increase."""
+    tails, tail_positions, links = list(), list(), dict()
+    for item in items:
+        position = positions[item]
+        index = bisect_left(tail_positions, position)
+        links[item] = tails[index - 1] if index else None
+        if index == len(tails):
+            tails.append(item)
+            tail_positions.append(position)
+        else:
+            tails[index] = item
+            tail_positions[index] = position
+    run = list()
+    item = tails[-1] if tails else None
+    while item is not None:
+        run.append(item)
+        item = links[item]
+    return reversed(run)
+
 
 class ConfigSection(BaseSection):
 
     ordering_mode = ORDERED
+    identity_keys = 'name',
     base_section_class = None
     base_command_class = BaseConfigCommand
     base_insertion_command_class = AddCommand
@@ -63,6 +87,8 @@ class ConfigSection(BaseSection):
                 (key, value.copy())
                 for key, value in settings.items()
             )
+        self.__index = ItemIndex(self.__items)
+        self.___positions = None
         super(ConfigSection, self).__init__(*args, **kwargs)
 
     # Copy protocol
@@ -78,17 +104,52 @@ class ConfigSection(BaseSection):
     # Raw change methods
     # -------------------------------------------------------------------------
 
+    @property
+    def __positions(self):
+        # rebuilt only after changes shifting the positions of items
+        if self.___positions is None:
+            self.___positions = dict(
+                (item, index) for index, item in enumerate(self.__items)
+            )
+        return self.___positions
+
     def __insert_item(self, item, destination=None):
         if destination is not None:
             self.__items.insert(destination, item)
+            self.___positions = None
         else:
+            if self.___positions is not None:
+                self.___positions[item] = len(self.__items)
             self.__items.append(item)
+        self.__index.add(item)
 
     def __delete_item(self, item):
-        index = self.__items.index(item)
+        index = self.__positions.pop(item)
         self.__items.pop(index)
+        if index != len(self.__items):
+            self.___positions = None
+        self.__index.discard(item)
         return index
 
+    def __replace_items(self, replacements):
+        positions = self.__positions
+        for item, replacement in replacements.items():
+            index = positions.pop(item)
+            self.__items[index] = replacement
+            positions[replacement] = index
+            self.__index.discard(item)
+            self.__index.add(replacement)
+
+    def __update_items(self, items, values):
+        replacements = dict()
+        for item in items:
+            replacement = item.copy()
+            replacement.values.update(values)
+            if replacement != item:
+                replacements[item] = replacement
+        if replacements:
+            self.__replace_items(replacements)
+
     def __move_item(self, item, destination=None):
         index = self.__delete_item(item)
         if destination is not None and index > destination:
@@ -126,7 +187,7 @@ class ConfigSection(BaseSection):
             )
             if destination + 1 >= len(self.__items):
                 destination = None
-        assert item not in self.__items, (
+        assert item not in self.__index, (
             "Cannot insert duplicate item."
         )
         self.__insert_item(item, destination)
@@ -137,7 +198,7 @@ class ConfigSection(BaseSection):
         )
 
     def delete_item(self, item):
-        assert item in self.__items, (
+        assert item in self.__index, (
             "Cannot delete non-existing item."
         )
         index = self.__delete_item(item)
@@ -157,7 +218,7 @@ class ConfigSection(BaseSection):
             )
             if destination + 1 >= len(self.__items):
                 destination = None
-        assert item in self.__items, (
+        assert item in self.__index, (
             "Cannot move non-existing item."
         )
         index = self.__move_item(item, destination)
@@ -167,7 +228,37 @@ class ConfigSection(BaseSection):
             destination=destination
         )
 
+    def extend(self, items=(), settings=()):
+        """Add items and settings as they are, without generating commands
+        (as when stacking configuration layers)."""
+        for item in items:
+            self.__insert_item(item)
+        for setting in settings:
+            self.__settings[setting.identifier] = setting
+
+    def find_items(self, criteria):
+        """Items matching all ``criteria`` values, in no particular order."""
+        return self.__index.find(criteria)
+
+    def lookup_items(self, reference):
+        """Items referred to by a position or a ``[ find ... ]`` identifier,
+        in their order in the section."""
+        if isinstance(reference, int):
+            return [self.__items[reference]]
+        items = self.__index.find(parse_find_criteria(reference) or {})
+        return [item for item in self.__items if item in items]
+
     def set_settings(self, settings):
+        criteria = parse_find_criteria(settings.identifier)
+        if criteria:
+            items = self.__index.find(criteria)
+            if items:
+                self.__update_items(items, settings.values)
+                return self.set_command_class(
+                    path=self.path,
+                    identifier=settings.identifier,
+                    values=settings.values
+                )
         values = self.__set_settings(settings)
         return self.set_command_class(
             path=self.path,
@@ -182,6 +273,84 @@ class ConfigSection(BaseSection):
         command.apply(self)
         super(ConfigSection, self).load_command(command)
 
+    # Stable commands
+    # -------------------------------------------------------------------------
+
+    def __make_reference(self, item, known):
+        # find matches every item having the criteria values: a unique
+        # identity value, or else empty values for the keys of the other
+        # matching items, keep the ``known`` items other than ``item`` out
+        for key in self.identity_keys:
+            value = item.values.get(key)
+            if value and known.count(key, value) == 1:
+                return format_find_identifier({key: value})
+        criteria = OrderedDict(item.values)
+        for other in known.find(item.values):
+            for key in other.values:
+                criteria.setdefault(key, '')
+        return format_find_identifier(criteria)
+
+    def __make_stable_items(self, target):
+        """Items left in place by the changes from this section to
+        ``target``, as made by :meth:`merge`."""
+        items = [item for item in self.__items if item in target.__index]
+        for index, item in enumerate(target.items):
+            if item not in self.__index:
+                if self.ordered_insertion and index + 1 < len(items):
+                    items.insert(index, item)
+                else:
+                    items.append(item)
+        positions = dict(
+            (item, index) for index, item in enumerate(target.items)
+        )
+        return set(make_increasing_run(items, positions))
+
+    def make_stable_commands(self, commands, target):
+        """Apply ``commands``, which bring this section to ``target`` and
+        undo the changes from ``target`` to this section, yielding commands
+        with the same effect which refer to items by their values instead
+        of their positions, so that they apply whatever part of the changes
+        they undo was made."""
+        known = ItemIndex(chain(self.__items, target.items))
+        if self.ordered:
+            stable = target.__make_stable_items(self)
+        for command in commands:
+            if isinstance(command, self.base_deletion_command_class):
+                item, = self.lookup_items(command.index)
+                yield self.deletion_command_class(
+                    path=self.path,
+                    index=self.__make_reference(item, known)
+                )
+            elif isinstance(command, self.base_insertion_command_class):
+                # a copy of the item left by a partial run is not duplicated
+                yield self.deletion_command_class(
+                    path=self.path,
+                    index=self.__make_reference(
+                        command.entity_type(command.values), known
+                    )
+                )
+                yield self.insertion_command_class(
+                    path=self.path,
+                    values=command.values,
+                    destination=None
+                )
+            elif not isinstance(command, self.base_move_command_class):
+                yield command
+            command.apply(self)
+        if self.ordered:
+            # the items moved or removed by the changes are placed before
+            # their successor, starting from the last one
+            following = None
+            for item in reversed(self.__items):
+                reference = self.__make_reference(item, known)
+                if item not in stable:
+                    yield self.move_command_class(
+                        path=self.path,
+                        index=reference,
+                        destination=following
+                    )
+                following = reference
+
     # Merging methods
     # -------------------------------------------------------------------------
 
@@ -194,30 +363,97 @@ class ConfigSection(BaseSection):
         index = 0
         while index < len(self.items):
             item = self.items[index]
-            if item not in target.items:
+            if item not in target.__index:
                 yield self.delete_item(item)
             else:
                 index += 1
 
     def __insert_added(self, target):
         for index, item in enumerate(target.items):
-            if item not in self.items:
+            if item not in self.__index:
                 if self.ordered_insertion:
                     yield self.insert_item(item, index)
                 else:
                     yield self.insert_item(item)
 
     def __update_positions(self, target):
-        index = 0
-        while index < len(self.items):
-            item = self.items[index]
-            destination = target.items.index(item)
-            if index != destination:
-                yield self.move_item(item, destination)
-                if destination < (index - 1):
-                    index += 1
-            else:
-                index += 1
+        # items of the longest run already in target order stay in place,
+        # the others are moved once, before their target successor
+        positions = dict(
+            (item, index) for index, item in enumerate(target.items)
+        )
+        stable = set(make_increasing_run(self.items, positions))
+        following = None
+        for item in reversed(target.items):
+            if item not in stable:
+                index = self.__positions[item]
+                if following is None:
+                    if index + 1 != len(self.items):
+                        yield self.move_item(item)
+                else:
+                    destination = self.__positions[following]
+                    if index + 1 != destination:
+                        yield self.move_item(item, destination - 1)
+            following = item
+
+    def __match_identity(self, target, item):
+        for key in self.identity_keys:
+            value = item.values.get(key)
+            if (
+                value is not None and
+                self.__index.count(key, value) == 1 and
+                target.__index.count(key, value) == 1
+            ):
+                criteria = {key: value}
+                ours, = self.__index.find(criteria)
+                if ours not in target.__index and set(ours.values) <= set(item.values):
+                    return criteria, ours
+        return None, None
+
+    def __merge_unordered(self, target):
+        added, updated = list(), OrderedDict()
+        for item in target.items:
+            if item not in self.__index:
+                criteria, ours = self.__match_identity(target, item)
+                if ours is not None and ours not in updated:
+                    updated[ours] = criteria, item
+                else:
+                    added.append(item)
+        removed = [
+            index for index, item in enumerate(self.__items)
+            if item not in target.__index and item not in updated
+        ]
+        # removing from the end keeps the indexes of the next removals valid
+        for index in reversed(removed):
+            yield self.deletion_command_class(path=self.path, index=index)
+        for index in removed:
+            self.__index.discard(self.__items[index])
+        self.__items = [
+            item for item in self.__items
+            if item in target.__index or item in updated
+        ]
+        self.___positions = None
+        # items found by an identity key are updated in place
+        for ours, (criteria, item) in updated.items():
+            yield self.set_command_class(
+                path=self.path,
+                identifier=format_find_identifier(criteria),
+                values=OrderedDict(
+                    (key, value) for key, value in item.values.items()
+                    if ours.values.get(key) != value
+                )
+            )
+        self.__replace_items(OrderedDict(
+            (ours, item) for ours, (_, item) in updated.items()
+        ))
+        for item in added:
+            if item not in self.__index:
+                self.__insert_item(item)
+                yield self.insertion_command_class(
+                    path=self.path,
+                    values=item.values,
+                    destination=None
+                )
 
     # Diff methods
     # -------------------------------------------------------------------------
@@ -225,6 +461,10 @@ class ConfigSection(BaseSection):
     def __merge(self, target):
         for change in self.__update_settings(target):
             yield change
+        if not self.ordered:
+            for change in self.__merge_unordered(target):
+                yield change
+            return
         for change in self.__delete_removed(target):
             yield change
         for change in self.__insert_added(target):
@@ -250,7 +490,7 @@ class ConfigSection(BaseSection):
     def apply(self, script):
         for command in script.commands:
             command.apply(self)
-        for name, child in section.children:
+        for name, child in script.children.items():
             self[name].apply(child)
 
     # Public properties
@@ -263,3 +503,12 @@ class ConfigSection(BaseSection):
     @property
     def settings(self):
         return self.__settings
+
+    @property
+    def export_paths(self):
+        if self.__items or self.__settings:
+            return [self.path]
+        else:
+            return list(chain(*(
+                child.export_paths for child in self.children.values()
+            )))
@@ -0,0 +1,73 @@
+from collections import OrderedDict
+from re import split as split_regex
+
+from ansible_mikrotik_utils.common import UNORDERED, ORDERED, make_path_re
+
+from .mixins import StaticPathMixin
+from .config import ConfigSection
+
+__all__ = [
+    'ORDERING_MODES',
+    'register_path',
+    'lookup_ordering_mode',
+]
+
+
+# Ordering modes
+# -----------------------------------------------------------------------------
+# Paths missing here keep the ordering mode of ConfigSection (ordered).
+
+ORDERING_MODES = OrderedDict([
+    ('/interface bridge port', UNORDERED),
+    ('/interface list member', UNORDERED),
+    ('/interface vlan', UNORDERED),
+    ('/ip address', UNORDERED),
+    ('/ip dhcp-server lease', UNORDERED),
+    ('/ip dhcp-server network', UNORDERED),
+    ('/ip dns static', UNORDERED),
+    ('/ip firewall address-list', UNORDERED),
+    ('/ip firewall filter', ORDERED),
+    ('/ip firewall mangle', ORDERED),
+    ('/ip firewall nat', ORDERED),
+    ('/ip firewall raw', ORDERED),
+    ('/ip pool', UNORDERED),
+    ('/ip route', UNORDERED),
+    ('/ipv6 address', UNORDERED),
+    ('/ipv6 firewall address-list', UNORDERED),
+    ('/ipv6 firewall filter', ORDERED),
+    ('/ipv6 firewall mangle', ORDERED),
+    ('/ipv6 route', UNORDERED),
+    ('/user', UNORDERED),
+])
+
+
+# Specialized sections
+# -----------------------------------------------------------------------------
+# The section class store only keeps weak references, hence this mapping.
+
+SECTION_CLASSES = OrderedDict()
+
+
+def make_section_name(path):
+    words = split_regex(r'[\s\-]+', path.strip('/'))
+    return ''.join(word.capitalize() for word in words) + 'Section'
+
+
+def register_path(path, ordering_mode):
+    ORDERING_MODES[path] = ordering_mode
+    SECTION_CLASSES[path] = type(ConfigSection)(
+        make_section_name(path), (StaticPathMixin, ConfigSection), dict(
+            path=path,
+            path_pattern=make_path_re(path),
+            ordering_mode=ordering_mode,
+        )
+    )
+    return SECTION_CLASSES[path]
+
+
+def lookup_ordering_mode(path):
+    return ORDERING_MODES.get(path, ConfigSection.ordering_mode)
+
+
+for _path, _ordering_mode in list(ORDERING_MODES.items()):
+    register_path(_path, _ordering_mode)
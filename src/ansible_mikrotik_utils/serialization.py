@@ -0,0 +1,303 @@
+"""Compact binary serialization of configuration and script trees.
+
+The format starts with a magic string, a format version, the tree kind and
+the width of the integers, followed by a string table (every distinct name,
+key and value, separated by NUL characters) and a stream of packed unsigned
+integers. The integers describe the sections in traversal order: the index of
+the parent section (plus one, zero for the root), the name string and the
+command count, then one record per command. Configuration commands are
+recorded by kind with their item references and key/value pairs, so that the
+restored sections are rebuilt from the records without parsing any command;
+other commands are recorded as their text, parsed again on loading.
+"""
+import struct
+
+from collections import OrderedDict
+
+from ansible_mikrotik_utils.exceptions import ParseError
+from ansible_mikrotik_utils.common import make_bytes
+from ansible_mikrotik_utils.commands import AddCommand, RemoveCommand
+from ansible_mikrotik_utils.commands import MoveCommand, SetCommand
+from ansible_mikrotik_utils.sections import ConfigSection, ScriptSection
+
+__all__ = [
+    'FORMAT_VERSION',
+    'dumps',
+    'loads',
+    'dump',
+    'load',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+MAGIC = b'MKRT'
+FORMAT_VERSION = 3
+ENCODING = 'utf-8'
+HEADER = struct.Struct('<4sBBBII')
+CONFIG_KIND, SCRIPT_KIND = 1, 2
+TEXT_RECORD, ADD_RECORD, REMOVE_RECORD, MOVE_RECORD, SET_RECORD = range(5)
+INTEGER_FORMATS = OrderedDict([(1, 'B'), (2, 'H'), (4, 'I')])
+SEPARATOR = b'\x00'
+
+
+# Serialization
+# -----------------------------------------------------------------------------
+
+class StringTable(object):
+    def __init__(self):
+        self.__ids = dict()
+        self.__strings = list()
+        super(StringTable, self).__init__()
+
+    def __call__(self, text):
+        try:
+            return self.__ids[text]
+        except KeyError:
+            self.__ids[text] = len(self.__strings)
+            self.__strings.append(text)
+            return self.__ids[text]
+
+    @property
+    def strings(self):
+        return self.__strings
+
+
+def dump_reference(string_id, reference):
+    # None, positions (odd) and find identifiers (even) share one integer
+    if reference is None:
+        return 0
+    if isinstance(reference, int):
+        return reference * 2 + 1
+    return string_id(reference) * 2 + 2
+
+
+def dump_values(string_id, values):
+    yield len(values)
+    for key, value in values.items():
+        yield string_id(key)
+        yield string_id(value)
+
+
+def dump_command(string_id, command):
+    if isinstance(command, AddCommand):
+        yield ADD_RECORD
+        yield dump_reference(string_id, command.destination)
+        for integer in dump_values(string_id, command.values):
+            yield integer
+    elif isinstance(command, RemoveCommand):
+        yield REMOVE_RECORD
+        yield dump_reference(string_id, command.index)
+    elif isinstance(command, MoveCommand):
+        yield MOVE_RECORD
+        yield dump_reference(string_id, command.index)
+        yield dump_reference(string_id, command.destination)
+    elif isinstance(command, SetCommand):
+        yield SET_RECORD
+        yield dump_reference(string_id, command.identifier)
+        for integer in dump_values(string_id, command.values):
+            yield integer
+    else:
+        yield TEXT_RECORD
+        yield string_id(command.full_command)
+
+
+def dumps(section):
+    """Serialize the tree of ``section`` (and its children) to bytes."""
+    if isinstance(section, ConfigSection):
+        kind = CONFIG_KIND
+    elif isinstance(section, ScriptSection):
+        kind = SCRIPT_KIND
+    else:
+        raise TypeError("Cannot serialize {}".format(type(section).__name__))
+
+    string_id, ints, positions = StringTable(), list(), dict()
+    for index, current in enumerate(section.traverse()):
+        positions[id(current)] = index
+        if current is section:
+            ints.append(0)
+        else:
+            ints.append(positions[id(current.parent)] + 1)
+        ints.append(string_id(current.name))
+        ints.append(len(current.commands))
+        for command in current.commands:
+            ints.extend(dump_command(string_id, command))
+
+    largest = max(ints) if ints else 0
+    for width, code in INTEGER_FORMATS.items():
+        if largest < 1 << width * 8:
+            break
+    strings = SEPARATOR.join(
+        make_bytes(string, ENCODING) for string in string_id.strings
+    )
+    return b''.join((
+        HEADER.pack(
+            MAGIC, FORMAT_VERSION, kind, width,
+            len(string_id.strings), len(ints)
+        ),
+        struct.pack('<I', len(strings)),
+        strings,
+        struct.pack('<{}{}'.format(len(ints), code), *ints),
+    ))
+
+
+def dump(section, stream):
+    stream.write(dumps(section))
+
+
+# Deserialization
+# -----------------------------------------------------------------------------
+
+class RecordReader(object):
+    def __init__(self, ints, strings):
+        self.__ints = ints
+        self.__strings = strings
+        self.__position = 0
+        super(RecordReader, self).__init__()
+
+    def __nonzero__(self):
+        return self.__position < len(self.__ints)
+
+    def __bool__(self):
+        return self.__nonzero__()
+
+    def integer(self):
+        self.__position += 1
+        return self.__ints[self.__position - 1]
+
+    def string(self):
+        return self.__strings[self.integer()]
+
+    def reference(self):
+        value = self.integer()
+        if not value:
+            return None
+        if value % 2:
+            return value // 2
+        return self.__strings[value // 2 - 1]
+
+    def values(self):
+        ints, strings = self.__ints, self.__strings
+        start = self.__position + 1
+        self.__position = start + ints[start - 1] * 2
+        return OrderedDict(
+            (strings[ints[index]], strings[ints[index + 1]])
+            for index in range(start, self.__position, 2)
+        )
+
+
+class CommandClasses(object):
+    """Command classes of the sections, looked up once per section class."""
+
+    names = {
+        ADD_RECORD: 'insertion_command_class',
+        REMOVE_RECORD: 'deletion_command_class',
+        MOVE_RECORD: 'move_command_class',
+        SET_RECORD: 'set_command_class',
+    }
+
+    def __init__(self):
+        self.__classes = dict()
+        super(CommandClasses, self).__init__()
+
+    def __call__(self, section, record):
+        if isinstance(section, ConfigSection):
+            key = type(section), record
+        else:
+            key = section.path, record
+        try:
+            return self.__classes[key]
+        except KeyError:
+            pass
+        try:
+            name = self.names[record]
+        except KeyError:
+            raise ParseError("Unknown serialized command record: {}".format(record))
+        # the commands of script trees are those of the configuration sections
+        if isinstance(section, ConfigSection):
+            section_class = type(section)
+        else:
+            section_class = ConfigSection.lookup_section_class(section.path)
+        self.__classes[key] = getattr(section_class, name)
+        return self.__classes[key]
+
+
+def load_command(section, reader, command_class):
+    record = reader.integer()
+    if record == TEXT_RECORD:
+        section.load_command(
+            section.parse_command(reader.string(), path=section.path)
+        )
+        return
+    klass = command_class(section, record)
+    if record == ADD_RECORD:
+        destination = reader.reference()
+        command = klass(
+            path=section.path, destination=destination, values=reader.values()
+        )
+        if destination is None and isinstance(section, ConfigSection):
+            # appended items are added as they are, without applying the command
+            section.extend(items=[command.entity_type(command.values)])
+            section.commands.append(command)
+            return
+    elif record == REMOVE_RECORD:
+        command = klass(path=section.path, index=reader.reference())
+    elif record == MOVE_RECORD:
+        index = reader.reference()
+        command = klass(
+            path=section.path, index=index, destination=reader.reference()
+        )
+    else:
+        identifier = reader.reference()
+        command = klass(
+            path=section.path, identifier=identifier, values=reader.values()
+        )
+    section.load_command(command)
+
+
+def loads(data, device):
+    """Rebuild a tree serialized by :func:`dumps`, with a new root section
+    attached to ``device``."""
+    try:
+        magic, version, kind, width, string_count, int_count = HEADER.unpack_from(data)
+    except struct.error:
+        raise ParseError("Truncated serialized tree.")
+    if magic != MAGIC:
+        raise ParseError("Not a serialized tree.")
+    if version != FORMAT_VERSION:
+        raise ParseError("Unsupported serialized tree version: {}".format(version))
+    if width not in INTEGER_FORMATS:
+        raise ParseError("Unsupported serialized integer width: {}".format(width))
+    offset = HEADER.size
+    size, = struct.unpack_from('<I', data, offset)
+    offset += 4
+    strings = data[offset:offset + size]
+    if str is bytes:
+        strings = strings.split(SEPARATOR)
+    else:
+        strings = strings.decode(ENCODING).split(SEPARATOR.decode(ENCODING))
+    offset += size
+    ints = struct.unpack_from(
+        '<{}{}'.format(int_count, INTEGER_FORMATS[width]), data, offset
+    )
+    if len(strings) != string_count:
+        raise ParseError("Corrupted serialized tree string table.")
+
+    root_class = ConfigSection if kind == CONFIG_KIND else ScriptSection
+    reader, command_class = RecordReader(ints, strings), CommandClasses()
+    sections = list()
+    while reader:
+        parent, name = reader.integer(), reader.string()
+        if parent:
+            section = sections[parent - 1][name]
+        else:
+            section = root_class(device=device)
+        sections.append(section)
+        for _ in range(reader.integer()):
+            load_command(section, reader, command_class)
+    return sections[0]
+
+
+def load(stream, device):
+    return loads(stream.read(), device)
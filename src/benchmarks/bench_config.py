@@ -0,0 +1,191 @@
+"""Parse, diff and render benchmarks over generated exports.
+
+Results are written as JSON, so that scaling curves can be compared across
+releases::
+
+    python -m benchmarks.bench_config --sizes small medium --output results.json
+"""
+import gc
+import json
+import os
+import platform
+import sys
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.device import Device
+from ansible_mikrotik_utils.serialization import dumps, loads
+
+from .generator import SIZES, generate_config, generate_target, format_config
+
+__all__ = [
+    'measure',
+    'run_benchmarks',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+DEFAULT_SIZES = 'small', 'medium'
+DEFAULT_REPEAT = 3
+DEFAULT_CHURN = 0.01
+# ru_maxrss is in kilobytes, except on macOS where it is in bytes
+MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+
+# Measurement
+# -----------------------------------------------------------------------------
+
+def measure_peak_rss(function):
+    # a forked process starts with its own peak resident size, which then
+    # grows with the memory touched by the call
+    if resource is None or not hasattr(os, 'fork'):
+        return None
+    gc.collect()
+    read, write = os.pipe()
+    pid = os.fork()
+    if not pid:
+        try:
+            os.close(read)
+            start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            function()
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            os.write(write, str(peak - start).encode('ascii'))
+        finally:
+            os._exit(0)
+    os.close(write)
+    with os.fdopen(read, 'rb') as stream:
+        output = stream.read()
+    os.waitpid(pid, 0)
+    return int(output) * MAXRSS_UNIT if output else None
+
+
+def measure_peak(function):
+    if tracemalloc is None:
+        return measure_peak_rss(function)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(function, repeat=DEFAULT_REPEAT):
+    """Time ``repeat`` calls of ``function``, then trace one more call for
+    its peak memory use, in bytes (traced allocations, or the peak resident
+    size of a forked process where tracemalloc is missing)."""
+    timings = []
+    try:
+        for _ in range(repeat):
+            gc.collect()
+            start = default_timer()
+            function()
+            timings.append(default_timer() - start)
+        peak_memory = measure_peak(function)
+    except Exception as ex:
+        return OrderedDict(error='{}: {}'.format(type(ex).__name__, ex))
+    return OrderedDict([
+        ('best', min(timings)),
+        ('mean', sum(timings) / len(timings)),
+        ('peak_memory', peak_memory),
+    ])
+
+
+# Benchmarks
+# -----------------------------------------------------------------------------
+
+class NullSink(object):
+    def write(self, text):
+        pass
+
+
+def run_size(size, seed, churn, repeat):
+    config = generate_config(size, seed=seed)
+    base_text = format_config(config)
+    target_text = format_config(generate_target(config, churn=churn, seed=seed))
+
+    # the configurations keep their devices alive, roots only refer to them
+    base_config = MikrotikConfig.parse(base_text)
+    target_config = MikrotikConfig.parse(target_text)
+    base, target = base_config.root, target_config.root
+    script = base.difference(target)
+    data = dumps(base)
+
+    operations = OrderedDict([
+        ('from_text', lambda: MikrotikConfig.parse(base_text)),
+        ('copy', base.copy),
+        ('difference', lambda: base.difference(target)),
+        ('apply', lambda: base.copy().apply(script)),
+        ('render', lambda: str(script)),
+        ('write', lambda: script.write(NullSink())),
+        ('dumps', lambda: dumps(base)),
+        ('loads', lambda: loads(data, Device())),
+    ])
+    return OrderedDict([
+        ('size', size),
+        ('counts', SIZES[size]),
+        ('lines', base_text.count('\n')),
+        ('serialized_size', len(data)),
+        ('changes', len(script.all_commands)),
+        ('operations', OrderedDict(
+            (name, measure(function, repeat=repeat))
+            for name, function in operations.items()
+        )),
+    ])
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=0, churn=DEFAULT_CHURN,
+                   repeat=DEFAULT_REPEAT):
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('seed', seed),
+        ('churn', churn),
+        ('repeat', repeat),
+        ('results', [run_size(size, seed, churn, repeat) for size in sizes]),
+    ])
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def main(args=None):
+    parser = ArgumentParser(description="Run configuration benchmarks.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--churn', type=float, default=DEFAULT_CHURN)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--output')
+    options = parser.parse_args(args)
+
+    results = run_benchmarks(
+        sizes=options.sizes, seed=options.seed,
+        churn=options.churn, repeat=options.repeat,
+    )
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
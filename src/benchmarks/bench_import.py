@@ -0,0 +1,126 @@
+"""Import time benchmarks, each import running in a fresh interpreter like
+the one Ansible starts for every module task::
+
+    python -m benchmarks.bench_import --repeat 10 --output imports.json
+"""
+import json
+import platform
+import subprocess
+import sys
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+
+__all__ = [
+    'measure_import',
+    'run_benchmarks',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+DEFAULT_MODULES = (
+    'ansible_mikrotik_utils.config',
+    'ansible_mikrotik_utils.connection',
+    'ansible_mikrotik_utils.runner',
+)
+DEFAULT_REPEAT = 5
+
+# dependencies that should only be loaded once a device is contacted
+HEAVY_MODULES = (
+    'paramiko',
+    'cryptography',
+    'multiprocessing',
+    'subprocess',
+    'argparse',
+    'asyncio',
+)
+
+IMPORT_SCRIPT = """
+import sys
+from timeit import default_timer
+start = default_timer()
+import {module}
+duration = default_timer() - start
+heavy = [name for name in {heavy!r} if name in sys.modules]
+sys.stdout.write('{{}} {{}} {{}}'.format(duration, len(sys.modules), ','.join(heavy)))
+"""
+
+
+# Measurement
+# -----------------------------------------------------------------------------
+
+def run_import(module, python):
+    script = IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+    process = subprocess.Popen(
+        [python, '-c', script],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    output, error = process.communicate()
+    if process.returncode:
+        raise RuntimeError(error.decode('utf-8', 'replace').strip().splitlines()[-1])
+    duration, count, heavy = output.decode('utf-8').split(' ')
+    return float(duration), int(count), [name for name in heavy.split(',') if name]
+
+
+def measure_import(module, repeat=DEFAULT_REPEAT, python=sys.executable):
+    """Import ``module`` in ``repeat`` fresh interpreters, reporting its
+    import times, the number of loaded modules and the heavy ones among
+    them."""
+    timings = []
+    try:
+        for _ in range(repeat):
+            duration, count, heavy = run_import(module, python)
+            timings.append(duration)
+    except (RuntimeError, OSError) as ex:
+        return OrderedDict(error='{}: {}'.format(type(ex).__name__, ex))
+    return OrderedDict([
+        ('best', min(timings)),
+        ('mean', sum(timings) / len(timings)),
+        ('modules', count),
+        ('heavy_modules', heavy),
+    ])
+
+
+# Benchmarks
+# -----------------------------------------------------------------------------
+
+def run_benchmarks(modules=DEFAULT_MODULES, repeat=DEFAULT_REPEAT,
+                   python=sys.executable):
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('repeat', repeat),
+        ('results', OrderedDict(
+            (module, measure_import(module, repeat=repeat, python=python))
+            for module in modules
+        )),
+    ])
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def main(args=None):
+    parser = ArgumentParser(description="Run import time benchmarks.")
+    parser.add_argument('--modules', nargs='+', default=DEFAULT_MODULES)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--python', default=sys.executable)
+    parser.add_argument('--output')
+    options = parser.parse_args(args)
+
+    results = run_benchmarks(
+        modules=options.modules, repeat=options.repeat, python=options.python,
+    )
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
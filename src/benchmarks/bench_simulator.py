@@ -0,0 +1,189 @@
+"""End to end benchmarks against the simulated device, timing the connection,
+export, parse, diff and apply steps of a configuration run::
+
+    python -m benchmarks.bench_simulator --sizes small --latency 0.01 --output e2e.json
+"""
+import gc
+import json
+import platform
+import sys
+
+from argparse import ArgumentParser
+from collections import OrderedDict
+from timeit import default_timer
+
+from ansible_mikrotik_utils.commands import Export
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.connection import SSHTransport, ShellTransport
+from ansible_mikrotik_utils.connection.simulator import SimulatorServer, SimulatedDevice
+from ansible_mikrotik_utils.connection.simulator import parse_latency
+
+from .generator import SIZES, generate_config, generate_target, format_config
+
+__all__ = [
+    'measure_run',
+    'run_benchmarks',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+DEFAULT_SIZES = 'small',
+DEFAULT_REPEAT = 3
+DEFAULT_CHURN = 0.01
+DEFAULT_TRANSPORTS = 'ssh', 'shell'
+
+TRANSPORTS = OrderedDict([
+    ('ssh', SSHTransport),
+    ('shell', ShellTransport),
+])
+
+PHASES = 'connect', 'export', 'parse', 'difference', 'apply', 'close'
+
+
+# Measurement
+# -----------------------------------------------------------------------------
+
+def run_once(transport_class, base_text, target, latency, default_latency):
+    """Configure a fresh simulated device, yielding ``(phase, duration)``
+    pairs and finally the number of applied commands."""
+    device = SimulatedDevice(
+        config=base_text, latency=latency, default_latency=default_latency
+    )
+    with SimulatorServer(device=device) as server:
+        transport = transport_class(
+            server.address, port=server.port, username='admin',
+            password='admin', host_key_policy='accept',
+        )
+        start = default_timer()
+        transport.open()
+        yield 'connect', default_timer() - start
+        try:
+            start = default_timer()
+            text, _ = transport.execute(str(Export(path='/')))
+            yield 'export', default_timer() - start
+
+            start = default_timer()
+            current = MikrotikConfig.parse(text)
+            yield 'parse', default_timer() - start
+
+            start = default_timer()
+            script = current.root.difference(target.root)
+            yield 'difference', default_timer() - start
+
+            start = default_timer()
+            commands = script.all_commands
+            for command in commands:
+                transport.execute(str(command))
+            yield 'apply', default_timer() - start
+        finally:
+            start = default_timer()
+            transport.close()
+        yield 'close', default_timer() - start
+    yield 'changes', len(commands)
+
+
+def measure_run(transport_class, base_text, target, latency=None,
+                default_latency=0.0, repeat=DEFAULT_REPEAT):
+    """Time ``repeat`` configuration runs, each against a new simulated
+    device, reporting the best and mean duration of every phase."""
+    timings = OrderedDict((phase, []) for phase in PHASES)
+    try:
+        for _ in range(repeat):
+            gc.collect()
+            results = dict(run_once(
+                transport_class, base_text, target, latency, default_latency
+            ))
+            for phase, durations in timings.items():
+                durations.append(results[phase])
+    except Exception as ex:
+        return OrderedDict(error='{}: {}'.format(type(ex).__name__, ex))
+    return OrderedDict([
+        ('changes', results['changes']),
+        ('phases', OrderedDict(
+            (phase, OrderedDict([
+                ('best', min(durations)),
+                ('mean', sum(durations) / len(durations)),
+            ]))
+            for phase, durations in timings.items()
+        )),
+    ])
+
+
+# Benchmarks
+# -----------------------------------------------------------------------------
+
+def run_size(size, seed, churn, repeat, transports, latency, default_latency):
+    config = generate_config(size, seed=seed)
+    base_text = format_config(config)
+    target = MikrotikConfig.parse(
+        format_config(generate_target(config, churn=churn, seed=seed))
+    )
+    return OrderedDict([
+        ('size', size),
+        ('counts', SIZES[size]),
+        ('lines', base_text.count('\n')),
+        ('transports', OrderedDict(
+            (name, measure_run(
+                TRANSPORTS[name], base_text, target, latency=latency,
+                default_latency=default_latency, repeat=repeat,
+            ))
+            for name in transports
+        )),
+    ])
+
+
+def run_benchmarks(sizes=DEFAULT_SIZES, seed=0, churn=DEFAULT_CHURN,
+                   repeat=DEFAULT_REPEAT, transports=DEFAULT_TRANSPORTS,
+                   latency=None, default_latency=0.0):
+    return OrderedDict([
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('seed', seed),
+        ('churn', churn),
+        ('repeat', repeat),
+        ('latency', OrderedDict(latency or (), default=default_latency)),
+        ('results', [
+            run_size(
+                size, seed, churn, repeat, transports, latency, default_latency
+            )
+            for size in sizes
+        ]),
+    ])
+
+
+# Command line entry point
+# -----------------------------------------------------------------------------
+
+def main(args=None):
+    parser = ArgumentParser(description="Run simulated device benchmarks.")
+    parser.add_argument('--sizes', nargs='+', choices=list(SIZES), default=DEFAULT_SIZES)
+    parser.add_argument('--transports', nargs='+', choices=list(TRANSPORTS), default=DEFAULT_TRANSPORTS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--churn', type=float, default=DEFAULT_CHURN)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument(
+        '--latency', action='append', default=[],
+        help="delay in seconds for all commands, or VERB=DELAY for one verb"
+    )
+    parser.add_argument('--output')
+    options = parser.parse_args(args)
+
+    latency, default_latency = parse_latency(options.latency)
+    results = run_benchmarks(
+        sizes=options.sizes, seed=options.seed, churn=options.churn,
+        repeat=options.repeat, transports=options.transports,
+        latency=latency, default_latency=default_latency,
+    )
+    if options.output:
+        with open(options.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
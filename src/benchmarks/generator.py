@@ -0,0 +1,185 @@
+"""Seeded generator of realistic device exports, and of targets derived
+from them with a controlled amount of churn."""
+from collections import OrderedDict
+from random import Random
+
+__all__ = [
+    'SIZES',
+    'generate_config',
+    'generate_target',
+    'format_config',
+]
+
+
+# Constants
+# -----------------------------------------------------------------------------
+
+SIZES = OrderedDict([
+    ('small', dict(
+        interfaces=8, vlans=16, filter_rules=100, nat_rules=20,
+        address_lists=4, addresses=1000,
+    )),
+    ('medium', dict(
+        interfaces=24, vlans=200, filter_rules=1000, nat_rules=200,
+        address_lists=16, addresses=10000,
+    )),
+    ('large', dict(
+        interfaces=48, vlans=1000, filter_rules=5000, nat_rules=1000,
+        address_lists=64, addresses=100000,
+    )),
+])
+
+ORDERED_PATHS = frozenset((
+    '/ip firewall filter',
+    '/ip firewall nat',
+))
+
+FILTER_CHAINS = 'input', 'forward', 'output', 'from-lan', 'from-wan', 'to-dmz'
+FILTER_ACTIONS = 'accept', 'drop', 'reject', 'jump', 'log', 'return'
+PROTOCOLS = 'tcp', 'udp', 'icmp'
+NAT_CHAINS = 'srcnat', 'dstnat'
+
+
+# Value helpers
+# -----------------------------------------------------------------------------
+
+def make_address(random, prefix=10):
+    return '{}.{}.{}.{}'.format(
+        prefix, random.randint(0, 255), random.randint(0, 255), random.randint(1, 254)
+    )
+
+
+def make_values(*pairs):
+    return OrderedDict(pair for pair in pairs if pair[1] is not None)
+
+
+def make_filter_rule(random, index):
+    protocol = random.choice(PROTOCOLS)
+    action = random.choice(FILTER_ACTIONS)
+    return make_values(
+        ('action', action),
+        ('chain', random.choice(FILTER_CHAINS)),
+        ('comment', 'rule-{}'.format(index)),
+        ('dst-port', str(random.randint(1, 65535)) if protocol != 'icmp' else None),
+        ('jump-target', random.choice(FILTER_CHAINS[3:]) if action == 'jump' else None),
+        ('protocol', protocol),
+        ('src-address-list', 'list-{}'.format(random.randint(0, 7))),
+    )
+
+
+def make_nat_rule(random, index):
+    chain = random.choice(NAT_CHAINS)
+    return make_values(
+        ('action', 'masquerade' if chain == 'srcnat' else 'dst-nat'),
+        ('chain', chain),
+        ('comment', 'nat-{}'.format(index)),
+        ('dst-port', str(random.randint(1, 65535)) if chain == 'dstnat' else None),
+        ('protocol', random.choice(PROTOCOLS[:2]) if chain == 'dstnat' else None),
+        ('to-addresses', make_address(random, 192) if chain == 'dstnat' else None),
+    )
+
+
+def make_address_list_entry(random, index, lists):
+    return make_values(
+        ('address', make_address(random)),
+        ('comment', 'entry-{}'.format(index)),
+        ('list', 'list-{}'.format(random.randint(0, lists - 1))),
+    )
+
+
+# Generation
+# -----------------------------------------------------------------------------
+
+def generate_config(size='small', seed=0):
+    """Generate a device configuration, as an ordered mapping of menu paths
+    to ``(items, settings)`` pairs, where items are value mappings and
+    settings are ``(identifier, values)`` pairs."""
+    counts = SIZES[size] if not isinstance(size, dict) else size
+    random = Random(seed)
+    config = OrderedDict()
+
+    config['/interface ethernet'] = [], [
+        ('[ find default-name=ether{} ]'.format(number), make_values(
+            ('comment', 'port-{}'.format(number)),
+            ('l2mtu', str(random.choice((1598, 2028)))),
+            ('mtu', str(random.choice((1500, 9000)))),
+        ))
+        for number in range(1, counts['interfaces'] + 1)
+    ]
+    config['/interface vlan'] = [
+        make_values(
+            ('interface', 'ether{}'.format(random.randint(1, counts['interfaces']))),
+            ('name', 'vlan{}'.format(number)),
+            ('vlan-id', str(number)),
+        )
+        for number in range(1, counts['vlans'] + 1)
+    ], []
+    config['/ip address'] = [
+        make_values(
+            ('address', '{}/24'.format(make_address(random, 172))),
+            ('interface', 'vlan{}'.format(number)),
+        )
+        for number in range(1, counts['vlans'] + 1)
+    ], []
+    config['/ip firewall address-list'] = [
+        make_address_list_entry(random, index, counts['address_lists'])
+        for index in range(counts['addresses'])
+    ], []
+    config['/ip firewall filter'] = [
+        make_filter_rule(random, index)
+        for index in range(counts['filter_rules'])
+    ], []
+    config['/ip firewall nat'] = [
+        make_nat_rule(random, index)
+        for index in range(counts['nat_rules'])
+    ], []
+    return config
+
+
+def generate_target(config, churn=0.01, seed=0):
+    """Derive a target from ``config``, where about a ``churn`` fraction of
+    the items of every menu is removed, added or (in ordered menus) moved,
+    and of the settings is changed."""
+    random = Random(seed)
+    target = OrderedDict()
+    serial = 0
+    for path, (items, settings) in config.items():
+        items, settings = list(items), list(settings)
+        changes = int(round(len(items) * churn))
+        for _ in range(min(changes, len(items))):
+            items.pop(random.randrange(len(items)))
+        for _ in range(changes):
+            serial += 1
+            item = OrderedDict(random.choice(config[path][0]))
+            item['comment'] = 'added-{}'.format(serial)
+            items.insert(random.randint(0, len(items)), item)
+        if path in ORDERED_PATHS:
+            for _ in range(min(changes, len(items))):
+                item = items.pop(random.randrange(len(items)))
+                items.insert(random.randint(0, len(items)), item)
+        for index in random.sample(range(len(settings)), int(round(len(settings) * churn))):
+            identifier, values = settings[index]
+            values = OrderedDict(values)
+            values['comment'] = 'changed-{}'.format(index)
+            settings[index] = identifier, values
+        target[path] = items, settings
+    return target
+
+
+# Rendering
+# -----------------------------------------------------------------------------
+
+def format_values(values):
+    return ' '.join('{}={}'.format(key, value) for key, value in values.items())
+
+
+def format_config(config):
+    lines = []
+    for path, (items, settings) in config.items():
+        lines.append(path)
+        for identifier, values in settings:
+            lines.append('set {} {}'.format(identifier, format_values(values)))
+        for values in items:
+            lines.append('add {}'.format(format_values(values)))
+    lines.append('')
+    return '\n'.join(lines)
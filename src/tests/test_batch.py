@@ -0,0 +1,67 @@
+import json
+
+from ansible_mikrotik_utils.device import Device
+from ansible_mikrotik_utils.device.batch import compare_batch, main
+
+# Assets
+# =============================================================================
+
+CONFIG_CURRENT = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+"""
+
+CONFIG_TARGET = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.50
+add name=vpn ranges=10.1.0.10-10.1.0.20
+"""
+
+JOBS = [
+    ('changed', CONFIG_CURRENT, CONFIG_TARGET),
+    ('unchanged', CONFIG_CURRENT, CONFIG_CURRENT),
+    ('broken', CONFIG_CURRENT, '/ip pool\n=broken\n'),
+]
+
+
+# Tests
+# =============================================================================
+
+def test_compare_batch():
+    results = list(compare_batch(JOBS, processes=1))
+    assert [name for name, _ in results] == ['changed', 'unchanged', 'broken']
+    changed, unchanged, broken = (result for _, result in results)
+    assert changed['changes'] == 2
+    assert changed['script'] == (
+        '/ip pool\n'
+        'set [ find name=dhcp ] ranges=10.0.0.10-10.0.0.50\n'
+        'add name=vpn ranges=10.1.0.10-10.1.0.20\n'
+    )
+    assert unchanged == dict(changes=0, script='')
+    assert broken['failed']
+    assert broken['msg'].startswith('ParseError')
+
+
+def test_compare_batch_pool():
+    expected = list(compare_batch(JOBS, processes=1))
+    assert list(compare_batch(JOBS, processes=2)) == expected
+    assert list(Device.compare_batch(JOBS, processes=2)) == expected
+
+
+def test_batch_main(tmpdir):
+    for name, export, target in JOBS:
+        tmpdir.join('exports', '{}.rsc'.format(name)).write(export, ensure=True)
+        tmpdir.join('targets', '{}.rsc'.format(name)).write(target, ensure=True)
+    output = tmpdir.join('output')
+    # a failed device makes the exit status non-zero
+    assert main([
+        str(tmpdir.join('exports')), str(tmpdir.join('targets')), str(output),
+        '--processes', '1',
+    ]) == 2
+    summary = json.loads(output.join('summary.json').read())
+    assert summary['changed'] == dict(changes=2)
+    assert summary['broken']['failed']
+    assert output.join('changed.rsc').read().endswith(
+        'add name=vpn ranges=10.1.0.10-10.1.0.20\n'
+    )
+    assert not output.join('broken.rsc').exists()
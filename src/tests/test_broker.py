@@ -0,0 +1,65 @@
+import socket
+
+from pytest import raises
+
+from ansible_mikrotik_utils.connection.broker import ConnectionPool, make_pool_key
+from ansible_mikrotik_utils.connection.simulator import SimulatorServer, SimulatedDevice
+from ansible_mikrotik_utils.exceptions import TransportError
+
+# Assets
+# =============================================================================
+
+def make_target(address, port):
+    return dict(
+        host=address, port=port, username='admin', password='admin',
+        host_key_policy='accept', timeout=2,
+    )
+
+
+def get_closed_port():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+# Tests
+# =============================================================================
+
+def test_pool_reuse():
+    pool = ConnectionPool(idle_timeout=0)
+    with SimulatorServer(device=SimulatedDevice()) as server:
+        target = make_target(server.address, server.port)
+        first = pool.acquire(target)
+        second = pool.acquire(target)
+        assert first is second
+        assert len(pool) == 1
+        pool.release(first)
+        # still used by the second session
+        pool.expire()
+        assert len(pool) == 1
+        pool.release(second)
+        pool.expire()
+        assert len(pool) == 0
+        assert not first.transport.active
+
+
+def test_pool_key():
+    target = make_target('127.0.0.1', 22)
+    assert make_pool_key(target) == make_pool_key(dict(reversed(list(target.items()))))
+    for name, value in [
+        ('host', '127.0.0.2'), ('port', 2222), ('username', 'other'),
+        ('password', 'other'), ('key_filename', '/tmp/key'), ('timeout', 10),
+        ('compress', True), ('host_key_policy', 'reject'),
+    ]:
+        other = dict(target)
+        other[name] = value
+        assert make_pool_key(other) != make_pool_key(target), name
+
+
+def test_pool_failed_open():
+    pool = ConnectionPool()
+    with raises(TransportError):
+        pool.acquire(make_target('127.0.0.1', get_closed_port()))
+    assert len(pool) == 0
@@ -1,5 +1,8 @@
+from itertools import permutations
+
 from pytest import fixture
 
+from ansible_mikrotik_utils.config import MikrotikConfig, make_script_paths
 from ansible_mikrotik_utils.device import Device
 from ansible_mikrotik_utils.sections import ConfigSection, ScriptSection
 
@@ -59,12 +62,51 @@ remove 5
 remove 5
 add chain=test comment=foo place-before=0
 add chain=test comment=bar
+move 2 6
 move 1 4
-move 1 6
-move 2 4
+"""
+
+CONFIG_UNORDERED_BASE = """
+/ip firewall address-list
+add address=10.0.0.1 list=a
+add address=10.0.0.2 list=a
+add address=10.0.0.3 list=a
+add address=10.0.0.4 list=a
+"""
+
+CONFIG_UNORDERED_TARGET = """
+/ip firewall address-list
+add address=10.0.0.4 list=a
+add address=10.0.0.2 list=a
+add address=10.0.0.5 list=a
+"""
+
+CONFIG_UNORDERED_CHANGES = """
+/ip firewall address-list
+remove 2
+remove 0
+add address=10.0.0.5 list=a
 """
 
 
+def make_filter(comments):
+    return '/ip firewall filter\n' + '\n'.join(
+        'add chain=test comment={}'.format(comment) for comment in comments
+    )
+
+
+def assert_stable_rollback(original, target, device):
+    changes = original.difference(target).all_commands
+    rollback = '\n'.join(map(str, target.stable_difference(original)))
+    for count in range(len(changes) + 1):
+        partial = '\n'.join(map(str, changes[:count]))
+        restored = ConfigSection.from_text(
+            '\n'.join((str(original.root), partial, rollback)), device=device
+        )
+        assert not restored.difference(original.root).all_commands
+    return rollback
+
+
 # Fixtures
 # =============================================================================
 
@@ -89,3 +131,127 @@ def config_changes(device):
 
 def test_compare(config_base, config_target, config_changes):
     assert list(map(str, config_base.difference(config_target))) == list(map(str, config_changes))
+    # C, D and E stay in place, only B and A are moved
+    config_base.apply(config_changes)
+    assert not config_base.difference(config_target).all_commands
+
+
+def test_compare_unordered(device):
+    base = ConfigSection.from_text(CONFIG_UNORDERED_BASE, device=device)
+    target = ConfigSection.from_text(CONFIG_UNORDERED_TARGET, device=device)
+    changes = ScriptSection.from_text(CONFIG_UNORDERED_CHANGES, device=device)
+    assert list(map(str, base.difference(target))) == list(map(str, changes))
+
+
+def test_compare_unordered_identity(device):
+    base = ConfigSection.from_text(
+        '/ip pool\nadd name=a ranges=10.0.0.1-10.0.0.9\n', device=device
+    )
+    target = ConfigSection.from_text(
+        '/ip pool\nadd name=a ranges=10.0.0.1-10.0.0.5\n', device=device
+    )
+    changes = ScriptSection.from_text(
+        '/ip pool\nset [ find name=a ] ranges=10.0.0.1-10.0.0.5\n', device=device
+    )
+    assert list(map(str, base.difference(target))) == list(map(str, changes))
+
+
+def test_set_find_keeps_positions(device):
+    section = ConfigSection.from_text(
+        '/ip pool\n'
+        'add name=a ranges=10.0.0.1\n'
+        'add name=b ranges=10.0.0.2\n'
+        'add name=c ranges=10.0.0.3\n'
+        'set [ find name=b ] ranges=10.0.0.9\n'
+        'remove 0\n'
+        'set [ find name=c ] ranges=10.0.0.8\n',
+        device=device
+    )
+    pool = section['ip']['pool']
+    assert [item.values['ranges'] for item in pool.items] == ['10.0.0.9', '10.0.0.8']
+    assert pool.find_items({'name': 'c'}) == set(pool.items[1:])
+
+
+def test_set_find_then_remove(device):
+    section = ConfigSection.from_text(
+        '/ip pool\n'
+        'add name=a ranges=10.0.0.1\n'
+        'add name=b ranges=10.0.0.2\n'
+        'set [ find name=b ] ranges=10.0.0.9\n'
+        'remove 1\n',
+        device=device
+    )
+    pool = section['ip']['pool']
+    assert [item.values['name'] for item in pool.items] == ['a']
+
+
+def test_compare_reorder(device):
+    for order in permutations('abcde'):
+        base = ConfigSection.from_text(make_filter('abcde'), device=device)
+        target = ConfigSection.from_text(make_filter(order), device=device)
+        changes = base.difference(target)
+        assert len(changes.all_commands) < 5
+        replayed = ConfigSection.from_text(
+            '\n'.join((make_filter('abcde'), str(changes))), device=device
+        )
+        assert not replayed.difference(target).all_commands
+
+
+def test_stable_difference_partial(device):
+    original = MikrotikConfig.parse(make_filter('abcde'))
+    target = MikrotikConfig.parse(make_filter('xdbay'))
+    changes = original.difference(target).all_commands
+    rollback = '\n'.join(map(str, target.stable_difference(original)))
+    assert 'find' in rollback
+    # the rollback restores the original whatever part of the changes was made
+    for count in range(len(changes) + 1):
+        partial = '\n'.join(map(str, changes[:count]))
+        restored = ConfigSection.from_text(
+            '\n'.join((make_filter('abcde'), partial, rollback)), device=device
+        )
+        assert not restored.difference(original.root).all_commands
+
+
+def test_stable_difference_superset(device):
+    original = MikrotikConfig.parse(
+        '/ip firewall filter\n'
+        'add chain=test comment=a\n'
+        'add chain=test comment=a action=drop\n'
+        'add chain=test comment=b\n'
+        'add chain=test comment=c\n'
+    )
+    target = MikrotikConfig.parse(
+        '/ip firewall filter\n'
+        'add chain=test comment=c\n'
+        'add chain=test comment=a action=drop\n'
+        'add chain=test comment=b\n'
+    )
+    rollback = assert_stable_rollback(original, target, device)
+    # the rule with more values is kept out of the finds of the other one
+    assert 'remove [ find chain=test comment=a action="" ]' in rollback
+    # only the displaced and the restored rules are moved
+    assert rollback.count(' move ') == 2
+    assert 'move [ find chain=test comment=b ]' not in rollback
+
+
+def test_stable_difference_quoted(device):
+    original = MikrotikConfig.parse(
+        '/ip firewall filter\n'
+        'add chain=test comment="first rule"\n'
+        'add chain=test comment="say \\"hi\\""\n'
+        'add chain=test comment="third ] rule"\n'
+    )
+    target = MikrotikConfig.parse(
+        '/ip firewall filter\n'
+        'add chain=test comment="third ] rule"\n'
+        'add chain=test comment="first rule"\n'
+    )
+    rollback = assert_stable_rollback(original, target, device)
+    assert '[ find chain=test comment="first rule" ]' in rollback
+    assert '[ find chain=test comment="say \\"hi\\"" ]' in rollback
+
+
+def test_script_paths(config_base, config_target):
+    script = config_base.difference(config_target)
+    assert make_script_paths(script) == ['/ip firewall filter']
+    assert make_script_paths(config_base.difference(config_base)) == []
@@ -0,0 +1,66 @@
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.sections import base
+
+# Assets
+# =============================================================================
+
+CONFIG_BASE = """
+/ip address
+add address=192.168.88.1/24 interface=bridge
+add address=10.0.0.1/24 interface=ether1
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+"""
+
+
+# Fixtures
+# =============================================================================
+
+class ChunkStream(object):
+    def __init__(self):
+        self.chunks = list()
+
+    def write(self, text):
+        self.chunks.append(text)
+
+    def getvalue(self):
+        return ''.join(self.chunks)
+
+
+# Tests
+# =============================================================================
+
+def test_export_pretty():
+    config = MikrotikConfig.parse(CONFIG_BASE)
+    assert list(config.root.export()) == [
+        base.EXPORT_HEADER,
+        '/ip address',
+        'add address=192.168.88.1/24 interface=bridge',
+        'add address=10.0.0.1/24 interface=ether1',
+        '',
+        '/ip pool',
+        'add name=dhcp ranges=10.0.0.10-10.0.0.20',
+    ]
+
+
+def test_export_options():
+    config = MikrotikConfig.parse(CONFIG_BASE)
+    lines = list(config.root.export(header=False, blank=False))
+    assert lines[0] == '/ip address'
+    assert '' not in lines
+    flat = list(config.root.export(pretty=False, header=False))
+    assert flat == str(config.root).split('\n')
+    # the flat export loads back into the same configuration
+    restored = MikrotikConfig.parse('\n'.join(flat))
+    assert not config.difference(restored).all_commands
+
+
+def test_write_chunks(monkeypatch):
+    monkeypatch.setattr(base, 'WRITE_CHUNK_LINES', 2)
+    config = MikrotikConfig.parse(CONFIG_BASE)
+    stream = ChunkStream()
+    config.root.write(stream)
+    lines = list(config.root.export())
+    assert stream.getvalue() == ''.join('{}\n'.format(line) for line in lines)
+    assert len(stream.chunks) == (len(lines) + 1) // 2
+    assert all(chunk.count('\n') <= 2 for chunk in stream.chunks)
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+import paramiko
+
+from pytest import mark
+
+from ansible_mikrotik_utils.connection.base import import_paramiko
+
+# Assets
+# =============================================================================
+
+CHECK_IMPORT = """
+import sys
+import {}
+sys.stdout.write(str('paramiko' in sys.modules))
+"""
+
+
+# Tests
+# =============================================================================
+
+@mark.parametrize('module', [
+    'ansible_mikrotik_utils.config',
+    'ansible_mikrotik_utils.device',
+    'ansible_mikrotik_utils.serialization',
+    'ansible_mikrotik_utils.connection.base',
+    'ansible_mikrotik_utils.connection.broker',
+    'ansible_mikrotik_utils.runner',
+])
+def test_lazy_paramiko(module):
+    # a fresh interpreter, as the test session itself loads the simulator
+    output = subprocess.check_output(
+        [sys.executable, '-c', CHECK_IMPORT.format(module)],
+        env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path)),
+    )
+    assert output.decode('ascii') == 'False'
+
+
+def test_import_paramiko():
+    assert import_paramiko() is paramiko
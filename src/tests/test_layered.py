@@ -0,0 +1,65 @@
+from ansible_mikrotik_utils.config import MikrotikConfig, LayeredConfig
+
+# Assets
+# =============================================================================
+
+CONFIG_BASE = """
+/ip address
+add address=192.168.88.1/24 interface=bridge
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+/system identity
+set 0 name=template
+"""
+
+CONFIG_OVERLAY = """
+/ip pool
+add name=vpn ranges=10.1.0.10-10.1.0.20
+/system identity
+set 0 name=router-1
+"""
+
+CONFIG_CURRENT = """
+/ip address
+add address=192.168.88.1/24 interface=bridge
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.30
+/system identity
+set 0 name=router-1
+"""
+
+
+# Tests
+# =============================================================================
+
+def test_overlay_target():
+    base = MikrotikConfig.parse(CONFIG_BASE)
+    layered = base.overlay(CONFIG_OVERLAY)
+    assert isinstance(layered, LayeredConfig)
+    assert layered.base is base
+    flat = MikrotikConfig.parse('\n'.join((CONFIG_BASE, CONFIG_OVERLAY)))
+    current = MikrotikConfig.parse(CONFIG_CURRENT)
+    assert str(current.difference(layered)) == str(current.difference(flat))
+    assert not flat.difference(layered).all_commands
+
+
+def test_overlay_keeps_base():
+    base = MikrotikConfig.parse(CONFIG_BASE)
+    text = str(base)
+    first = base.overlay(CONFIG_OVERLAY)
+    second = base.overlay('/ip pool\nadd name=guest ranges=10.2.0.10-10.2.0.20\n')
+    assert str(base) == text
+    assert 'name=vpn' in str(first) and 'name=guest' not in str(first)
+    assert 'name=guest' in str(second) and 'name=vpn' not in str(second)
+
+
+def test_overlay_copy_and_prune():
+    base = MikrotikConfig.parse(CONFIG_BASE)
+    layered = base.overlay(CONFIG_OVERLAY)
+    copy = layered.copy()
+    assert type(copy) is MikrotikConfig
+    copy.root['ip']['pool'].load_text('add name=other ranges=10.3.0.1')
+    assert 'name=other' not in str(layered)
+    layered.prune(['/ip pool'])
+    assert 'pool' not in layered.root['ip'].children
+    assert 'pool' in base.root['ip'].children
@@ -0,0 +1,553 @@
+import imp
+import json
+import os
+
+from pytest import fixture, mark, raises
+
+from ansible.module_utils import basic
+
+import ansible_mikrotik_utils
+from ansible_mikrotik_utils.cache import ExportCache
+from ansible_mikrotik_utils.commands import Batch, Export, RawCommand
+from ansible_mikrotik_utils.common import make_native_text
+from ansible_mikrotik_utils.connection.simulator import SimulatorServer, SimulatedDevice
+
+# Assets
+# =============================================================================
+
+MODULE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, os.pardir, 'mkr', 'module.py'
+)
+
+CONFIG_MODULE_PATH = os.path.join(
+    os.path.dirname(MODULE_PATH), 'mkr_config.py'
+)
+
+mkr_module = imp.load_source('mkr_module', MODULE_PATH)
+
+CONFIG_CURRENT = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+/ip firewall address-list
+add address=10.2.0.1 list=blocked
+"""
+
+CONFIG_TARGET = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.50
+add name=vpn ranges=10.1.0.10-10.1.0.20
+/ip firewall address-list
+add address=10.2.0.1 list=blocked
+"""
+
+CONFIG_NON_ASCII = make_native_text(u"""
+/system identity
+set 0 name=caf\u00e9-\u2615
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+""")
+
+
+def get_pools(server):
+    section = server.device.root['ip']['pool']
+    return [dict(item.values) for item in section.items]
+
+
+def set_module_args(server, **params):
+    args = dict(
+        host=server.address, port=server.port, username='admin',
+        password='admin', host_key_policy='accept',
+    )
+    args.update(params)
+    basic._ANSIBLE_ARGS = json.dumps({'ANSIBLE_MODULE_ARGS': args}).encode('utf-8')
+
+
+def make_module(server, **params):
+    set_module_args(server, **params)
+    return mkr_module.MikrotikModule(argument_spec=dict(), supports_check_mode=True)
+
+
+def run_config_module(server, capsys, monkeypatch, **params):
+    # the module imports the module utilities as installed by ansible
+    monkeypatch.setattr(
+        ansible_mikrotik_utils, 'MikrotikModule', mkr_module.MikrotikModule,
+        raising=False
+    )
+    module = imp.load_source('mkr_config', CONFIG_MODULE_PATH)
+    set_module_args(server, **params)
+    with raises(SystemExit):
+        module.main()
+    return json.loads(capsys.readouterr().out)
+
+
+def read_failure(capsys):
+    return json.loads(capsys.readouterr().out)
+
+
+# Fixtures
+# =============================================================================
+
+@fixture
+def server():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        yield server
+
+
+# Tests
+# =============================================================================
+
+def test_configure_full_export(server):
+    module = make_module(server)
+    try:
+        response, changes = module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    assert module.history[0] == 'command: export'
+    assert list(map(str, changes.all_commands)) == [
+        '/ip pool set [ find name=dhcp ] ranges=10.0.0.10-10.0.0.50',
+        '/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20',
+    ]
+    assert get_pools(server) == [
+        dict(name='dhcp', ranges='10.0.0.10-10.0.0.50'),
+        dict(name='vpn', ranges='10.1.0.10-10.1.0.20'),
+    ]
+
+
+def test_configure_target_export(server):
+    module = make_module(server, export_scope='target')
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    assert module.history[0] == (
+        'command: /ip pool export; /ip firewall address-list export'
+    )
+    assert get_pools(server)[-1] == dict(name='vpn', ranges='10.1.0.10-10.1.0.20')
+
+
+def test_configure_target_export_channels(server):
+    module = make_module(server, export_scope='target', channels=2)
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    # one scoped export per target path, each on its own channel
+    assert get_commands(module)[:2] == ['command: export', 'command: export']
+    assert get_pools(server) == [
+        dict(name='dhcp', ranges='10.0.0.10-10.0.0.50'),
+        dict(name='vpn', ranges='10.1.0.10-10.1.0.20'),
+    ]
+
+
+def test_config_module_changed(server, capsys, monkeypatch):
+    # the changes are only in the /ip pool section, none at the root
+    result = run_config_module(server, capsys, monkeypatch, config=CONFIG_TARGET)
+    assert result['changed']
+    assert result['updates'] == [
+        '/ip pool',
+        'set [ find name=dhcp ] ranges=10.0.0.10-10.0.0.50',
+        'add name=vpn ranges=10.1.0.10-10.1.0.20',
+    ]
+    result = run_config_module(server, capsys, monkeypatch, config=CONFIG_TARGET)
+    assert not result['changed']
+    assert result['updates'] == []
+
+
+def test_shell_transport(server):
+    module = make_module(server, transport='shell')
+    try:
+        response, changes = module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    assert module.history[0] == 'command: export'
+    assert list(map(str, changes.all_commands)) == [
+        '/ip pool set [ find name=dhcp ] ranges=10.0.0.10-10.0.0.50',
+        '/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20',
+    ]
+    assert get_pools(server) == [
+        dict(name='dhcp', ranges='10.0.0.10-10.0.0.50'),
+        dict(name='vpn', ranges='10.1.0.10-10.1.0.20'),
+    ]
+
+
+def test_shell_transport_failure(server, capsys):
+    module = make_module(server, transport='shell')
+    with raises(SystemExit):
+        module.execute([RawCommand('remove', '9', path='/ip pool')])
+    failure = read_failure(capsys)
+    # the error is matched in the output of the shell
+    assert failure['command'] == 'remove 9'
+    assert failure['error'] == 'failure: list index out of range\n'
+
+
+def test_locate_import_error():
+    commands = [
+        RawCommand('add', 'name=a', path='/ip pool'),
+        RawCommand('remove', '9', path='/ip pool'),
+    ]
+    locate = mkr_module.locate_import_error
+    assert locate(commands, 'expected end of command (line 2 column 8)') is commands[1]
+    assert locate(commands, (
+        '/ip pool add name=a\n'
+        '/ip pool remove 9\n'
+        'failure: no such item\n'
+    )) is commands[1]
+    assert locate(commands, 'failure: no such item\n') is None
+
+
+def test_import_mode(server):
+    module = make_module(server, execution_mode='import')
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    assert get_pools(server)[-1] == dict(name='vpn', ranges='10.1.0.10-10.1.0.20')
+    assert not server.device.files
+
+
+def test_import_mode_failure(server, capsys):
+    module = make_module(server, execution_mode='import')
+    with raises(SystemExit):
+        module.execute([
+            RawCommand('add', 'name=vpn ranges=10.1.0.10-10.1.0.20', path='/ip pool'),
+            RawCommand('remove', '9', path='/ip pool'),
+        ])
+    failure = read_failure(capsys)
+    assert failure['command'] == 'remove 9'
+    assert failure['error'].endswith('failure: list index out of range\n')
+    # the uploaded script is removed from the device before failing
+    assert not server.device.files
+
+
+def test_file_export(server):
+    module = make_module(server, export_transfer='file')
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    assert module.history[0].startswith('command: / export file=')
+    assert get_pools(server)[-1] == dict(name='vpn', ranges='10.1.0.10-10.1.0.20')
+    # exports are removed from the device once downloaded
+    assert not server.device.files
+
+
+def test_file_export_target_scope(server):
+    module = make_module(server, export_transfer='file', export_scope='target')
+    try:
+        response, changes = module.configure(CONFIG_CURRENT)
+    finally:
+        module.disconnect()
+    assert not changes.all_commands
+    assert not server.device.files
+
+
+@mark.parametrize('transfer', ['channel', 'file'])
+def test_non_ascii_export(transfer):
+    device = SimulatedDevice(config=CONFIG_NON_ASCII)
+    with SimulatorServer(device=device) as server:
+        module = make_module(server, export_transfer=transfer)
+        try:
+            response, changes = module.configure(
+                '\n'.join((CONFIG_NON_ASCII, 'add name=vpn ranges=10.1.0.10-10.1.0.20'))
+            )
+        finally:
+            module.disconnect()
+        assert list(map(str, changes.all_commands)) == [
+            '/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20',
+        ]
+        assert get_pools(server)[-1] == dict(name='vpn', ranges='10.1.0.10-10.1.0.20')
+
+
+@mark.parametrize('params', [
+    dict(), dict(export_scope='target', channels=2),
+])
+def test_export_error_text(params):
+    config = '\n'.join((
+        CONFIG_CURRENT, '/ip pool add name=s ranges=10.3.0.1 comment="failure: none"'
+    ))
+    with SimulatorServer(device=SimulatedDevice(config=config)) as server:
+        module = make_module(server, **params)
+        try:
+            response, changes = module.configure(config.replace('"failure: none"', 'ok'))
+        finally:
+            module.disconnect()
+        # the error text inside a value does not fail the export
+        assert list(map(str, changes.all_commands)) == [
+            '/ip pool set [ find name=s ] comment=ok',
+        ]
+
+
+def test_execute_transport_failure(server, capsys):
+    module = make_module(server)
+    assert module.config
+    server.stop()
+    with raises(SystemExit):
+        module.execute([
+            RawCommand('add', 'name=vpn ranges=10.1.0.10-10.1.0.20', path='/ip pool'),
+        ])
+    failure = read_failure(capsys)
+    assert failure['msg'].startswith('Command failed')
+    assert failure['command'] == 'add name=vpn ranges=10.1.0.10-10.1.0.20'
+
+
+def test_stream_export(server):
+    module = make_module(server)
+    chunks = list()
+    try:
+        streamed = list(module._MikrotikModule__stream(Export(path='/ip pool'), chunks))
+    finally:
+        module.disconnect()
+    assert ''.join(streamed) == ''.join(chunks)
+    assert 'add name=dhcp ranges=10.0.0.10-10.0.0.20' in ''.join(chunks)
+
+
+def test_stream_early_abort(server, capsys):
+    module = make_module(server)
+    chunks = list()
+    command = Batch([
+        Export(path='/ip pool'),
+        RawCommand('remove', '9', path='/ip pool'),
+        Export(path='/ip firewall address-list'),
+    ])
+    with raises(SystemExit):
+        list(module._MikrotikModule__stream(command, chunks))
+    failure = read_failure(capsys)
+    assert failure['command'] == str(command)
+    assert failure['error'].startswith('failure: list index out of range')
+    # the output received before the error line is kept, nothing after it
+    assert 'add name=dhcp' in ''.join(chunks)
+    assert 'list=blocked' not in ''.join(chunks)
+
+
+def test_stream_transport_failure(server, capsys):
+    module = make_module(server)
+    module._MikrotikModule__connect()
+    server.stop()
+    with raises(SystemExit):
+        list(module._MikrotikModule__stream(Export(path='/ip pool'), list()))
+    failure = read_failure(capsys)
+    assert failure['msg']
+    assert failure['command'] == 'export'
+
+
+def run_cached_export(server, directory):
+    module = make_module(server, export_cache=directory)
+    try:
+        config = module.config
+    finally:
+        module.disconnect()
+    return module, config
+
+
+def test_export_cache(server, tmpdir):
+    directory = str(tmpdir.join('cache'))
+    # miss: the export is stored with the history fingerprint
+    module, first = run_cached_export(server, directory)
+    assert 'command: export' in module.history
+    assert tmpdir.join('cache').listdir()
+    # hit: the history is unchanged, the device is not exported again
+    module, second = run_cached_export(server, directory)
+    assert 'command: export' not in module.history
+    assert str(second) == str(first)
+    # invalidation: a change alters the history and the fingerprint
+    module = make_module(server)
+    try:
+        module.execute([
+            RawCommand('add', 'name=vpn ranges=10.1.0.10-10.1.0.20', path='/ip pool'),
+        ])
+    finally:
+        module.disconnect()
+    module, third = run_cached_export(server, directory)
+    assert 'command: export' in module.history
+    assert 'add name=vpn ranges=10.1.0.10-10.1.0.20' in str(third)
+
+
+def test_export_cache_native_text(tmpdir):
+    cache = ExportCache(str(tmpdir))
+    cache.store('key', 'fingerprint', CONFIG_NON_ASCII)
+    text = cache.load('key', 'fingerprint')
+    assert isinstance(text, str)
+    assert text == CONFIG_NON_ASCII
+    assert cache.load('key', 'other') is None
+
+
+def get_tasks(server):
+    return server.device.root['system']['scheduler'].items
+
+
+def get_commands(module):
+    return [line for line in module.history if line.startswith('command: ')]
+
+
+def test_protect_timeout(server):
+    module = make_module(server, restore_on_timeout=30)
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    task, = [line for line in module.history if 'on-event=' in line]
+    # the restore task removes itself before importing the inverse script
+    assert task.startswith('command: add name=mkr-restore-on-timeout interval=30s')
+    assert (
+        'on-event="/system scheduler remove [ find name=mkr-restore-on-timeout ]; '
+        '/ import file-name=mkr-rollback-'
+    ) in task
+    assert get_pools(server)[-1] == dict(name='vpn', ranges='10.1.0.10-10.1.0.20')
+    assert not get_tasks(server)
+    assert not server.device.files
+
+
+def test_protect_backup(server):
+    module = make_module(server, restore_on_reboot=True)
+    try:
+        module.execute([
+            '/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20',
+        ])
+    finally:
+        module.disconnect()
+    assert 'command: /ip pool add name=vpn ranges=10.1.0.10-10.1.0.20' in module.history
+    assert any(
+        line.startswith('command: /system backup save') for line in module.history
+    )
+    task, = [line for line in module.history if 'on-event=' in line]
+    assert '; /system backup load name=' in task
+    assert get_pools(server)[-1] == dict(name='vpn', ranges='10.1.0.10-10.1.0.20')
+    assert not get_tasks(server)
+    assert not server.device.files
+
+
+def test_protect_backup_restore_on_error(server, capsys):
+    module = make_module(server, restore_on_error=True)
+    with raises(SystemExit):
+        module.execute([
+            RawCommand('add', 'name=vpn ranges=10.1.0.10-10.1.0.20', path='/ip pool'),
+            RawCommand('remove', '9', path='/ip pool'),
+        ])
+    failure = read_failure(capsys)
+    assert failure['released']
+    assert get_pools(server) == [dict(name='dhcp', ranges='10.0.0.10-10.0.0.20')]
+    assert not server.device.files
+
+
+def test_protect_deferred_read_only(server):
+    module = make_module(
+        server, restore_on_error=True, restore_on_reboot=True, restore_on_timeout=30
+    )
+    try:
+        response, changes = module.configure(CONFIG_CURRENT)
+        module.execute([])
+        assert not module.protected and not module.backedup
+    finally:
+        module.disconnect()
+    assert not changes.all_commands
+    assert get_commands(module) == ['command: export']
+    assert not server.device.files
+
+
+def test_protect_deferred_first_change(server):
+    module = make_module(server, restore_on_reboot=True)
+    try:
+        module.configure(CONFIG_CURRENT)
+        assert get_commands(module) == ['command: export']
+        module.execute([
+            '/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20',
+        ])
+    finally:
+        module.disconnect()
+    history = get_commands(module)
+    index = history.index('command: /ip pool add name=vpn ranges=10.1.0.10-10.1.0.20')
+    # the backup and the restore task are installed before the first change
+    assert history[1].startswith('command: /system backup save')
+    assert 'on-event=' in history[2]
+    assert index == 3
+    assert not get_tasks(server)
+    assert not server.device.files
+
+
+def test_profile_timings(server):
+    module = make_module(server, profile=True)
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    timings = module.timings
+    assert timings['commands'] >= 3
+    assert timings['bytes_received'] > 0
+    for phase in 'connect', 'export', 'parse', 'diff', 'send':
+        assert timings['phases'][phase] >= 0
+    assert timings['total'] >= sum(timings['phases'].values()) - 1e-5
+
+
+def test_profile_disabled(server):
+    module = make_module(server)
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    assert module.timings is None
+
+
+def make_offline_module(**params):
+    args = dict(host='192.0.2.1', username='admin', password='admin')
+    args.update(params)
+    basic._ANSIBLE_ARGS = json.dumps({'ANSIBLE_MODULE_ARGS': args}).encode('utf-8')
+    return mkr_module.MikrotikModule(argument_spec=dict(), supports_check_mode=True)
+
+
+def test_offline_export(tmpdir):
+    export = tmpdir.join('export.rsc')
+    export.write(CONFIG_CURRENT)
+    module = make_offline_module(offline_export=str(export))
+    response, changes = module.configure(CONFIG_TARGET)
+    assert response is None
+    assert not module.connected
+    assert list(map(str, changes.all_commands)) == [
+        '/ip pool set [ find name=dhcp ] ranges=10.0.0.10-10.0.0.50',
+        '/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20',
+    ]
+
+
+def test_offline_export_cache(server, tmpdir):
+    directory = str(tmpdir.join('cache'))
+    run_cached_export(server, directory)
+    address, port = server.address, server.port
+    server.stop()
+    module = make_offline_module(
+        host=address, port=port, offline=True, export_cache=directory
+    )
+    response, changes = module.configure(CONFIG_TARGET)
+    assert not module.connected
+    assert len(changes.all_commands) == 2
+
+
+def test_offline_missing_export(tmpdir, capsys):
+    module = make_offline_module(offline_export=str(tmpdir.join('missing.rsc')))
+    with raises(SystemExit):
+        module.configure(CONFIG_TARGET)
+    assert read_failure(capsys)['msg'].startswith('Unable to read offline export')
+    module = make_offline_module(offline=True)
+    with raises(SystemExit):
+        module.configure(CONFIG_TARGET)
+    assert read_failure(capsys)['msg'] == (
+        'Offline mode requires offline_export or export_cache.'
+    )
+
+
+def test_verify_touched_sections(server):
+    module = make_module(server)
+    try:
+        module.configure(CONFIG_TARGET)
+    finally:
+        module.disconnect()
+    exports = [line for line in module.history if line.endswith('export')]
+    # the full export, then the touched section only for the verification
+    assert exports == ['command: export', 'command: /ip pool export']
+
+
+def test_verify_missing_changes(server, capsys):
+    module = make_module(server)
+    with raises(SystemExit):
+        module.configure(CONFIG_TARGET, after=['/ip pool remove [ find name=vpn ]'])
+    failure = read_failure(capsys)
+    assert failure['msg'] == 'Failed to reach target configuration'
+    assert failure['missing'] == ['/ip pool add name=vpn ranges=10.1.0.10-10.1.0.20']
@@ -0,0 +1,33 @@
+from time import sleep
+
+from ansible_mikrotik_utils.profiling import Profiler
+
+# Tests
+# =============================================================================
+
+def test_nested_timers():
+    profiler = Profiler()
+    with profiler.timer('outer'):
+        sleep(0.02)
+        with profiler.timer('inner'):
+            sleep(0.02)
+    with profiler.timer('inner'):
+        sleep(0.01)
+    profiler.count('commands')
+    profiler.count('commands', 2)
+    report = profiler.report()
+    assert report['commands'] == 3
+    assert list(report['phases']) == ['inner', 'outer']
+    # the inner time is only counted for the inner phase
+    assert report['phases']['outer'] >= 0.02
+    assert report['phases']['inner'] >= 0.03
+    assert report['phases']['outer'] < report['phases']['inner']
+    assert report['total'] == round(sum(profiler.timings.values()), 6)
+
+
+def test_disabled_profiler():
+    profiler = Profiler(enabled=False)
+    with profiler.timer('outer'):
+        profiler.count('commands')
+    assert not profiler.timings
+    assert not profiler.counters
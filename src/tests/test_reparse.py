@@ -0,0 +1,70 @@
+from pytest import mark
+
+from ansible_mikrotik_utils.config import MikrotikConfig
+
+# Assets
+# =============================================================================
+
+CONFIG_PREVIOUS = """
+# jan/02/1970 00:00:00 by RouterOS 6.40
+/interface bridge
+add name=bridge
+/ip address
+add address=192.168.88.1/24 interface=bridge
+/ip firewall filter
+add chain=input action=accept comment="first rule"
+add chain=input action=drop comment="second rule"
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+/system identity
+set 0 name=router
+"""
+
+CONFIG_CHANGED = """
+# jan/03/1970 00:00:00 by RouterOS 6.40
+/interface bridge
+add name=bridge
+/ip address
+add address=192.168.88.1/24 interface=bridge
+add address=10.0.0.1/24 interface=bridge
+/ip firewall filter
+add chain=input action=drop comment="second rule"
+add chain=input action=accept comment="first rule"
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+/system identity
+set 0 name=router
+"""
+
+CONFIG_RESHAPED = """
+/interface bridge
+add name=bridge
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+/ip pool
+add name=vpn ranges=10.1.0.10-10.1.0.20
+/system identity
+set 0 name=router
+"""
+
+
+# Tests
+# =============================================================================
+
+@mark.parametrize('text', [CONFIG_PREVIOUS, CONFIG_CHANGED, CONFIG_RESHAPED])
+def test_reparse_matches_parse(text):
+    previous = MikrotikConfig.parse(CONFIG_PREVIOUS)
+    reparsed = previous.reparse(CONFIG_PREVIOUS, text)
+    parsed = MikrotikConfig.parse(text)
+    assert str(reparsed) == str(parsed)
+    assert not parsed.difference(reparsed).all_commands
+    assert not reparsed.difference(parsed).all_commands
+
+
+def test_reparse_keeps_previous():
+    previous = MikrotikConfig.parse(CONFIG_PREVIOUS)
+    text = str(previous)
+    reparsed = previous.reparse(CONFIG_PREVIOUS, CONFIG_CHANGED)
+    reparsed.root['ip']['pool'].load_text('add name=other ranges=10.3.0.1')
+    reparsed.root['system']['identity'].load_text('set 0 name=other')
+    assert str(previous) == text
@@ -0,0 +1,71 @@
+from ansible_mikrotik_utils.connection.simulator import SimulatorServer, SimulatedDevice
+from ansible_mikrotik_utils.runner import FleetRunner, run
+
+# Assets
+# =============================================================================
+
+CONFIG_CURRENT = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+"""
+
+CONFIG_TARGET = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.50
+add name=vpn ranges=10.1.0.10-10.1.0.20
+"""
+
+
+def get_pools(server):
+    section = server.device.root['ip']['pool']
+    return [dict(item.values) for item in section.items]
+
+
+def make_params(server):
+    return dict(
+        host=server.address, port=server.port,
+        username='admin', password='admin', host_key_policy='accept',
+    )
+
+
+# Tests
+# =============================================================================
+
+def test_run_fleet():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as first:
+        with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as second:
+            results = run([
+                ('first', make_params(first), CONFIG_TARGET),
+                ('second', make_params(second), CONFIG_TARGET),
+            ])
+            assert list(results) == ['first', 'second']
+            for server in first, second:
+                assert get_pools(server) == [
+                    dict(name='dhcp', ranges='10.0.0.10-10.0.0.50'),
+                    dict(name='vpn', ranges='10.1.0.10-10.1.0.20'),
+                ]
+    for result in results.values():
+        assert not result.get('failed'), result
+        assert result['changed']
+
+
+def test_run_check_mode():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        results = run([('device', make_params(server), CONFIG_TARGET)], check_mode=True)
+        assert get_pools(server) == [
+            dict(name='dhcp', ranges='10.0.0.10-10.0.0.20'),
+        ]
+    assert results['device']['changed']
+    assert 'response' not in results['device']
+
+
+def test_run_device_failure():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        results = FleetRunner(concurrency=1).run([
+            ('broken', make_params(server), '/ip pool\n=broken\n'),
+            ('device', make_params(server), CONFIG_TARGET),
+        ])
+    assert results['broken']['failed']
+    assert results['broken']['msg'].startswith('ParseError')
+    assert not results['device'].get('failed'), results['device']
+    assert results['device']['changed']
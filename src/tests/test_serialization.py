@@ -0,0 +1,83 @@
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.device import Device
+from ansible_mikrotik_utils.serialization import dumps, loads
+
+# Assets
+# =============================================================================
+
+CONFIG_BASE = """
+/interface bridge
+set 0 wat=foo
+/ip address
+add address=192.168.88.1/24
+add address=10.0.0.1 network=10.0.0.2
+/ip firewall filter
+add chain=test comment="first rule"
+add chain=test comment="second rule"
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+set [ find name=dhcp ] ranges=10.0.0.10-10.0.0.30
+"""
+
+CONFIG_TARGET = """
+/interface bridge
+set 0 wat=bar
+/ip address
+add address=192.168.88.1/24
+/ip firewall filter
+add chain=test comment="second rule"
+add chain=test comment="first rule"
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.50
+"""
+
+CONFIG_LARGE = '\n'.join(['/ip firewall address-list'] + [
+    'add address=10.{}.{}.0/24 list=list-{} comment="network {}"'.format(
+        index // 256, index % 256, index % 8, index
+    )
+    for index in range(1000)
+])
+
+
+# Tests
+# =============================================================================
+
+def test_config_round_trip():
+    original = MikrotikConfig.parse(CONFIG_BASE)
+    target = MikrotikConfig.parse(CONFIG_TARGET)
+    data = original.dumps()
+    restored = MikrotikConfig.loads(data)
+    assert str(restored)
+    assert str(restored) == str(original)
+    assert restored.dumps() == data
+    for ours, theirs in zip(restored.root.traverse(), original.root.traverse()):
+        assert ours.path == theirs.path
+        assert ours.items == theirs.items
+        assert ours.settings == theirs.settings
+    assert (
+        str(restored.root.difference(target.root)) ==
+        str(original.root.difference(target.root))
+    )
+    assert not restored.root.difference(original.root).all_commands
+
+
+def test_script_round_trip():
+    base = MikrotikConfig.parse(CONFIG_BASE)
+    target = MikrotikConfig.parse(CONFIG_TARGET)
+    script = base.root.difference(target.root)
+    device = Device()
+    data = dumps(script)
+    restored = loads(data, device)
+    assert str(restored) == str(script)
+    assert dumps(restored) == data
+    # the restored script brings the configuration to the target
+    base.root.apply(restored)
+    assert not base.root.difference(target.root).all_commands
+
+
+def test_serialized_size():
+    original = MikrotikConfig.parse(CONFIG_LARGE)
+    data = original.dumps()
+    # records of string ids are smaller than the export text
+    assert len(data) < len(str(original)) * 3 // 4
+    assert str(MikrotikConfig.loads(data)) == str(original)
@@ -0,0 +1,85 @@
+from pytest import mark
+
+from ansible_mikrotik_utils.common import split_lines, split_lines_stream
+from ansible_mikrotik_utils.common import iter_file_chunks, make_native_text
+from ansible_mikrotik_utils.config import MikrotikConfig
+
+# Assets
+# =============================================================================
+
+EXPORT = """
+# jan/02/1970 00:00:00 by RouterOS 6.40
+# software id = "ABCD
+#
+/interface bridge
+add name=bridge comment="multi \\
+    line ; with # hash"
+/ip address
+add address=192.168.88.1/24 comment="say \\"hi\\""; add address=10.0.0.1/8
+/ip firewall filter
+add chain=input action=accept comment=a\\#b
+set [ find default-name=ether1 ] name=wan # trailing comment "
+"""
+
+UNICODE_EXPORT = u"""
+/system identity
+set 0 name="caf\u00e9 \u2615"
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+"""
+
+
+# Tests
+# =============================================================================
+
+@mark.parametrize('size', [1, 2, 3, 7, 16, 64, len(EXPORT)])
+def test_split_lines_stream(size):
+    chunks = [EXPORT[index:index + size] for index in range(0, len(EXPORT), size)]
+    assert list(split_lines_stream(chunks)) == split_lines(EXPORT)
+
+
+def test_split_lines_quotes():
+    assert split_lines(
+        'add comment="a; b" x=1; add name=c \\\n    d=e # note\n'
+        'set 0 comment="long \\\n    value"\n'
+    ) == [
+        'add comment="a; b" x=1',
+        ' add name=c d=e ',
+        'set 0 comment="long value"',
+    ]
+
+
+def test_quoted_values():
+    config = MikrotikConfig.parse(
+        '/ip firewall filter\n'
+        'add chain=input comment="say \\"hi\\"; # here" action=accept\n'
+        'add chain=input comment="" action=drop\n'
+    )
+    first, second = config.root['ip']['firewall']['filter'].items
+    assert first.values['comment'] == 'say "hi"; # here'
+    assert second.values['comment'] == ''
+    assert str(MikrotikConfig.parse(str(config))) == str(config)
+
+
+@mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+def test_iter_file_chunks(tmpdir, size):
+    path = tmpdir.join('export.rsc')
+    path.write_binary(UNICODE_EXPORT.encode('utf-8'))
+    chunks = list(iter_file_chunks(str(path), size=size))
+    assert all(chunks)
+    assert ''.join(chunks) == make_native_text(UNICODE_EXPORT)
+
+
+def test_iter_file_chunks_empty(tmpdir):
+    path = tmpdir.join('empty.rsc')
+    path.write_binary(b'')
+    assert list(iter_file_chunks(str(path))) == []
+
+
+def test_load_file(tmpdir):
+    path = tmpdir.join('export.rsc')
+    path.write_binary(UNICODE_EXPORT.encode('utf-8'))
+    loaded = MikrotikConfig.load(str(path))
+    parsed = MikrotikConfig.parse(make_native_text(UNICODE_EXPORT))
+    assert str(loaded) == str(parsed)
+    assert make_native_text(u'caf\u00e9 \u2615') in str(loaded)
@@ -0,0 +1,176 @@
+from re import compile as compile_regex
+
+from pytest import raises
+
+from ansible_mikrotik_utils.common import make_native_text
+from ansible_mikrotik_utils.config import MikrotikConfig
+from ansible_mikrotik_utils.connection.base import SSHTransport
+from ansible_mikrotik_utils.connection.base import match_error, match_export_error
+from ansible_mikrotik_utils.connection.shell import ShellTransport
+from ansible_mikrotik_utils.exceptions import TransportError
+from ansible_mikrotik_utils.connection.simulator import SimulatorServer, SimulatedDevice
+
+# Assets
+# =============================================================================
+
+CONFIG_CURRENT = """
+/ip pool
+add name=dhcp ranges=10.0.0.10-10.0.0.20
+/ip firewall address-list
+add address=10.2.0.1 list=blocked
+/system identity
+set 0 name=router
+"""
+
+CONFIG_NON_ASCII = make_native_text(u"""
+/system identity
+set 0 name=caf\u00e9-\u2615
+""")
+
+PATHS = ['/ip pool', '/ip firewall address-list', '/system identity']
+
+
+def strip_comments(response):
+    return [line for line in response.splitlines() if not line.startswith('#')]
+
+
+# Fixtures
+# =============================================================================
+
+def make_transport(server):
+    return SSHTransport(
+        server.address, port=server.port, username='admin',
+        password='admin', host_key_policy='accept', timeout=2,
+    )
+
+
+def make_shell_transport(server, **kwargs):
+    kwargs.setdefault('timeout', 2)
+    return ShellTransport(
+        server.address, port=server.port, username='admin',
+        password='admin', host_key_policy='accept', **kwargs
+    )
+
+
+# Tests
+# =============================================================================
+
+def test_execute_many_channels():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        transport = make_transport(server)
+        transport.open()
+        try:
+            texts = ['{} export'.format(path) for path in PATHS * 2]
+            expected = [transport.execute(text) for text in texts]
+            results = transport.execute_many(texts, channels=2)
+        finally:
+            transport.close()
+    assert len(results) == len(expected)
+    # responses come back in the order of the commands
+    for path, (response, error), (reference, _) in zip(PATHS * 2, results, expected):
+        assert not error
+        assert strip_comments(response) == strip_comments(reference)
+        assert strip_comments(response)[0] == path
+
+
+def test_non_ascii_output():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_NON_ASCII)) as server:
+        transport = make_transport(server)
+        transport.open()
+        try:
+            response, error = transport.execute('/system identity export')
+            streamed = ''.join(transport.stream('/system identity export'))
+            transport.execute('/system identity export file=identity')
+            data = transport.download('identity.rsc')
+        finally:
+            transport.close()
+    name = make_native_text(u'caf\u00e9-\u2615')
+    # responses are native strings, which the parser handles on python 2
+    for text in response, streamed:
+        assert isinstance(text, str)
+        assert strip_comments(text) == strip_comments(response)
+        config = MikrotikConfig.parse(text)
+        assert name in str(config)
+    assert name in make_native_text(data.decode('utf-8'))
+
+
+def test_match_error():
+    assert match_error('failure: no such item\n')
+    assert match_error('Opening script file x.rsc\nfailure: no such item\n')
+    assert match_error('bad command name foo (line 1 column 1)')
+    assert not match_error('add comment="failure: no such item"\n')
+    assert not match_error('ok, failure: none\n')
+
+
+def test_match_export_error():
+    assert match_export_error('expected end of command (line 1 column 8)\n')
+    assert not match_export_error(
+        '# oct/18/2026 by RouterOS 6.40\n'
+        '/system script\n'
+        'add name=check source="\\\n'
+        'failure: bad\n'
+    )
+
+
+def test_shell_execute():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        transport, shell = make_transport(server), make_shell_transport(server)
+        transport.open()
+        shell.open()
+        try:
+            expected = [transport.execute('{} export'.format(path)) for path in PATHS]
+            results = [shell.execute('{} export'.format(path)) for path in PATHS]
+        finally:
+            shell.close()
+            transport.close()
+    # each response ends at the next prompt, without the echo of the command
+    for path, (response, error), (reference, _) in zip(PATHS, results, expected):
+        assert not error
+        assert strip_comments(response) == strip_comments(reference)
+        assert strip_comments(response)[0] == path
+        assert 'export' not in response
+        assert 'admin@' not in response
+
+
+def test_shell_prompts():
+    prompt = compile_regex(r"\[admin@[\w\-]+\] > $")
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        shell = make_shell_transport(server, prompts=[prompt])
+        shell.open()
+        try:
+            response, error = shell.execute('/system identity export')
+        finally:
+            shell.close()
+    assert shell.prompts == [prompt]
+    assert strip_comments(response) == ['/system identity', 'set 0 name=router']
+
+
+def test_shell_timeout():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        shell = make_shell_transport(
+            server, prompts=[compile_regex(r"^never$")], timeout=0.5
+        )
+        try:
+            # opening runs the connection test, on the shell
+            with raises(TransportError) as info:
+                shell.open()
+        finally:
+            shell.close()
+    assert str(info.value) == "Timed out waiting for the prompt."
+
+
+def test_shell_error():
+    with SimulatorServer(device=SimulatedDevice(config=CONFIG_CURRENT)) as server:
+        shell = make_shell_transport(server)
+        shell.open()
+        try:
+            failed, _ = shell.execute('/ip pool remove 9')
+            unknown, _ = shell.execute('/ip pool frobnicate')
+            response, error = shell.execute('/ip pool export')
+        finally:
+            shell.close()
+    # errors are in the output of the shell, after the echo of the command
+    assert failed == 'failure: list index out of range\n'
+    assert match_error(failed)
+    assert match_error(unknown)
+    assert not error and not match_export_error(response)